@@ -0,0 +1,396 @@
+"""
+評価データの集計エンジン
+評価・回答者・音源の列を1回のSQLで NumPy 配列に読み込み、
+任意の列の組み合わせのクロス集計・グループ平均・SD法プロフィールを bincount で一括計算する
+（ダッシュボードの集計はすべて1回の読み込みから求める）
+"""
+
+import importlib.util
+import json
+import os
+import sys
+from contextlib import closing
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from evaluation_db import (
+    DB_PATH,
+    FETCH_BATCH_SIZE,
+    SD_SCALE_KEYS,
+    DateLike,
+    connect,
+    evaluation_filters,
+    filter_args,
+    sd_score_columns,
+)
+from input_stream import build_parser, has_input, load_json_input
+
+# p値の計算にのみ使用（なければ p値は None）
+SCIPY_AVAILABLE = importlib.util.find_spec('scipy') is not None
+
+# カテゴリ列（キー → SQL式）
+CATEGORICAL_COLUMNS = {
+    'audioSampleId': 'e.audioSampleId',
+    'audioSampleName': 'a.name',
+    'category': 'a.category',
+    'experimentGroup': 'r.experimentGroup',
+    'ageGroup': 'r.ageGroup',
+    'gender': 'r.gender',
+    'evOwnership': 'r.evOwnership',
+}
+
+# 数値列（キー → SQL式、NULL は NaN）
+NUMERIC_COLUMNS = {
+    'presentationOrder': 'e.presentationOrder',
+    'purchaseIntent': 'e.purchaseIntent',
+    'willingnessToPay': 'e.willingnessToPay',
+    'responseTimeMs': 'e.responseTimeMs',
+    'drivingExperience': 'r.drivingExperience',
+    'audioSensitivity': 'r.audioSensitivity',
+}
+
+# 購買意欲（1-7）の区分：(ラベル, 下限, 上限)
+PURCHASE_BANDS = [('低 (1-3)', 1, 3), ('中 (4-5)', 4, 5), ('高 (6-7)', 6, 7)]
+
+# ダッシュボードのクロス集計に表示する年齢グループ（表示順）
+AGE_GROUPS = ['20-29', '30-39', '40-49', '50-59', '60-70']
+
+# 評価 × 回答者 × 音源の結合
+EVALUATION_JOINS = 'JOIN Respondent r ON r.id = e.respondentId JOIN AudioSample a ON a.id = e.audioSampleId'
+
+Factor = Tuple[np.ndarray, List[Any]]
+
+def factorize(values: np.ndarray) -> Factor:
+    """値を (コード, 水準) に変換（水準は昇順、NaN はコード -1）"""
+    values = np.asarray(values)
+    valid = ~np.isnan(values) if values.dtype.kind == 'f' else np.ones(len(values), dtype=bool)
+    levels, inverse = np.unique(values[valid], return_inverse=True)
+    codes = np.full(len(values), -1, dtype=np.int64)
+    codes[valid] = inverse
+    return codes, [level.item() for level in levels]
+
+def band_codes(values: np.ndarray, bands: Sequence[Tuple[str, float, float]]) -> Factor:
+    """数値を (ラベル, 下限, 上限) の区分に割り当てる（どの区分にも入らない値は -1）"""
+    codes = np.full(len(values), -1, dtype=np.int64)
+    for i, (_, low, high) in enumerate(bands):
+        codes[(values >= low) & (values <= high)] = i
+    return codes, [label for label, _, _ in bands]
+
+def select_levels(factor: Factor, wanted: Sequence[Any]) -> Factor:
+    """水準を指定した順に並べ替え・絞り込む（指定にない水準は -1）"""
+    codes, levels = factor
+    position = {level: i for i, level in enumerate(wanted)}
+    mapping = np.array([position.get(level, -1) for level in levels] + [-1], dtype=np.int64)
+    # コード -1 は mapping の末尾（-1）を参照する
+    return mapping[codes], list(wanted)
+
+def crosstab(factors: Sequence[Factor], weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """N元クロス集計（各軸の水準数の形の配列、コード -1 を含む行は数えない）
+
+    全ての軸のコードを1つの添字にまとめ、bincount 1回で数える。
+    """
+    shape = tuple(len(levels) for _, levels in factors)
+    if not factors or 0 in shape:
+        return np.zeros(shape)
+    codes = [np.asarray(c) for c, _ in factors]
+    valid = np.logical_and.reduce([c >= 0 for c in codes])
+    flat = np.ravel_multi_index([c[valid] for c in codes], shape)
+    counts = np.bincount(
+        flat,
+        weights=None if weights is None else np.asarray(weights, dtype=np.float64)[valid],
+        minlength=int(np.prod(shape)),
+    )
+    return counts.reshape(shape)
+
+def group_moments(codes: np.ndarray, n_groups: int, values: np.ndarray) -> Dict[str, np.ndarray]:
+    """グループ × 列ごとの件数・平均・標準偏差（NaN は除外、1列ずつ bincount）"""
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    counts = np.zeros((n_groups, values.shape[1]), dtype=np.int64)
+    sums = np.zeros(counts.shape)
+    squares = np.zeros(counts.shape)
+    grouped = codes >= 0
+    for j in range(values.shape[1]):
+        column = values[:, j]
+        valid = grouped & ~np.isnan(column)
+        counts[:, j] = np.bincount(codes[valid], minlength=n_groups)
+        sums[:, j] = np.bincount(codes[valid], weights=column[valid], minlength=n_groups)
+        squares[:, j] = np.bincount(codes[valid], weights=column[valid] ** 2, minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        # 母標準偏差（桁落ちによる負の値は0に丸める）
+        std = np.sqrt(np.maximum(squares / counts - means ** 2, 0.0))
+    return {'count': counts, 'mean': means, 'std': std}
+
+def chi_square_test(table: np.ndarray) -> Dict[str, Any]:
+    """独立性のカイ二乗検定（N元表は各軸の周辺度数の積を期待度数とする）とクラメールのV
+
+    度数0の水準は自由度に含めない。
+    """
+    table = np.asarray(table, dtype=np.float64)
+    total = table.sum()
+    if table.ndim < 2 or total <= 0:
+        return {'chi2': None, 'dof': 0, 'p_value': None, 'cramers_v': None}
+    # 度数0の行・列（各軸の水準）を除外
+    for axis in range(table.ndim):
+        other_axes = tuple(i for i in range(table.ndim) if i != axis)
+        table = np.compress(table.sum(axis=other_axes) > 0, table, axis=axis)
+    shape = table.shape
+    if min(shape) < 2:
+        return {'chi2': None, 'dof': 0, 'p_value': None, 'cramers_v': None}
+
+    expected = np.full(shape, total)
+    for axis in range(table.ndim):
+        other_axes = tuple(i for i in range(table.ndim) if i != axis)
+        marginal = table.sum(axis=other_axes) / total
+        expected = expected * marginal.reshape([-1 if i == axis else 1 for i in range(table.ndim)])
+    chi2 = float(((table - expected) ** 2 / expected).sum())
+    dof = int(np.prod(shape) - 1 - sum(k - 1 for k in shape))
+
+    p_value = None
+    if SCIPY_AVAILABLE:
+        from scipy.stats import chi2 as chi2_distribution
+        p_value = float(chi2_distribution.sf(chi2, dof))
+    return {
+        'chi2': chi2,
+        'dof': dof,
+        'p_value': p_value,
+        'cramers_v': float(np.sqrt(chi2 / (total * (min(shape) - 1)))),
+    }
+
+class EvaluationTable:
+    """評価データの列（カテゴリ列は出現順のコードと水準、数値列は float64）"""
+
+    def __init__(
+        self,
+        codes: Dict[str, np.ndarray],
+        levels: Dict[str, List[Any]],
+        numeric: Dict[str, np.ndarray],
+        sd_scores: np.ndarray,
+    ):
+        self.codes = codes
+        self.levels = levels
+        self.numeric = numeric
+        self.sd_scores = sd_scores
+
+    def __len__(self) -> int:
+        return len(self.sd_scores)
+
+    def factor(self, key: str) -> Factor:
+        """グループ化に使う列（カテゴリ列・購買意欲の区分 'purchaseBand'・整数値の数値列）"""
+        if key in self.codes:
+            return self.codes[key], self.levels[key]
+        if key == 'purchaseBand':
+            return band_codes(self.numeric['purchaseIntent'], PURCHASE_BANDS)
+        if key in self.numeric:
+            return factorize(self.numeric[key])
+        raise ValueError(f'Unknown column: {key}')
+
+    def values(self, key: str) -> np.ndarray:
+        """数値列またはSD法の尺度"""
+        if key in self.numeric:
+            return self.numeric[key]
+        if key in SD_SCALE_KEYS:
+            return self.sd_scores[:, SD_SCALE_KEYS.index(key)]
+        raise ValueError(f'Unknown numeric column: {key}')
+
+    def crosstab(self, keys: Sequence[str], levels: Optional[Dict[str, Sequence[Any]]] = None) -> Dict[str, Any]:
+        """任意の列の組み合わせのクロス集計と独立性の検定"""
+        factors = []
+        for key in keys:
+            factor = self.factor(key)
+            if levels and key in levels:
+                factor = select_levels(factor, levels[key])
+            factors.append(factor)
+        counts = crosstab(factors)
+        return {
+            'dimensions': list(keys),
+            'levels': [factor_levels for _, factor_levels in factors],
+            'counts': counts.astype(np.int64).tolist(),
+            'statistics': chi_square_test(counts),
+        }
+
+    def profiles(self, key: str, columns: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """グループごとの件数・平均・標準偏差（既定はSD法の8尺度）"""
+        codes, group_levels = self.factor(key)
+        if columns is None:
+            columns, values = list(SD_SCALE_KEYS), self.sd_scores
+        else:
+            values = np.column_stack([self.values(column) for column in columns])
+        moments = group_moments(codes, len(group_levels), values)
+        return {'group': key, 'levels': group_levels, 'columns': list(columns), **moments}
+
+def load_evaluation_table(
+    db_path: str = DB_PATH,
+    audio_sample_id: Optional[str] = None,
+    experiment_group: Optional[str] = None,
+    date_from: Optional[DateLike] = None,
+    date_to: Optional[DateLike] = None,
+    batch_size: int = FETCH_BATCH_SIZE,
+) -> EvaluationTable:
+    """評価・回答者・音源の列を1回のクエリで読み込む（カテゴリ列は読み込みながらコード化）"""
+    _, where, params = evaluation_filters(audio_sample_id, experiment_group, date_from, date_to)
+    categorical = list(CATEGORICAL_COLUMNS)
+    numeric = list(NUMERIC_COLUMNS)
+    select = ', '.join(
+        [CATEGORICAL_COLUMNS[key] for key in categorical]
+        + [NUMERIC_COLUMNS[key] for key in numeric]
+        + [sd_score_columns()]
+    )
+    n_categorical = len(categorical)
+    n_numeric = len(numeric)
+
+    with closing(connect(db_path)) as conn:
+        count = conn.execute(f'SELECT COUNT(*) FROM Evaluation e {EVALUATION_JOINS} {where}', params).fetchone()[0]
+        codes = np.empty((count, n_categorical), dtype=np.int64)
+        numbers = np.empty((count, n_numeric + len(SD_SCALE_KEYS)), dtype=np.float64)
+        # 水準 → コード（出現順、水準数に比例するメモリのみ）
+        indexes: List[Dict[Any, int]] = [{} for _ in categorical]
+
+        cursor = conn.execute(f'SELECT {select} FROM Evaluation e {EVALUATION_JOINS} {where} ORDER BY e.rowid', params)
+        filled = 0
+        while filled < count:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            end = filled + len(rows)
+            for j, index in enumerate(indexes):
+                codes[filled:end, j] = [index.setdefault(row[j], len(index)) for row in rows]
+            # NULL は NaN になる
+            numbers[filled:end] = np.array([row[n_categorical:] for row in rows], dtype=np.float64)
+            filled = end
+
+    return EvaluationTable(
+        codes={key: codes[:filled, j] for j, key in enumerate(categorical)},
+        levels={key: list(indexes[j]) for j, key in enumerate(categorical)},
+        numeric={key: numbers[:filled, j] for j, key in enumerate(numeric)},
+        sd_scores=numbers[:filled, n_numeric:],
+    )
+
+# 常駐ワーカーで同じデータベースを繰り返し読まないためのキャッシュ
+_table_cache: Dict[Tuple[Any, ...], EvaluationTable] = {}
+
+def _db_state(db_path: str) -> Tuple[Any, ...]:
+    """データベースの更新を検出するための (パス, 更新時刻, サイズ)（WALファイルを含む）"""
+    state: List[Any] = [os.path.realpath(db_path)]
+    for path in (db_path, f'{db_path}-wal'):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            state.extend([stat.st_mtime_ns, stat.st_size])
+    return tuple(state)
+
+def cached_table(db_path: str = DB_PATH, **filters: Any) -> EvaluationTable:
+    """データベースが前回の読み込みから変わっていなければ同じ表を返す"""
+    key = _db_state(db_path) + tuple(sorted((name, str(value)) for name, value in filters.items()))
+    table = _table_cache.get(key)
+    if table is None:
+        _table_cache.clear()
+        table = _table_cache[key] = load_evaluation_table(db_path, **filters)
+    return table
+
+def sd_score_summary(table: EvaluationTable) -> List[Dict[str, Any]]:
+    """音源ごとのSD法スコアの平均（音源は評価データの出現順）"""
+    profiles = table.profiles('audioSampleId')
+    names = _audio_names(table)
+    return [
+        {'name': names[i], 'scores': dict(zip(SD_SCALE_KEYS, profiles['mean'][i].tolist()))}
+        for i in range(len(profiles['levels']))
+    ]
+
+def purchase_intent_distribution(table: EvaluationTable) -> List[Dict[str, Any]]:
+    """音源ごとの購買意欲（1-7）の度数分布"""
+    audio = table.factor('audioSampleId')
+    intent = select_levels(factorize(table.numeric['purchaseIntent']), list(range(1, 8)))
+    counts = crosstab([audio, intent]).astype(np.int64)
+    names = _audio_names(table)
+    return [{'distribution': counts[i].tolist(), 'name': names[i]} for i in range(len(audio[1]))]
+
+def age_purchase_crosstab(table: EvaluationTable) -> Dict[str, Any]:
+    """年齢グループ × 購買意欲の区分のクロス集計"""
+    return table.crosstab(['ageGroup', 'purchaseBand'], levels={'ageGroup': AGE_GROUPS})
+
+def _audio_names(table: EvaluationTable) -> List[str]:
+    """音源IDのコード順の音源名"""
+    codes = table.codes['audioSampleId']
+    names = table.levels['audioSampleName']
+    # 各音源の最初の評価の行から名前を引く
+    _, first = np.unique(codes, return_index=True)
+    return [names[table.codes['audioSampleName'][row]] for row in first]
+
+def crosstab_rows(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """2元クロス集計を行ごとの {row, columns} に変換（ダッシュボードの表示形式）"""
+    row_levels, column_levels = result['levels']
+    return [
+        {'row': row, 'columns': dict(zip(column_levels, counts))}
+        for row, counts in zip(row_levels, result['counts'])
+    ]
+
+def dashboard_aggregates(table: EvaluationTable) -> Dict[str, Any]:
+    """ダッシュボードの集計（SD法スコア・購買意欲・クロス集計）を1つの表から求める"""
+    crosstab_result = age_purchase_crosstab(table)
+    return {
+        'sd_scores': sd_score_summary(table),
+        'purchase_intent': purchase_intent_distribution(table),
+        'cross_tabulation': crosstab_rows(crosstab_result),
+        'cross_tabulation_statistics': crosstab_result['statistics'],
+        'total_evaluations': len(table),
+    }
+
+# ビュー名 → 集計
+VIEWS = {
+    'dashboard': dashboard_aggregates,
+    'sd_scores': sd_score_summary,
+    'purchase_intent': purchase_intent_distribution,
+    'cross_tabulation': lambda table: crosstab_rows(age_purchase_crosstab(table)),
+}
+
+def aggregate_from_params(params: Dict[str, Any]) -> Any:
+    """パラメータで指定された集計を実行
+
+    view: 'dashboard' / 'sd_scores' / 'purchase_intent' / 'cross_tabulation'
+    dimensions: 指定時は任意の列のクロス集計（例: ['experimentGroup', 'purchaseBand']）
+    profile: 指定時はその列のグループごとの平均・標準偏差（columns で列を指定）
+    """
+    table = cached_table(params.get('db', DB_PATH), **filter_args(params.get('filters')))
+    if params.get('dimensions'):
+        return table.crosstab(params['dimensions'], params.get('levels'))
+    if params.get('profile'):
+        profile = table.profiles(params['profile'], params.get('columns'))
+        return {
+            key: value.tolist() if isinstance(value, np.ndarray) else value
+            for key, value in profile.items()
+        }
+    view = params.get('view', 'dashboard')
+    if view not in VIEWS:
+        raise ValueError(f'Unknown view: {view}')
+    return VIEWS[view](table)
+
+def main():
+    """メイン処理"""
+    parser = build_parser('評価データの集計')
+    parser.add_argument('--db', help='評価データのSQLiteデータベース（既定: prisma/dev.db）')
+    parser.add_argument('--view', choices=list(VIEWS), help='集計の種類（既定: dashboard）')
+    parser.add_argument('--dimensions', help='クロス集計する列（カンマ区切り、例: ageGroup,purchaseBand）')
+    parser.add_argument('--profile', help='グループごとの平均・標準偏差を求める列')
+    args = parser.parse_args()
+
+    try:
+        params = load_json_input(args) if has_input(args) else {}
+        if args.db:
+            params['db'] = args.db
+        if args.view:
+            params['view'] = args.view
+        if args.dimensions:
+            params['dimensions'] = [key.strip() for key in args.dimensions.split(',') if key.strip()]
+        if args.profile:
+            params['profile'] = args.profile
+        result = aggregate_from_params(params)
+        print(json.dumps(result, ensure_ascii=False))
+    except Exception as e:
+        print(json.dumps({'error': str(e)}))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+分析結果キャッシュ
+正規化テキストとモデル・辞書バージョンのハッシュをキーに、
+形態素解析・感情分析の結果をLRUキャッシュ（任意でSQLiteに永続化）する
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# 環境変数による設定
+CACHE_PATH = os.environ.get('ANALYSIS_CACHE_PATH')
+CACHE_SIZE = int(os.environ.get('ANALYSIS_CACHE_SIZE', '10000'))
+
+def normalize_text(text: str) -> str:
+    """キャッシュキー用にテキストを正規化（NFKC・前後空白除去）"""
+    return unicodedata.normalize('NFKC', text).strip()
+
+class _DiskStore:
+    """キャッシュのSQLiteバックエンド（複数の名前空間で共有）"""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self.pending: List[Tuple[str, str]] = []
+        atexit.register(self.flush)
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self.conn.execute('SELECT value FROM cache WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, value: Any) -> None:
+        self.pending.append((key, json.dumps(value, ensure_ascii=False)))
+        if len(self.pending) >= 256:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        try:
+            self.conn.executemany('INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)', self.pending)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            print(f"Warning: failed to persist analysis cache: {e}", file=sys.stderr)
+        self.pending = []
+
+_disk_stores: Dict[str, _DiskStore] = {}
+
+def _get_disk_store(path: str) -> Optional[_DiskStore]:
+    if path not in _disk_stores:
+        try:
+            _disk_stores[path] = _DiskStore(path)
+        except sqlite3.Error as e:
+            print(f"Warning: analysis cache is not available ({e}). Using memory only.", file=sys.stderr)
+            return None
+    return _disk_stores[path]
+
+class AnalysisCache:
+    """内容アドレス型のLRUキャッシュ（ヒット・ミス数を計測）"""
+
+    def __init__(
+        self,
+        namespace: str,
+        version: str,
+        max_entries: int = CACHE_SIZE,
+        path: Optional[str] = CACHE_PATH,
+    ):
+        self.namespace = namespace
+        self.version = version
+        self.max_entries = max(1, max_entries)
+        self.entries: 'OrderedDict[str, Any]' = OrderedDict()
+        self.disk = _get_disk_store(path) if path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        """正規化テキスト＋名前空間＋バージョンのハッシュ"""
+        raw = f'{self.namespace}\0{self.version}\0{normalize_text(text)}'
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, text: str) -> Optional[Any]:
+        key = self.key(text)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.disk_hits += 1
+                self._remember(key, value)
+                return value
+
+        self.misses += 1
+        return None
+
+    def put(self, text: str, value: Any) -> None:
+        key = self.key(text)
+        self._remember(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def flush(self) -> None:
+        """未書き込みのエントリをディスクに反映"""
+        if self.disk is not None:
+            self.disk.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'size': len(self.entries),
+            'max_entries': self.max_entries,
+            'persistent': self.disk is not None,
+        }
+
+    def _remember(self, key: str, value: Any) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
@@ -0,0 +1,406 @@
+"""
+分析処理のベンチマーク
+乱数シード付きの合成データ（日本語自由記述・8尺度のSD法スコア）を生成し、
+各処理の実行時間・ピークメモリ・スループットを計測してJSONで保存する
+（基準結果と比較し、閾値を超える劣化があれば終了コード1を返す）
+
+使用例:
+  python3 analysis/benchmark.py --sizes 1000,10000 --output bench.json
+  python3 analysis/benchmark.py --compare bench.json --threshold 0.2
+  python3 analysis/benchmark.py --generate free_texts --rows 1000 > free_texts.ndjson
+  python3 analysis/benchmark.py --sentiment-backends eager,int8,onnx --rows 1000 --cores 0-3
+"""
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from metrics import peak_rss_mb
+from sentiment_backends import BACKENDS as SENTIMENT_BACKENDS, pin_cores, thread_settings
+
+# 計測する行数の既定値
+PRESET_SIZES = [1000, 10000, 100000, 1000000]
+
+# 1つの処理の制限時間（秒）
+STAGE_TIMEOUT = float(os.environ.get('BENCHMARK_STAGE_TIMEOUT', '900'))
+
+# 劣化とみなす増加率の既定値と、比較対象から除外する短い処理時間（秒）
+DEFAULT_THRESHOLD = 0.2
+MIN_COMPARABLE_SECONDS = 0.05
+
+DEFAULT_SEED = 42
+
+# 自由記述の合成に使う語句（prisma/generate-mock-data.ts のサンプルと同じ語彙）
+TEXT_SUBJECTS = ['低音', '高音', 'モーター音', '加速音', '音の質感', '全体の印象', '走行音', '響き']
+TEXT_DESCRIPTIONS = [
+    'が響いていて重厚感があった', 'が心地よく、高級感を感じた', 'は静かで快適な印象', 'が目立って耳障りだった',
+    'は人工的で違和感があった', 'は自然で馴染みやすい', 'に力強さを感じる', 'から先進的な印象を受けた',
+    'が滑らかで心地よい', 'がざらざらしていて不快', 'は弱々しく、パワー感がない', 'が未来を感じさせる',
+]
+TEXT_COMMENTS = [
+    '', '', '', 'とても良い', '満足', '好き', '気に入った', '素晴らしい', '少しうるさい', '不満', '嫌い',
+    '運転していて安心感がある', 'もう少し静かだといい', '長時間だと疲れそう', 'また聴きたい',
+]
+
+# SD法スコアの合成に使う因子負荷量（8尺度 × 3因子：快適性・迫力・先進性）
+SD_LOADINGS = np.array([
+    [0.8, -0.2, 0.0],
+    [0.7, 0.1, 0.1],
+    [0.3, 0.4, 0.3],
+    [0.0, 0.2, 0.8],
+    [-0.2, 0.8, 0.1],
+    [0.7, -0.1, 0.0],
+    [0.1, 0.7, 0.3],
+    [0.6, 0.0, -0.3],
+])
+
+def generate_free_texts(n_rows: int, seed: int = DEFAULT_SEED) -> List[str]:
+    """日本語の自由記述（1〜3文）を合成"""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n_rows):
+        sentences = []
+        for _ in range(rng.randint(1, 3)):
+            sentence = rng.choice(TEXT_SUBJECTS) + rng.choice(TEXT_DESCRIPTIONS)
+            comment = rng.choice(TEXT_COMMENTS)
+            sentences.append(f'{sentence}。{comment}' if comment else sentence)
+        texts.append('。'.join(sentences))
+    return texts
+
+def generate_sd_scores(n_rows: int, seed: int = DEFAULT_SEED) -> np.ndarray:
+    """3因子モデルから -3〜3 の整数のSD法スコア（行数 × 8）を合成"""
+    rng = np.random.default_rng(seed)
+    factors = rng.standard_normal((n_rows, SD_LOADINGS.shape[1]))
+    noise = rng.standard_normal((n_rows, SD_LOADINGS.shape[0])) * 0.6
+    return np.clip(np.rint((factors @ SD_LOADINGS.T + noise) * 1.5), -3, 3)
+
+def _factor_streaming(factor_analysis: Any, scores: np.ndarray) -> Any:
+    size = factor_analysis.STREAM_CHUNK_SIZE
+    chunks = (scores[start:start + size] for start in range(0, len(scores), size))
+    return factor_analysis.perform_streaming_factor_analysis(chunks)
+
+# 処理名 → (入力データの生成関数, モジュール名, 計測対象の関数)
+STAGES: Dict[str, Tuple[Callable[[int, int], Any], str, Callable[[Any, Any], Any]]] = {
+    'nlp_analysis': (generate_free_texts, 'nlp_analysis', lambda m, texts: m.analyze_free_texts(texts)),
+    'improved_nlp': (generate_free_texts, 'improved_nlp', lambda m, texts: m.analyze_free_texts_improved(texts)),
+    'cooccurrence': (generate_free_texts, 'improved_nlp', lambda m, texts: m.build_cooccurrence_matrix(texts)),
+    'factor_analysis': (
+        generate_sd_scores, 'factor_analysis', lambda m, scores: m.perform_factor_analysis(scores, use_cache=False)
+    ),
+    'factor_streaming': (generate_sd_scores, 'factor_analysis', _factor_streaming),
+}
+
+def run_stage(stage: str, n_rows: int, seed: int) -> Dict[str, Any]:
+    """1つの処理を現在のプロセスで計測（モジュールの読み込み・データ生成は計測に含めない）"""
+    generate, module_name, func = STAGES[stage]
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    import_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    data = generate(n_rows, seed)
+    setup_seconds = time.perf_counter() - start
+    rss_before = peak_rss_mb()
+
+    start = time.perf_counter()
+    func(module, data)
+    wall_seconds = time.perf_counter() - start
+
+    return {
+        'stage': stage,
+        'rows': n_rows,
+        'wall_seconds': wall_seconds,
+        'throughput_rows_per_s': n_rows / wall_seconds if wall_seconds > 0 else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'setup_peak_rss_mb': rss_before,
+        'setup_seconds': setup_seconds,
+        'import_seconds': import_seconds,
+    }
+
+def run_stage_subprocess(stage: str, n_rows: int, seed: int, timeout: float = STAGE_TIMEOUT) -> Dict[str, Any]:
+    """処理ごとに新しいプロセスで計測（ピークメモリ・読み込み済みモジュールが他の処理と混ざらないように）"""
+    command = [sys.executable, os.path.abspath(__file__), '--run-stage', stage, '--rows', str(n_rows), '--seed', str(seed)]
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {'stage': stage, 'rows': n_rows, 'error': f'timeout after {timeout:.0f}s'}
+    if completed.returncode != 0:
+        message = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed'
+        return {'stage': stage, 'rows': n_rows, 'error': message}
+    return json.loads(completed.stdout)
+
+def run_benchmarks(stages: List[str], sizes: List[int], seed: int, timeout: float = STAGE_TIMEOUT) -> Dict[str, Any]:
+    """全ての処理 × 行数を計測"""
+    results = []
+    for stage in stages:
+        for n_rows in sizes:
+            result = run_stage_subprocess(stage, n_rows, seed, timeout)
+            results.append(result)
+            summary = result.get('error') or f"{result['wall_seconds']:.3f}s, {result['peak_rss_mb']:.0f}MB"
+            print(f'{stage} x {n_rows}: {summary}', file=sys.stderr)
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': seed,
+        'results': results,
+    }
+
+def compare_results(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    threshold: float = DEFAULT_THRESHOLD,
+    min_seconds: float = MIN_COMPARABLE_SECONDS,
+) -> List[Dict[str, Any]]:
+    """基準結果と比べて実行時間・ピークメモリが閾値を超えて増えた処理を返す"""
+    baseline_results = {
+        (result['stage'], result['rows']): result
+        for result in baseline.get('results', [])
+        if 'error' not in result
+    }
+    regressions = []
+    for result in current.get('results', []):
+        base = baseline_results.get((result['stage'], result['rows']))
+        if base is None:
+            continue
+        if 'error' in result:
+            regressions.append({'stage': result['stage'], 'rows': result['rows'], 'metric': 'error', 'error': result['error']})
+            continue
+        for metric in ('wall_seconds', 'peak_rss_mb'):
+            # 計測誤差が大きい短時間の処理は実行時間を比較しない
+            if metric == 'wall_seconds' and max(result[metric], base[metric]) < min_seconds:
+                continue
+            ratio = result[metric] / base[metric] if base[metric] > 0 else float('inf')
+            if ratio > 1.0 + threshold:
+                regressions.append({
+                    'stage': result['stage'],
+                    'rows': result['rows'],
+                    'metric': metric,
+                    'baseline': base[metric],
+                    'current': result[metric],
+                    'ratio': ratio,
+                })
+    return regressions
+
+def run_sentiment_backend(n_rows: int, seed: int, batch_size: int) -> Dict[str, Any]:
+    """現在のプロセスで感情分析の推論を計測（バックエンドは環境変数 SENTIMENT_BACKEND で指定）
+
+    キャッシュを通さずに推論し、バッチごとの所要時間とスコアを返す。
+    推論専用の子プロセスで実行されるため、SENTIMENT_CPU_CORES の指定時はプロセス全体をそのコアに固定する。
+    """
+    pin_cores(thread_settings()['cores'])
+    start = time.perf_counter()
+    improved_nlp = importlib.import_module('improved_nlp')
+    if not improved_nlp.load_bert():
+        raise RuntimeError('BERT is not available')
+    load_seconds = time.perf_counter() - start
+
+    texts = generate_free_texts(n_rows, seed)
+    # 初回のみ発生する初期化（メモリ確保・グラフ最適化）を計測から除く
+    improved_nlp._infer_sentiment_batch(texts[:batch_size], batch_size)
+
+    scores: List[float] = []
+    latencies: List[float] = []
+    for offset in range(0, len(texts), batch_size):
+        batch_start = time.perf_counter()
+        scores.extend(improved_nlp._infer_sentiment_batch(texts[offset:offset + batch_size], batch_size))
+        latencies.append(time.perf_counter() - batch_start)
+    wall_seconds = sum(latencies)
+
+    return {
+        'backend': improved_nlp.sentiment_backend.name,
+        'rows': n_rows,
+        'batch_size': batch_size,
+        'load_seconds': load_seconds,
+        'wall_seconds': wall_seconds,
+        'throughput_rows_per_s': n_rows / wall_seconds if wall_seconds > 0 else None,
+        'batch_latency_p50': float(np.percentile(latencies, 50)),
+        'batch_latency_p95': float(np.percentile(latencies, 95)),
+        'peak_rss_mb': peak_rss_mb(),
+        'scores': scores,
+    }
+
+def score_agreement(scores: List[float], reference: List[float]) -> Dict[str, float]:
+    """基準（eager）とのスコアの一致度"""
+    a = np.asarray(scores, dtype=np.float64)
+    b = np.asarray(reference, dtype=np.float64)
+    agreement = {
+        'mean_abs_diff': float(np.mean(np.abs(a - b))),
+        'max_abs_diff': float(np.max(np.abs(a - b))),
+        # 正・負・0 の判定が一致する割合
+        'sign_agreement': float(np.mean(np.sign(a) == np.sign(b))),
+    }
+    if np.std(a) > 0 and np.std(b) > 0:
+        agreement['correlation'] = float(np.corrcoef(a, b)[0, 1])
+    return agreement
+
+def compare_sentiment_backends(
+    backends: List[str],
+    n_rows: int,
+    seed: int,
+    batch_size: int,
+    thread_env: Dict[str, str],
+    timeout: float = STAGE_TIMEOUT,
+) -> Dict[str, Any]:
+    """バックエンドごとに別プロセスで計測し、先頭のバックエンドを基準に速度とスコアの一致度を比較"""
+    results = []
+    reference: Dict[str, Any] = {}
+    for backend in backends:
+        command = [
+            sys.executable, os.path.abspath(__file__), '--run-sentiment-backend',
+            '--rows', str(n_rows), '--seed', str(seed), '--batch-size', str(batch_size),
+        ]
+        env = {**os.environ, **thread_env, 'SENTIMENT_BACKEND': backend}
+        try:
+            completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout, env=env)
+        except subprocess.TimeoutExpired:
+            results.append({'backend': backend, 'error': f'timeout after {timeout:.0f}s'})
+            continue
+        if completed.returncode != 0:
+            message = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed'
+            results.append({'backend': backend, 'error': message})
+            continue
+
+        result = json.loads(completed.stdout)
+        scores = result.pop('scores')
+        result['requested_backend'] = backend
+        if backend == backends[0]:
+            reference = {'scores': scores, 'throughput': result['throughput_rows_per_s']}
+        elif reference:
+            result['agreement'] = score_agreement(scores, reference['scores'])
+            if reference['throughput'] and result['throughput_rows_per_s']:
+                result['speedup'] = result['throughput_rows_per_s'] / reference['throughput']
+        results.append(result)
+        print(
+            f"sentiment[{result['backend']}] x {n_rows}: {result['wall_seconds']:.3f}s, "
+            f"{result['throughput_rows_per_s']:.1f} texts/s",
+            file=sys.stderr,
+        )
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': seed,
+        'threads': thread_env,
+        'sentiment_backends': results,
+    }
+
+def iter_generated_records(kind: str, n_rows: int, seed: int) -> Iterator[Any]:
+    """合成データをNDJSONのレコードとして返す"""
+    if kind == 'free_texts':
+        for text in generate_free_texts(n_rows, seed):
+            yield {'text': text}
+    else:
+        for row in generate_sd_scores(n_rows, seed):
+            yield row.tolist()
+
+def _parse_list(value: str, convert: Callable[[str], Any] = str) -> List[Any]:
+    return [convert(item.strip()) for item in value.split(',') if item.strip()]
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='分析処理のベンチマーク')
+    parser.add_argument('--stages', default=','.join(STAGES), help='計測する処理（カンマ区切り）')
+    parser.add_argument('--sizes', default=','.join(str(n) for n in PRESET_SIZES), help='計測する行数（カンマ区切り）')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='合成データの乱数シード')
+    parser.add_argument('--timeout', type=float, default=STAGE_TIMEOUT, help='1処理あたりの制限時間（秒）')
+    parser.add_argument('--output', '-o', help='結果JSONの保存先（省略時は標準出力）')
+    parser.add_argument('--compare', help='比較する基準結果のJSON')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='劣化とみなす増加率（0.2 = 20%%）')
+    parser.add_argument('--generate', choices=['free_texts', 'sd_scores'], help='合成データをNDJSONで出力する')
+    parser.add_argument('--rows', type=int, default=1000, help='--generate / --run-stage の行数')
+    parser.add_argument(
+        '--sentiment-backends', help='感情分析の推論バックエンドを比較する（カンマ区切り、先頭が基準: eager,int8,onnx,onnx-int8）'
+    )
+    parser.add_argument('--batch-size', type=int, default=32, help='感情分析のバッチサイズ')
+    parser.add_argument('--intra-op', type=int, help='感情分析の演算内スレッド数')
+    parser.add_argument('--inter-op', type=int, help='感情分析の演算間スレッド数')
+    parser.add_argument('--cores', help='感情分析に使うCPUコア（例: 0-3）')
+    parser.add_argument('--run-stage', choices=list(STAGES), help=argparse.SUPPRESS)
+    parser.add_argument('--run-sentiment-backend', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        print(json.dumps(run_stage(args.run_stage, args.rows, args.seed)))
+        return
+
+    if args.run_sentiment_backend:
+        print(json.dumps(run_sentiment_backend(args.rows, args.seed, args.batch_size)))
+        return
+
+    if args.generate:
+        for record in iter_generated_records(args.generate, args.rows, args.seed):
+            print(json.dumps(record, ensure_ascii=False))
+        return
+
+    if args.sentiment_backends:
+        backends = _parse_list(args.sentiment_backends)
+        unknown = [backend for backend in backends if backend not in SENTIMENT_BACKENDS]
+        if unknown:
+            parser.error(f'unknown sentiment backend: {", ".join(unknown)}')
+        thread_env = {
+            name: str(value)
+            for name, value in (
+                ('SENTIMENT_INTRA_OP_THREADS', args.intra_op),
+                ('SENTIMENT_INTER_OP_THREADS', args.inter_op),
+                ('SENTIMENT_CPU_CORES', args.cores),
+            )
+            if value is not None
+        }
+        report = compare_sentiment_backends(
+            backends, args.rows, args.seed, args.batch_size, thread_env, args.timeout
+        )
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+        else:
+            print(output)
+        return
+
+    stages = _parse_list(args.stages)
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f'unknown stage: {", ".join(unknown)}')
+
+    report = run_benchmarks(stages, _parse_list(args.sizes, int), args.seed, args.timeout)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['baseline'] = args.compare
+        report['threshold'] = args.threshold
+        report['regressions'] = compare_results(report, baseline, args.threshold)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    for regression in report.get('regressions', []):
+        if regression['metric'] == 'error':
+            print(f"Regression: {regression['stage']} x {regression['rows']}: {regression['error']}", file=sys.stderr)
+        else:
+            print(
+                f"Regression: {regression['stage']} x {regression['rows']} {regression['metric']} "
+                f"{regression['baseline']:.3f} -> {regression['current']:.3f} ({regression['ratio']:.2f}x)",
+                file=sys.stderr,
+            )
+    if report.get('regressions'):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+共起集計エンジン
+トークンID配列からウィンドウ内のペアをNumPyのインデックス演算で生成し、
+疎行列として集計する（PMI / NPMIによるスコアリングにも対応）
+"""
+
+import importlib.util
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# scipy.sparse はインポートに時間がかかるため、疎行列が必要になった時点で読み込む
+SCIPY_AVAILABLE = importlib.util.find_spec('scipy') is not None
+
+from corpus import Vocabulary
+
+SCORING_METHODS = ('count', 'pmi', 'npmi')
+
+# 未集約のペアがこの行数と集約済みのペア数の両方以上になったら集約する
+REDUCE_MIN_ROWS = 1 << 20
+
+class CooccurrenceCounter:
+    """ウィンドウ内共起の疎行列集計（ペアは出現順を保持して集約）"""
+
+    def __init__(self, vocabulary: Vocabulary, window: int = 2):
+        self.vocabulary = vocabulary
+        self.window = window
+        # 集約済みのペア（ID昇順）・頻度・初出位置
+        self.low = np.zeros(0, dtype=np.int64)
+        self.high = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.first = np.zeros(0, dtype=np.int64)
+        # これまでに処理したトークン数（初出位置の通し番号用）
+        self.position = 0
+        # 未集約のペア（low, high, counts, first の組）とその行数
+        self._pending: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+        self._pending_rows = 0
+
+    def __getstate__(self) -> Dict[str, object]:
+        # 並列処理のワーカーから返す前に集約する（親プロセスで集約し直さない）
+        self._reduce()
+        return self.__dict__
+
+    def add_documents(self, documents: Iterable[array]) -> None:
+        """文書群の共起を加算（文書をまたぐペアは数えない）"""
+        arrays = [np.frombuffer(doc, dtype=np.uint32) for doc in documents if len(doc) > 0]
+        if not arrays:
+            return
+
+        ids = np.concatenate(arrays).astype(np.int64)
+        lengths = np.array([len(a) for a in arrays])
+        doc_index = np.repeat(np.arange(len(arrays)), lengths)
+
+        lows: List[np.ndarray] = []
+        highs: List[np.ndarray] = []
+        keys: List[np.ndarray] = []
+        for distance in range(1, self.window + 1):
+            # 同一文書内で distance 離れたトークン同士をペアにする
+            left = np.nonzero(doc_index[:-distance] == doc_index[distance:])[0]
+            a = ids[left]
+            b = ids[left + distance]
+            lows.append(np.minimum(a, b))
+            highs.append(np.maximum(a, b))
+            # 逐次ループ（i → j の順）と同じ順序になる通し番号
+            keys.append((self.position + left) * self.window + (distance - 1))
+        self.position += len(ids)
+
+        self._merge(
+            np.concatenate(lows),
+            np.concatenate(highs),
+            np.ones(sum(len(k) for k in keys), dtype=np.int64),
+            np.concatenate(keys),
+        )
+
+    def merge(self, other: 'CooccurrenceCounter') -> None:
+        """別の集計（後続のトークン列を処理したもの）を統合する
+
+        語彙は文字列で対応付けるため、別プロセスで集計した結果も統合できる。
+        初出位置は other のトークンが self の後に続くものとして扱う。
+        """
+        if other.window != self.window:
+            raise ValueError('window size mismatch')
+        other._reduce()
+        translation = np.array([self.vocabulary.intern(token) for token in other.vocabulary], dtype=np.int64)
+        if len(other) > 0:
+            a = translation[other.low]
+            b = translation[other.high]
+            self._merge(
+                np.minimum(a, b),
+                np.maximum(a, b),
+                other.counts,
+                other.first + self.position * self.window,
+            )
+        self.position += other.position
+
+    def _merge(self, low: np.ndarray, high: np.ndarray, counts: np.ndarray, first: np.ndarray) -> None:
+        """新しいペアを未集約のバッファに追加する
+
+        集約済みのペア数以上たまったときだけ集約するため、チャンクごとに
+        全ペアを並べ直さず、集約の総コストは追加したペア数にほぼ比例する。
+        """
+        self._pending.append((low, high, counts, first))
+        self._pending_rows += len(low)
+        if self._pending_rows >= max(REDUCE_MIN_ROWS, len(self.counts)):
+            self._reduce()
+
+    def _reduce(self) -> None:
+        """未集約のペアを既存の集計に統合し、同一ペアを1行に集約"""
+        if not self._pending:
+            return
+        parts = [(self.low, self.high, self.counts, self.first), *self._pending]
+        self._pending = []
+        self._pending_rows = 0
+        low, high, counts, first = (np.concatenate(columns) for columns in zip(*parts))
+
+        codes = (low << 32) | high
+        unique_codes, inverse = np.unique(codes, return_inverse=True)
+        merged_counts = np.zeros(len(unique_codes), dtype=np.int64)
+        np.add.at(merged_counts, inverse, counts)
+        merged_first = np.full(len(unique_codes), np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(merged_first, inverse, first)
+
+        self.low = unique_codes >> 32
+        self.high = unique_codes & 0xFFFFFFFF
+        self.counts = merged_counts
+        self.first = merged_first
+
+    def __len__(self) -> int:
+        self._reduce()
+        return len(self.counts)
+
+    def matrix(self) -> 'sparse.csr_matrix':
+        """共起頻度の疎行列（上三角、語彙サイズ × 語彙サイズ）"""
+        if not SCIPY_AVAILABLE:
+            raise RuntimeError('scipy is not available')
+        self._reduce()
+        from scipy import sparse
+        size = len(self.vocabulary)
+        return sparse.coo_matrix((self.counts, (self.low, self.high)), shape=(size, size)).tocsr()
+
+    def scores(self, scoring: str = 'count') -> np.ndarray:
+        """ペアごとのスコア（頻度・PMI・NPMI）"""
+        self._reduce()
+        if scoring == 'count':
+            return self.counts.astype(np.float64)
+        if scoring not in SCORING_METHODS:
+            raise ValueError(f'Unknown scoring method: {scoring}')
+
+        # 周辺頻度：各ペアは両方の語に1回ずつ寄与する
+        size = len(self.vocabulary)
+        if SCIPY_AVAILABLE:
+            matrix = self.matrix()
+            marginal = np.asarray(matrix.sum(axis=0)).ravel() + np.asarray(matrix.sum(axis=1)).ravel()
+        else:
+            marginal = (
+                np.bincount(self.low, weights=self.counts, minlength=size)
+                + np.bincount(self.high, weights=self.counts, minlength=size)
+            )
+        total = float(self.counts.sum())
+        joint = self.counts / total
+        pmi = (
+            np.log(joint)
+            - np.log(marginal[self.low] / (2 * total))
+            - np.log(marginal[self.high] / (2 * total))
+        )
+        if scoring == 'pmi':
+            return pmi
+        # 全ペアが同一の場合は -log(p) = 0 になるため1とする
+        denominator = -np.log(joint)
+        return np.divide(pmi, denominator, out=np.ones_like(pmi), where=denominator > 0)
+
+    def top(self, k: int = 20, scoring: str = 'count') -> List[Tuple[str, str, int, float]]:
+        """スコア上位kペア（同点は初出順）を (語1, 語2, 頻度, スコア) で返す"""
+        if len(self) == 0 or k <= 0:
+            return []
+
+        scores = self.scores(scoring)
+        if len(scores) > k:
+            # k番目のスコア以上の候補のみを並べ替える
+            threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+            candidates = np.nonzero(scores >= threshold)[0]
+        else:
+            candidates = np.arange(len(scores))
+        order = candidates[np.lexsort((self.first[candidates], -scores[candidates]))][:k]
+        return [self._pair(i) + (int(self.counts[i]), float(scores[i])) for i in order]
+
+    def items(self) -> Dict[Tuple[str, str], int]:
+        """全ペアの頻度（初出順）"""
+        self._reduce()
+        return {
+            self._pair(i): int(self.counts[i])
+            for i in np.argsort(self.first, kind='stable')
+        }
+
+    def _pair(self, index: int) -> Tuple[str, str]:
+        """ペアを文字列順に並べた語の組"""
+        word1 = self.vocabulary.token(int(self.low[index]))
+        word2 = self.vocabulary.token(int(self.high[index]))
+        return (word1, word2) if word1 <= word2 else (word2, word1)
@@ -0,0 +1,88 @@
+"""
+トークン化済みコーパス
+各テキストを一度だけ形態素解析し、語彙IDの配列として保持
+キーワード集計・共起分析などの後段処理はこの中間表現を共有する
+（全文書のIDを1本の配列に連結し、文書はその区間として参照する）
+"""
+
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+class Vocabulary:
+    """トークン文字列と整数IDの相互変換（出現順にIDを割り当て）"""
+
+    __slots__ = ('_ids', '_tokens')
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._tokens: List[str] = []
+
+    def intern(self, token: str) -> int:
+        """トークンのIDを返す（未登録なら新規登録）"""
+        token_id = self._ids.get(token)
+        if token_id is None:
+            token_id = len(self._tokens)
+            self._ids[token] = token_id
+            self._tokens.append(token)
+        return token_id
+
+    def token(self, token_id: int) -> str:
+        """IDからトークン文字列を返す"""
+        return self._tokens[token_id]
+
+    def encode(self, tokens: Iterable[str]) -> array:
+        """トークン列をID配列に変換"""
+        return array('I', [self.intern(token) for token in tokens])
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def __iter__(self) -> Iterator[str]:
+        """ID順にトークン文字列を返す"""
+        return iter(self._tokens)
+
+class TokenizedCorpus:
+    """全文書のトークンID（array('I')）と文書ごとの開始位置
+
+    文書 i のID列は tokens[offsets[i]:offsets[i + 1]] の区間で、
+    走査時は配列をコピーしない memoryview として返す。
+    """
+
+    __slots__ = ('vocabulary', 'tokens', 'offsets')
+
+    def __init__(self, vocabulary: Optional[Vocabulary] = None):
+        self.vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+        self.tokens = array('I')
+        self.offsets = array('Q', [0])
+
+    def add(self, tokens: Iterable[str]) -> int:
+        """トークン列を1文書として追加し、文書番号を返す"""
+        intern = self.vocabulary.intern
+        self.tokens.extend(intern(token) for token in tokens)
+        self.offsets.append(len(self.tokens))
+        return len(self.offsets) - 2
+
+    def document(self, index: int) -> memoryview:
+        """文書 index のID列（連結配列の区間）"""
+        return memoryview(self.tokens)[self.offsets[index]:self.offsets[index + 1]]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __iter__(self) -> Iterator[memoryview]:
+        """文書ごとのID列を順に返す（走査中は add できない）"""
+        view = memoryview(self.tokens)
+        offsets = self.offsets
+        for i in range(len(offsets) - 1):
+            yield view[offsets[i]:offsets[i + 1]]
+
+def tokenize_corpus(
+    texts: Iterable[str],
+    tokenize: Callable[[str], List[str]],
+    vocabulary: Optional[Vocabulary] = None,
+) -> TokenizedCorpus:
+    """全テキストを一度だけトークン化してコーパスを構築"""
+    corpus = TokenizedCorpus(vocabulary)
+    for text in texts:
+        corpus.add(tokenize(text))
+    return corpus
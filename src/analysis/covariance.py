@@ -0,0 +1,71 @@
+"""
+共分散の逐次集計
+行列をチャンク単位で読み込み、件数・平均・偏差平方和を Chan らの併合式で更新する
+（メモリ使用量は列数の2乗で、行数に依存しない）
+"""
+
+from typing import Iterable
+
+import numpy as np
+
+class CovarianceAccumulator:
+    """件数・平均・偏差積和行列の逐次集計（別チャンク・別プロセスの集計を併合可能）"""
+
+    def __init__(self, n_features: int):
+        self.n_features = n_features
+        self.count = 0
+        self.mean = np.zeros(n_features, dtype=np.float64)
+        # 平均からの偏差の積和 Σ(x - mean)(x - mean)^T
+        self.m2 = np.zeros((n_features, n_features), dtype=np.float64)
+
+    def update(self, rows: np.ndarray) -> None:
+        """行のまとまりを加算（チャンク内の統計量を求めてから併合する）"""
+        rows = np.asarray(rows, dtype=np.float64)
+        if rows.ndim != 2 or rows.shape[1] != self.n_features:
+            raise ValueError(f'expected rows with {self.n_features} columns, got shape {rows.shape}')
+        if len(rows) == 0:
+            return
+        mean = rows.mean(axis=0)
+        centered = rows - mean
+        self._combine(len(rows), mean, centered.T @ centered)
+
+    def merge(self, other: 'CovarianceAccumulator') -> None:
+        """別の集計結果を統合"""
+        if other.n_features != self.n_features:
+            raise ValueError('feature count mismatch')
+        if other.count > 0:
+            self._combine(other.count, other.mean, other.m2)
+
+    def _combine(self, count: int, mean: np.ndarray, m2: np.ndarray) -> None:
+        """Chan らの併合式：平均の差による補正項を加えて偏差積和を統合"""
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 = self.m2 + m2 + np.outer(delta, delta) * (self.count * count / total)
+        self.mean = self.mean + delta * (count / total)
+        self.count = total
+
+    def covariance(self, ddof: int = 0) -> np.ndarray:
+        """共分散行列（既定は StandardScaler と同じ母分散）"""
+        if self.count - ddof <= 0:
+            raise ValueError('not enough rows to compute covariance')
+        return self.m2 / (self.count - ddof)
+
+    def std(self) -> np.ndarray:
+        """各列の標準偏差（分散0の列は1として StandardScaler と揃える）"""
+        std = np.sqrt(np.diag(self.covariance()))
+        return np.where(std > 0, std, 1.0)
+
+    def correlation(self) -> np.ndarray:
+        """標準化後のデータの共分散行列（＝相関行列、分散0の列は0）"""
+        std = self.std()
+        return self.covariance() / np.outer(std, std)
+
+    def __len__(self) -> int:
+        return self.count
+
+def accumulate(chunks: Iterable[np.ndarray], n_features: int) -> CovarianceAccumulator:
+    """チャンク列から集計を構築"""
+    accumulator = CovarianceAccumulator(n_features)
+    for chunk in chunks:
+        accumulator.update(chunk)
+    return accumulator
@@ -0,0 +1,408 @@
+"""
+文埋め込みと類似テキストのクラスタリング
+improved_nlp.py で読み込んだBERTの最終層を平均プーリングした文ベクトル
+（BERTが使えない場合は文字n-gramのハッシュベクトル）をバッチで計算して
+float16 で特徴量ストア（feature_store.py）に保存し、ランダム超平面のLSH（SimHash）で候補を絞ってから
+コサイン類似度で近似重複を判定し、連結成分をクラスタとする
+
+「静かで良い」と「静かなのが良い」のような表記ゆれを同じクラスタIDにまとめ、
+価値ツリー・キーワードの集計単位に使う。
+"""
+
+import json
+import os
+import re
+import sys
+import unicodedata
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import improved_nlp
+from evaluation_db import iter_free_text_records
+from feature_store import open_store
+from input_stream import build_parser, has_input, load_json_input
+import metrics
+from nlp_store import content_hash
+
+EMBEDDING_METHODS = ('auto', 'bert', 'char-ngram')
+
+# 特徴量ストアに一度に追記する行数（計算中に保持する埋め込みの上限）
+EMBEDDING_SEGMENT_ROWS = int(os.environ.get('EMBEDDING_SEGMENT_ROWS', '10000'))
+# BERT推論のバッチサイズ
+EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', '32'))
+
+# 文字n-gramのハッシュベクトルの次元数と、ひらがなを含むn-gramの重み
+# （送り仮名・助詞の違いより漢字・カタカナの一致を重視する）
+HASH_DIM = 512
+HIRAGANA_WEIGHT = 0.35
+
+# LSH：符号ビットを LSH_BAND_BITS 以上（件数の2を底とする対数まで増やす）ずつ
+# LSH_BANDS 個のバンドに分け、バンドの値で並べたときに LSH_WINDOW 件以内にある同じ値の組を候補とする
+# （5万件・16ビットのバンドで、コサイン類似度0.85の組の約94%が候補になる）
+LSH_BANDS = int(os.environ.get('EMBEDDING_LSH_BANDS', '64'))
+LSH_BAND_BITS = int(os.environ.get('EMBEDDING_LSH_BAND_BITS', '12'))
+LSH_WINDOW = int(os.environ.get('EMBEDDING_LSH_WINDOW', '8'))
+LSH_SEED = 42
+
+# 同じクラスタとみなすコサイン類似度（埋め込みの種類ごと、環境変数で上書き可能）
+CLUSTER_THRESHOLDS = {'bert': 0.9, 'char-ngram': 0.8}
+CLUSTER_THRESHOLD = os.environ.get('EMBEDDING_CLUSTER_THRESHOLD')
+
+# この件数以下なら全ての組の類似度を計算する（LSHによる取りこぼしがない）
+EXACT_PAIR_LIMIT = 4000
+# 候補の組・類似度行列を一度に計算する件数
+VERIFY_CHUNK_SIZE = 20000
+# 結果に含めるクラスタごとのテキスト数
+MAX_CLUSTER_TEXTS = 20
+
+_HIRAGANA = re.compile('[ぁ-ゖ]')
+# 1バイトごとの立っているビット数
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_text(text: str) -> str:
+    """NFKC正規化して空白を除く（完全一致する回答は埋め込みを1回だけ計算する）"""
+    return _WHITESPACE.sub('', unicodedata.normalize('NFKC', text))
+
+def hashed_ngram_vectors(texts: Sequence[str], dim: int = HASH_DIM) -> np.ndarray:
+    """文字1-2gramの符号付きハッシュベクトル（L2正規化済み）"""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for n in (1, 2):
+            for i in range(len(text) - n + 1):
+                gram = text[i:i + n]
+                digest = zlib.crc32(gram.encode('utf-8'))
+                weight = HIRAGANA_WEIGHT if _HIRAGANA.search(gram) else 1.0
+                vectors[row, digest % dim] += weight if digest & 0x80000000 else -weight
+    return _normalize_rows(vectors)
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """要素ごとの立っているビット数（NumPy 2.0 未満では1バイトずつ表を引く）"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return _POPCOUNT[values.view(np.uint8)]
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def _bert_batches(texts: Sequence[str], batch_size: int) -> Iterator[Tuple[List[int], np.ndarray]]:
+    """BERTの最終層をアテンションマスクで平均した文ベクトルをバッチごとに返す（トークン長でバケット化）"""
+    tokenizer, model, torch = improved_nlp.tokenizer, improved_nlp.model, improved_nlp.torch
+    encodings = tokenizer(list(texts), truncation=True, max_length=512)
+    lengths = [len(ids) for ids in encodings['input_ids']]
+    order = sorted(range(len(texts)), key=lambda i: lengths[i])
+    for start in range(0, len(order), batch_size):
+        bucket = order[start:start + batch_size]
+        features = [{key: encodings[key][i] for key in encodings.keys()} for i in bucket]
+        inputs = tokenizer.pad(features, return_tensors='pt')
+        with torch.inference_mode():
+            # 分類ヘッドの手前（エンコーダ本体）の出力
+            hidden = model.base_model(**inputs).last_hidden_state
+            mask = inputs['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+        yield bucket, pooled.float().numpy()
+
+def resolve_method(method: str = 'auto') -> str:
+    """埋め込みの種類を決定（'auto' はBERTが読み込めれば 'bert'）"""
+    if method not in EMBEDDING_METHODS:
+        raise ValueError(f'Unknown embedding method: {method}')
+    if method == 'auto':
+        return 'bert' if improved_nlp.load_bert() else 'char-ngram'
+    if method == 'bert' and not improved_nlp.load_bert():
+        raise RuntimeError('BERT is not available')
+    return method
+
+def method_version(method: str) -> str:
+    """保存済みの埋め込みの再利用判定に使う、埋め込みの種類とモデルのバージョン"""
+    if method == 'bert':
+        return f'bert:{improved_nlp.model_name}:mean'
+    return f'char-ngram:{HASH_DIM}:{HIRAGANA_WEIGHT}'
+
+def embed_texts(
+    texts: Sequence[str],
+    method: str = 'auto',
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    keys: Optional[Sequence[str]] = None,
+    store: bool = True,
+) -> Tuple[np.ndarray, str]:
+    """テキストの埋め込み（float16、L2正規化済み）を入力順に返す
+
+    store: 特徴量ストアに保存し、保存済みで本文が変わっていない行は計算しない
+    keys: 行のキー（評価IDなど、省略時は本文のハッシュ）
+    """
+    method = resolve_method(method)
+    if not store:
+        return _encode(texts, method, batch_size), method
+
+    tags = [content_hash(text) for text in texts]
+    if keys is None:
+        keys = [f'text:{tag}' for tag in tags]
+    feature_store = open_store(f'embeddings-{method}', method_version(method))
+    missing = feature_store.missing(keys, tags)
+    metrics.record('embedding_store', {'stored': len(keys) - len(missing), 'computed': len(missing)})
+    for start in range(0, len(missing), EMBEDDING_SEGMENT_ROWS):
+        positions = missing[start:start + EMBEDDING_SEGMENT_ROWS]
+        # 同じ本文は1回だけ計算する
+        unique: Dict[str, int] = {}
+        rows = [unique.setdefault(texts[position], len(unique)) for position in positions]
+        vectors = _encode(list(unique), method, batch_size)
+        feature_store.append([keys[position] for position in positions], vectors[rows],
+                             [tags[position] for position in positions])
+    return feature_store.get(keys), method
+
+def _encode(texts: Sequence[str], method: str, batch_size: int) -> np.ndarray:
+    """埋め込みをバッチごとに計算して float16 の行列に書き込む"""
+    if method == 'bert':
+        batches = _bert_batches(texts, batch_size)
+        dim = improved_nlp.model.config.hidden_size
+    else:
+        batches = (
+            (list(range(start, min(start + batch_size, len(texts)))),
+             hashed_ngram_vectors(texts[start:start + batch_size]))
+            for start in range(0, len(texts), batch_size)
+        )
+        dim = HASH_DIM
+
+    matrix = np.zeros((len(texts), dim), dtype=np.float16)
+    with metrics.stage('embed'):
+        for rows, vectors in batches:
+            matrix[rows] = _normalize_rows(vectors).astype(np.float16)
+    return matrix
+
+def simhash_signatures(vectors: np.ndarray, n_bits: int, seed: int = LSH_SEED, block_size: int = 10000) -> np.ndarray:
+    """ランダム超平面の符号ビット（角度が近いベクトルほど多くのビットが一致する）"""
+    planes = np.random.default_rng(seed).standard_normal((vectors.shape[1], n_bits)).astype(np.float32)
+    signatures = np.empty((len(vectors), n_bits), dtype=bool)
+    for start in range(0, len(vectors), block_size):
+        block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+        signatures[start:start + len(block)] = block @ planes > 0
+    return signatures
+
+def candidate_pairs(
+    signatures: np.ndarray,
+    band_bits: int = LSH_BAND_BITS,
+    window: int = LSH_WINDOW,
+) -> Iterator[np.ndarray]:
+    """バンドごとに、同じバンド値を持つ近傍の組 (i, j), i < j を返す"""
+    weights = np.int64(1) << np.arange(band_bits, dtype=np.int64)
+    for start in range(0, signatures.shape[1] - band_bits + 1, band_bits):
+        keys = signatures[:, start:start + band_bits].astype(np.int64) @ weights
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        for offset in range(1, min(window, len(order) - 1) + 1):
+            # 並べた列で offset 離れて同じ値がなければ、それより離れた組もない
+            same = np.flatnonzero(sorted_keys[:-offset] == sorted_keys[offset:])
+            if len(same) == 0:
+                break
+            first, second = order[same], order[same + offset]
+            yield np.stack([np.minimum(first, second), np.maximum(first, second)], axis=1)
+
+def _all_similar_pairs(vectors: np.ndarray, threshold: float) -> np.ndarray:
+    """全ての組の類似度を行ブロックごとに計算して threshold 以上の組を返す"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    block_size = max(1, VERIFY_CHUNK_SIZE // max(len(matrix), 1))
+    pairs: List[np.ndarray] = []
+    for start in range(0, len(matrix), block_size):
+        similarity = matrix[start:start + block_size] @ matrix.T
+        rows, columns = np.nonzero(similarity >= threshold)
+        rows += start
+        upper = rows < columns
+        pairs.append(np.stack([rows[upper], columns[upper]], axis=1))
+    return np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+
+def similar_pairs(vectors: np.ndarray, threshold: float, n_bands: int = LSH_BANDS) -> np.ndarray:
+    """コサイン類似度が threshold 以上の組（件数が多い場合はLSHの候補のみを検証）"""
+    n = len(vectors)
+    if n <= EXACT_PAIR_LIMIT:
+        return _all_similar_pairs(vectors, threshold)
+
+    # 1つのバケットに入る件数の期待値が1前後になるようにバンドのビット数を決める
+    band_bits = max(LSH_BAND_BITS, int(np.ceil(np.log2(n))))
+    signatures = simhash_signatures(vectors, n_bands * band_bits)
+    # 複数のバンドで候補になった組は1回だけ検証する
+    keys = np.unique(np.concatenate([
+        pairs[:, 0] * n + pairs[:, 1] for pairs in candidate_pairs(signatures, band_bits)
+    ] or [np.empty(0, dtype=np.int64)]))
+    metrics.count('candidate_pairs', len(keys))
+
+    # 符号ビットの一致率から角度を推定し、明らかに遠い組はベクトルを読まずに除く
+    # （推定の標準偏差の約4倍の余裕を持たせる）
+    packed = np.packbits(signatures, axis=1)
+    if packed.shape[1] % 8 == 0:
+        packed = packed.view(np.uint64)
+    n_bits = signatures.shape[1]
+    max_angle = np.arccos(np.clip(threshold, -1.0, 1.0)) + 4 * np.pi * np.sqrt(0.25 / n_bits)
+    accepted: List[np.ndarray] = []
+    for start in range(0, len(keys), VERIFY_CHUNK_SIZE):
+        chunk = keys[start:start + VERIFY_CHUNK_SIZE]
+        differing = _popcount(packed[chunk // n] ^ packed[chunk % n]).sum(axis=1, dtype=np.int64)
+        chunk = chunk[np.pi * differing / n_bits <= max_angle]
+        a = np.asarray(vectors[chunk // n], dtype=np.float32)
+        b = np.asarray(vectors[chunk % n], dtype=np.float32)
+        accepted.append(chunk[np.einsum('ij,ij->i', a, b) >= threshold])
+    keys = np.concatenate(accepted) if accepted else np.empty(0, dtype=np.int64)
+    return np.stack([keys // n, keys % n], axis=1)
+
+def connected_components(n: int, pairs: np.ndarray) -> np.ndarray:
+    """組でつながった要素に同じラベル（成分内の最小の番号）を付ける
+
+    ラベルの最小値の伝播とポインタジャンプを収束まで繰り返す（Union-Find の配列版）。
+    """
+    labels = np.arange(n)
+    if len(pairs) == 0:
+        return labels
+    first, second = pairs[:, 0], pairs[:, 1]
+    while True:
+        smallest = np.minimum(labels[first], labels[second])
+        updated = labels.copy()
+        np.minimum.at(updated, first, smallest)
+        np.minimum.at(updated, second, smallest)
+        # 根までたどる（ラベルが自身を指すまで）
+        while True:
+            jumped = updated[updated]
+            if np.array_equal(jumped, updated):
+                break
+            updated = jumped
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+def cluster_texts(
+    texts: Sequence[str],
+    method: str = 'auto',
+    threshold: Optional[float] = None,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    store: bool = True,
+    keys: Optional[Sequence[str]] = None,
+) -> Dict[str, Any]:
+    """テキストを近似重複のクラスタにまとめる
+
+    keys: 各テキストの評価ID（指定時は評価IDごとに埋め込みを保存する）
+    labels: 入力順の各テキストのクラスタID（IDは最初に出現した順）
+    clusters: クラスタごとの件数・代表テキスト（最も多いテキスト）・含まれるテキスト
+    """
+    normalized = [normalize_text(text or '') for text in texts]
+    # 正規化後に一致するテキストは1行にまとめる
+    unique_index: Dict[str, int] = {}
+    text_rows = np.array([unique_index.setdefault(text, len(unique_index)) for text in normalized], dtype=np.int64)
+    unique_texts = list(unique_index)
+    metrics.count('texts', len(texts))
+    metrics.count('unique_texts', len(unique_texts))
+
+    with metrics.stage('encode'):
+        if keys is not None and store:
+            # 全ての評価の埋め込みを保存し、一意なテキストごとに最初の行を使う
+            _, first_positions = np.unique(text_rows, return_index=True)
+            vectors, method = embed_texts(normalized, method, batch_size, keys)
+            vectors = vectors[first_positions]
+        else:
+            vectors, method = embed_texts(unique_texts, method, batch_size, store=store)
+    if threshold is None:
+        threshold = float(CLUSTER_THRESHOLD) if CLUSTER_THRESHOLD else CLUSTER_THRESHOLDS[method]
+    with metrics.stage('cluster'):
+        pairs = similar_pairs(vectors, threshold) if len(unique_texts) > 1 else np.empty((0, 2), dtype=np.int64)
+        components = connected_components(len(unique_texts), pairs)
+
+    # クラスタIDを出現順に振り直す（一意なテキストの行番号は入力での出現順）
+    _, first_seen, inverse = np.unique(components, return_index=True, return_inverse=True)
+    rank = np.empty(len(first_seen), dtype=np.int64)
+    rank[np.argsort(first_seen, kind='stable')] = np.arange(len(first_seen))
+    row_labels = rank[inverse]
+    labels = row_labels[text_rows]
+
+    # 一意なテキストごとの件数と、元の表記（最初に出現したもの）
+    text_counts = np.bincount(text_rows, minlength=len(unique_texts))
+    originals: List[Optional[str]] = [None] * len(unique_texts)
+    for position, row in enumerate(text_rows.tolist()):
+        if originals[row] is None:
+            originals[row] = texts[position]
+
+    # クラスタ内で件数の多い順（同数なら出現順）に並べ、先頭を代表とする
+    order = np.lexsort((np.arange(len(unique_texts)), -text_counts, row_labels))
+    sizes = np.bincount(labels, minlength=len(first_seen))
+    members: List[List[str]] = [[] for _ in range(len(first_seen))]
+    for row in order.tolist():
+        members[row_labels[row]].append(originals[row])
+    clusters = [
+        {
+            'id': cluster,
+            'size': int(sizes[cluster]),
+            'representative': members[cluster][0],
+            'texts': members[cluster][:MAX_CLUSTER_TEXTS],
+        }
+        for cluster in np.argsort(-sizes, kind='stable').tolist()
+    ]
+
+    return {
+        'labels': labels.tolist(),
+        'clusters': clusters,
+        'n_texts': len(texts),
+        'n_unique_texts': len(unique_texts),
+        'n_clusters': len(clusters),
+        'method': method,
+        'threshold': threshold,
+    }
+
+def cluster_from_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """パラメータ（texts・keys または db の自由記述、method・threshold）からクラスタリング"""
+    try:
+        keys = params.get('keys')
+        if params.get('db'):
+            with metrics.stage('load'):
+                records = [(key, text) for key, text in iter_free_text_records(params['db']) if text.strip()]
+            keys = [key for key, _ in records]
+            texts = [text for _, text in records]
+        else:
+            texts = [text if isinstance(text, str) else '' for text in params.get('texts', [])]
+        if keys is not None and len(keys) != len(texts):
+            raise ValueError('keys and texts must have the same length')
+        threshold = params.get('threshold')
+        return cluster_texts(
+            texts,
+            method=params.get('method', 'auto'),
+            threshold=float(threshold) if threshold is not None else None,
+            batch_size=int(params.get('batch_size') or EMBEDDING_BATCH_SIZE),
+            store=params.get('store', True),
+            keys=keys,
+        )
+    except Exception as e:
+        return {
+            'labels': [],
+            'clusters': [],
+            'error': str(e),
+        }
+
+def main():
+    """メイン処理"""
+    parser = build_parser('文埋め込みによる類似テキストのクラスタリング')
+    parser.add_argument('--db', help='自由記述を直接読み込むSQLiteデータベースのパス')
+    parser.add_argument('--method', choices=EMBEDDING_METHODS, help='埋め込みの種類（既定: auto）')
+    parser.add_argument('--threshold', type=float, help='同じクラスタとみなすコサイン類似度')
+    parser.add_argument('--no-store', action='store_true', help='埋め込みを特徴量ストアに保存しない')
+    parser.add_argument('--metrics', action='store_true', help='処理段階ごとの計測結果を含める')
+    parser.add_argument('--trace', help='計測イベントをNDJSONで追記するファイル')
+    args = parser.parse_args()
+    metrics.begin(enabled=True if args.metrics else None, trace_path=args.trace)
+    if not args.db and not has_input(args):
+        print(json.dumps({'error': 'No input data'}))
+        sys.exit(1)
+
+    try:
+        params = {'db': args.db} if args.db else load_json_input(args)
+        if args.method:
+            params['method'] = args.method
+        if args.threshold is not None:
+            params['threshold'] = args.threshold
+        if args.no_store:
+            params['store'] = False
+        result = cluster_from_params(params)
+        print(json.dumps(metrics.attach(result), ensure_ascii=False))
+    except Exception as e:
+        print(json.dumps({'error': str(e)}))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
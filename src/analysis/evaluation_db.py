@@ -0,0 +1,257 @@
+"""
+評価データベース（prisma/dev.db）の直接読み込み
+Prisma を経由せず、必要な列だけを SQL で取り出して NumPy 配列に格納する
+"""
+
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# Prisma の SQLite データベース（環境変数で変更可能）
+DB_PATH = os.environ.get('ANALYSIS_DB_PATH', 'prisma/dev.db')
+
+# SD法の尺度キー（Evaluation.sdScores のJSONキー、列順）
+SD_SCALE_KEYS = ['quiet', 'pleasant', 'premium', 'modern', 'powerful', 'safe', 'exciting', 'natural']
+
+# グループ化に使える列（キー → SQL式）
+GROUP_COLUMNS = {
+    'audioSampleId': 'e.audioSampleId',
+    'experimentGroup': 'r.experimentGroup',
+}
+
+# Respondent との結合
+RESPONDENT_JOIN = 'JOIN Respondent r ON r.id = e.respondentId'
+
+# 空でない自由記述の条件
+FREE_TEXT_CONDITION = "e.freeText IS NOT NULL AND e.freeText != ''"
+
+# APIパラメータの絞り込み条件（filters のキー → evaluation_filters などの引数名）
+FILTER_PARAMS = {
+    'audioSampleId': 'audio_sample_id',
+    'experimentGroup': 'experiment_group',
+    'dateFrom': 'date_from',
+    'dateTo': 'date_to',
+}
+
+# fetchmany で一度に取り出す行数
+FETCH_BATCH_SIZE = 1000
+
+DateLike = Union[str, int, float, datetime]
+
+def connect(db_path: str = DB_PATH) -> sqlite3.Connection:
+    """読み取り専用で接続"""
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f'Database not found: {db_path}')
+    return sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+
+def to_timestamp_ms(value: DateLike) -> int:
+    """日時をPrismaのSQLite表現（UNIXエポックからのミリ秒）に変換"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+def evaluation_filters(
+    audio_sample_id: Optional[str] = None,
+    experiment_group: Optional[str] = None,
+    date_from: Optional[DateLike] = None,
+    date_to: Optional[DateLike] = None,
+    join_respondent: bool = False,
+) -> Tuple[str, str, List[Any]]:
+    """絞り込み条件を (JOIN句, WHERE句, パラメータ) に変換"""
+    join = RESPONDENT_JOIN if join_respondent else ''
+    conditions: List[str] = []
+    params: List[Any] = []
+    if audio_sample_id:
+        conditions.append('e.audioSampleId = ?')
+        params.append(audio_sample_id)
+    if experiment_group:
+        join = RESPONDENT_JOIN
+        conditions.append('r.experimentGroup = ?')
+        params.append(experiment_group)
+    if date_from is not None:
+        conditions.append('e.createdAt >= ?')
+        params.append(to_timestamp_ms(date_from))
+    if date_to is not None:
+        conditions.append('e.createdAt <= ?')
+        params.append(to_timestamp_ms(date_to))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return join, where, params
+
+def filter_args(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """APIパラメータの絞り込み条件（filters）を読み込み関数の引数に変換（未指定・空文字は除く）"""
+    filters = filters or {}
+    return {arg: filters[key] for key, arg in FILTER_PARAMS.items() if filters.get(key) not in (None, '')}
+
+def sd_score_columns() -> str:
+    """sdScores のJSONを尺度ごとの列に展開するSQL式（欠損は0）"""
+    return ', '.join(
+        f"COALESCE(json_extract(e.sdScores, '$.{key}'), 0)" for key in SD_SCALE_KEYS
+    )
+
+def load_sd_scores(
+    db_path: str = DB_PATH,
+    audio_sample_id: Optional[str] = None,
+    experiment_group: Optional[str] = None,
+    date_from: Optional[DateLike] = None,
+    date_to: Optional[DateLike] = None,
+    batch_size: int = FETCH_BATCH_SIZE,
+) -> np.ndarray:
+    """Evaluation.sdScores を (件数 × 尺度数) の float64 行列として読み込む
+
+    JSONの展開は SQLite の json_extract で行い、欠損した尺度は0とする。
+    件数を先に数えて行列を確保し、fetchmany で少しずつ埋める。
+    """
+    join, where, params = evaluation_filters(audio_sample_id, experiment_group, date_from, date_to)
+    columns = sd_score_columns()
+
+    with closing(connect(db_path)) as conn:
+        count = conn.execute(f'SELECT COUNT(*) FROM Evaluation e {join} {where}', params).fetchone()[0]
+        matrix = np.empty((count, len(SD_SCALE_KEYS)), dtype=np.float64)
+
+        cursor = conn.execute(f'SELECT {columns} FROM Evaluation e {join} {where} ORDER BY e.rowid', params)
+        filled = 0
+        while filled < count:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            matrix[filled:filled + len(rows)] = rows
+            filled += len(rows)
+
+    # COUNT と SELECT の間に行が削除された場合は切り詰める
+    return matrix[:filled]
+
+def iter_sd_score_chunks(
+    db_path: str = DB_PATH,
+    audio_sample_id: Optional[str] = None,
+    experiment_group: Optional[str] = None,
+    date_from: Optional[DateLike] = None,
+    date_to: Optional[DateLike] = None,
+    batch_size: int = FETCH_BATCH_SIZE,
+) -> Iterator[np.ndarray]:
+    """Evaluation.sdScores を batch_size 行ずつの float64 行列として逐次返す"""
+    join, where, params = evaluation_filters(audio_sample_id, experiment_group, date_from, date_to)
+    with closing(connect(db_path)) as conn:
+        cursor = conn.execute(
+            f'SELECT {sd_score_columns()} FROM Evaluation e {join} {where} ORDER BY e.rowid', params
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield np.array(rows, dtype=np.float64)
+
+def iter_grouped_sd_score_chunks(
+    group_by: Sequence[str],
+    db_path: str = DB_PATH,
+    audio_sample_id: Optional[str] = None,
+    experiment_group: Optional[str] = None,
+    date_from: Optional[DateLike] = None,
+    date_to: Optional[DateLike] = None,
+    batch_size: int = FETCH_BATCH_SIZE,
+) -> Iterator[Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+    """SD法スコアの行列とグループ列（キー → 値の配列）を batch_size 行ずつ逐次返す"""
+    unknown = [key for key in group_by if key not in GROUP_COLUMNS]
+    if unknown:
+        raise ValueError(f'Unknown group key: {", ".join(unknown)}')
+
+    join, where, params = evaluation_filters(
+        audio_sample_id, experiment_group, date_from, date_to,
+        join_respondent='experimentGroup' in group_by,
+    )
+    group_columns = ''.join(f', {GROUP_COLUMNS[key]}' for key in group_by)
+    n_scales = len(SD_SCALE_KEYS)
+    with closing(connect(db_path)) as conn:
+        cursor = conn.execute(
+            f'SELECT {sd_score_columns()}{group_columns} FROM Evaluation e {join} {where} ORDER BY e.rowid',
+            params,
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            scores = np.array([row[:n_scales] for row in rows], dtype=np.float64)
+            labels = {
+                key: np.array([str(row[n_scales + i]) for row in rows], dtype=object)
+                for i, key in enumerate(group_by)
+            }
+            yield scores, labels
+
+def iter_free_texts(db_path: str = DB_PATH, batch_size: int = FETCH_BATCH_SIZE) -> Iterator[str]:
+    """空でない Evaluation.freeText を登録順に逐次返す"""
+    with closing(connect(db_path)) as conn:
+        cursor = conn.execute(
+            f'SELECT e.freeText FROM Evaluation e WHERE {FREE_TEXT_CONDITION} ORDER BY e.rowid'
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for (text,) in rows:
+                yield text
+
+def iter_free_text_records(
+    db_path: str = DB_PATH, batch_size: int = FETCH_BATCH_SIZE
+) -> Iterator[Tuple[str, str]]:
+    """空でない Evaluation.freeText を (評価ID, 本文) として登録順に逐次返す"""
+    with closing(connect(db_path)) as conn:
+        cursor = conn.execute(
+            f'SELECT e.id, e.freeText FROM Evaluation e WHERE {FREE_TEXT_CONDITION} ORDER BY e.rowid'
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+
+def iter_free_text_rows(
+    db_path: str = DB_PATH,
+    after: Optional[Tuple[int, str]] = None,
+    batch_size: int = FETCH_BATCH_SIZE,
+) -> Iterator[Tuple[str, str, int, int]]:
+    """空でない自由記述を (評価ID, 本文, 登録日時, rowid) として (登録日時, 評価ID) 順に逐次返す
+
+    after に (登録日時, 評価ID) を渡すと、それより後に並ぶ回答のみを返す（差分更新の基準点）。
+    """
+    condition, params = FREE_TEXT_CONDITION, []
+    if after is not None:
+        condition += ' AND (e.createdAt, e.id) > (?, ?)'
+        params = list(after)
+    with closing(connect(db_path)) as conn:
+        cursor = conn.execute(
+            f'SELECT e.id, e.freeText, e.createdAt, e.rowid FROM Evaluation e WHERE {condition} '
+            'ORDER BY e.createdAt, e.id',
+            params,
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+
+def count_free_texts_until(until: Tuple[int, str], db_path: str = DB_PATH) -> int:
+    """(登録日時, 評価ID) の基準点までに並ぶ自由記述の件数（削除・過去日時の追加の検出用）"""
+    with closing(connect(db_path)) as conn:
+        return conn.execute(
+            f'SELECT COUNT(*) FROM Evaluation e WHERE {FREE_TEXT_CONDITION} AND (e.createdAt, e.id) <= (?, ?)',
+            list(until),
+        ).fetchone()[0]
+
+def evaluation_watermark(db_path: str = DB_PATH) -> Dict[str, int]:
+    """評価データの件数と最新の回答日時（更新の要否の判定用、1回の集計クエリ）"""
+    with closing(connect(db_path)) as conn:
+        evaluations, free_texts, latest = conn.execute(
+            "SELECT COUNT(*), COUNT(NULLIF(e.freeText, '')), MAX(e.createdAt) FROM Evaluation e"
+        ).fetchone()
+    return {
+        'evaluations': evaluations,
+        'free_texts': free_texts,
+        'latest_created_at': latest or 0,
+    }
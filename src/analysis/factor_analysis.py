@@ -3,12 +3,24 @@
 SD法データから因子を抽出
 """
 
+import hashlib
 import json
+import os
 import sys
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence, Tuple, Union
+
+from analysis_cache import AnalysisCache
+from covariance import CovarianceAccumulator
+from evaluation_db import filter_args, iter_grouped_sd_score_chunks, iter_sd_score_chunks, load_sd_scores
+from input_stream import build_parser, chunked, has_input, iter_records, load_json_input
+import metrics
+from parallel import ordered_parallel_map, resolve_workers
+from rotation import ROTATIONS, rotate
 
 try:
+    import sklearn
+    from scipy.optimize import linear_sum_assignment
     from sklearn.decomposition import FactorAnalysis
     from sklearn.preprocessing import StandardScaler
     SKLEARN_AVAILABLE = True
@@ -16,8 +28,143 @@ except ImportError:
     SKLEARN_AVAILABLE = False
     print("Warning: scikit-learn is not available.", file=sys.stderr)
 
-def perform_factor_analysis(sd_scores: List[List[float]], n_factors: int = 3) -> Dict[str, Any]:
-    """因子分析を実行"""
+# 学習済みモデルのキャッシュ（入力行列の指紋 → 結果、因子数 → 直近のモデル状態）
+MODEL_CACHE_SIZE = int(os.environ.get('FACTOR_MODEL_CACHE_SIZE', '32'))
+model_cache = AnalysisCache(
+    'factor_model',
+    f"sklearn-{sklearn.__version__}" if SKLEARN_AVAILABLE else 'none',
+    max_entries=MODEL_CACHE_SIZE,
+)
+
+# 尺度名（Evaluation.sdScores の列順）
+SCALE_NAMES = ['静か', '心地よい', '高級感', '先進的', '力強い', '安心', 'ワクワク', '自然']
+
+# ストリーミング時に一度に読み込む行数
+STREAM_CHUNK_SIZE = int(os.environ.get('FACTOR_STREAM_CHUNK_SIZE', '10000'))
+
+# EM法の収束判定（sklearn の FactorAnalysis の既定値と同じ）
+FA_TOL = 1e-2
+FA_MAX_ITER = 1000
+
+# 結果に含める因子スコアの件数
+N_FACTOR_SCORES = 10
+
+# 一括分析の既定値（因子数・回転、8尺度では5因子以上は自由度が負になり識別できない）
+DEFAULT_FACTOR_GRID = [2, 3, 4]
+DEFAULT_ROTATIONS = list(ROTATIONS)
+
+# ブートストラップ（再標本化の乱数シード・一度に生成する再標本数）
+BOOTSTRAP_SEED = 42
+BOOTSTRAP_BLOCK_SIZE = 100
+
+def _db_filter_args(params: Dict[str, Any]) -> Dict[str, Any]:
+    """パラメータの絞り込み条件を evaluation_db の引数に変換"""
+    return filter_args(params.get('filters'))
+
+def load_sd_scores_from_params(params: Dict[str, Any]) -> Union[np.ndarray, List[List[float]]]:
+    """パラメータからSD法スコアを取得（'db' があればデータベースから直接読み込む）"""
+    if params.get('db'):
+        with metrics.stage('load'):
+            return load_sd_scores(params['db'], **_db_filter_args(params))
+    return params.get('sd_scores', [])
+
+def iter_sd_score_chunks_from_params(
+    params: Dict[str, Any], chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[np.ndarray]:
+    """パラメータからSD法スコアを chunk_size 行ずつ取得"""
+    if params.get('db'):
+        yield from iter_sd_score_chunks(params['db'], batch_size=chunk_size, **_db_filter_args(params))
+        return
+    for chunk in chunked(params.get('sd_scores', []), chunk_size):
+        yield np.asarray(chunk, dtype=np.float64)
+
+def data_source(params: Dict[str, Any]) -> str:
+    """入力の出所（データベースのパスと絞り込み条件、直接渡された行列は 'inline'）"""
+    if not params.get('db'):
+        return 'inline'
+    return json.dumps({'db': params['db'], 'filters': _db_filter_args(params)}, sort_keys=True)
+
+def _state_key(n_factors: int, n_columns: int, source: str) -> str:
+    """前回のモデル状態のキー（因子数・列数・入力の出所ごとに保持する）"""
+    return f'state\0{n_factors}\0{n_columns}\0{source}'
+
+def matrix_fingerprint(X: np.ndarray) -> str:
+    """行列の形状と内容のハッシュ"""
+    digest = hashlib.sha256(str(X.shape).encode('ascii'))
+    digest.update(np.ascontiguousarray(X).tobytes())
+    return digest.hexdigest()
+
+def _is_appended(X: np.ndarray, previous: Optional[Dict[str, Any]]) -> bool:
+    """X が前回学習した行列の末尾に行を追加したものか"""
+    if previous is None or X.ndim != 2 or len(previous['mean']) != X.shape[1]:
+        return False
+    n_rows = previous['n_rows']
+    return 0 < n_rows < X.shape[0] and matrix_fingerprint(X[:n_rows]) == previous['digest']
+
+def _fit_scaler(X: np.ndarray, previous: Optional[Dict[str, Any]]) -> Tuple['StandardScaler', np.ndarray]:
+    """標準化器を学習して標準化済み行列を返す（追記時は新しい行のみで統計量を更新）"""
+    scaler = StandardScaler()
+    if previous is None:
+        return scaler, scaler.fit_transform(X)
+    
+    # partial_fit は保存済みの件数・平均・分散からの逐次更新になる
+    scaler.n_features_in_ = X.shape[1]
+    scaler.n_samples_seen_ = np.int64(previous['n_rows'])
+    scaler.mean_ = np.asarray(previous['mean'])
+    scaler.var_ = np.asarray(previous['var'])
+    scaler.scale_ = np.sqrt(scaler.var_)
+    scaler.partial_fit(X[previous['n_rows']:])
+    return scaler, scaler.transform(X)
+
+def cache_stats() -> Dict[str, Any]:
+    """モデルキャッシュのヒット・ミス数"""
+    return model_cache.stats()
+
+def _format_factors(loadings: np.ndarray) -> List[Dict[str, Any]]:
+    """因子負荷量（尺度 × 因子）を因子ごとのリストに整形"""
+    return [
+        {
+            'name': f'因子{i+1}',
+            'loadings': [
+                {
+                    'scale': SCALE_NAMES[j],
+                    'loading': float(loadings[j, i]),
+                }
+                for j in range(len(SCALE_NAMES))
+            ],
+        }
+        for i in range(loadings.shape[1])
+    ]
+
+def _format_result(
+    loadings: np.ndarray, explained_variance: List[float], factor_scores: List[List[float]]
+) -> Dict[str, Any]:
+    """因子負荷量（尺度 × 因子）などを応答形式に整形"""
+    return {
+        'factors': _format_factors(loadings),
+        'explained_variance': explained_variance,
+        'factor_scores': factor_scores,  # 最初の10件のみ
+    }
+
+def perform_factor_analysis(
+    sd_scores: Union[np.ndarray, List[List[float]]],
+    n_factors: int = 3,
+    use_cache: bool = True,
+    n_bootstrap: int = 0,
+    confidence: float = 0.95,
+    workers: Optional[int] = None,
+    source: str = 'inline',
+) -> Dict[str, Any]:
+    """因子分析を実行（同じ入力は学習済みモデルのキャッシュから返す）
+
+    同じ出所（source、data_source() で作る）・因子数・列数で前回学習した行列の末尾に
+    行を追記しただけの入力は、前回の平均・分散・独自分散から再学習を始める。
+    EM法の初期値が異なるため、この結果は最初から学習した結果と収束判定の許容誤差の
+    範囲で異なりうる（それまでの追記の経緯に依存する）。乱数シードは常に固定する。
+
+    n_bootstrap > 0 のとき、各因子負荷量にブートストラップ法によるパーセンタイル信頼区間
+    （ci_lower / ci_upper）を付加する。
+    """
     if not SKLEARN_AVAILABLE:
         return {
             'factors': [],
@@ -27,46 +174,290 @@ def perform_factor_analysis(sd_scores: List[List[float]], n_factors: int = 3) ->
         }
     
     try:
+        # 信頼水準は学習の前に検証する
+        if n_bootstrap > 0:
+            confidence = validate_confidence(confidence)
+        
         # データをnumpy配列に変換
-        X = np.array(sd_scores)
+        X = np.asarray(sd_scores, dtype=np.float64)
+        
+        # 同じ行列・同じ因子数なら前回の結果をそのまま返す
+        metrics.count('rows', len(X))
+        digest = matrix_fingerprint(X)
+        result_key = f'result\0{n_factors}\0{digest}'
+        if use_cache:
+            cached = model_cache.get(result_key)
+            metrics.record('model_cache', model_cache.stats())
+            if cached is not None:
+                if n_bootstrap > 0:
+                    return _with_bootstrap_intervals(cached, X, n_bootstrap, confidence, workers)
+                return cached
         
-        # 標準化
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
+        # 同じ出所の前回の行列に行が追記されただけなら、前回のモデルから再学習を始める
+        state_key = _state_key(n_factors, X.shape[1] if X.ndim == 2 else 0, source)
+        previous = model_cache.get(state_key) if use_cache else None
+        if not _is_appended(X, previous):
+            previous = None
         
-        # 因子分析
-        fa = FactorAnalysis(n_components=n_factors, random_state=42)
-        fa.fit(X_scaled)
+        # 標準化（追記時は保存済みの平均・分散を新しい行だけで更新）
+        metrics.record('warm_start', previous is not None)
+        with metrics.stage('standardize'):
+            scaler, X_scaled = _fit_scaler(X, previous)
         
-        # 因子負荷量
-        loadings = fa.components_.T.tolist()
+        # 因子分析（追記時は前回の独自分散を初期値にする）
+        fa = FactorAnalysis(
+            n_components=n_factors,
+            random_state=42,
+            noise_variance_init=np.asarray(previous['noise_variance']) if previous else None,
+        )
+        with metrics.stage('fit'):
+            fa.fit(X_scaled)
+        metrics.record('n_iter', int(fa.n_iter_))
         
         # 因子スコア
-        factor_scores = fa.transform(X_scaled).tolist()
+        with metrics.stage('transform'):
+            factor_scores = fa.transform(X_scaled)
         
         # 説明分散（簡易版）
         explained_variance = np.var(factor_scores, axis=0).tolist()
         
-        # 因子名（簡易版）
-        scale_names = ['静か', '心地よい', '高級感', '先進的', '力強い', '安心', 'ワクワク', '自然']
+        result = _format_result(fa.components_.T, explained_variance, factor_scores[:N_FACTOR_SCORES].tolist())
         
+        if use_cache:
+            model_cache.put(result_key, result)
+            model_cache.put(state_key, {
+                'digest': digest,
+                'n_rows': int(X.shape[0]),
+                'mean': scaler.mean_.tolist(),
+                'var': scaler.var_.tolist(),
+                'noise_variance': fa.noise_variance_.tolist(),
+            })
+        if n_bootstrap > 0:
+            return _with_bootstrap_intervals(result, X, n_bootstrap, confidence, workers)
+        return result
+    except Exception as e:
         return {
-            'factors': [
-                {
-                    'name': f'因子{i+1}',
-                    'loadings': [
-                        {
-                            'scale': scale_names[j],
-                            'loading': loadings[j][i],
-                        }
-                        for j in range(len(scale_names))
-                    ],
-                }
-                for i in range(n_factors)
-            ],
-            'explained_variance': explained_variance,
-            'factor_scores': factor_scores[:10],  # 最初の10件のみ
+            'factors': [],
+            'loadings': [],
+            'explained_variance': [],
+            'error': str(e),
         }
+
+def fit_factor_model(
+    covariance: np.ndarray,
+    n_factors: int,
+    n_samples: int,
+    noise_variance_init: Optional[np.ndarray] = None,
+    tol: float = FA_TOL,
+    max_iter: int = FA_MAX_ITER,
+) -> Dict[str, Any]:
+    """共分散行列だけから因子負荷量と独自分散を推定
+
+    sklearn の FactorAnalysis（svd_method='lapack'）と同じEM法の更新式で、
+    データ行列の特異値分解を「独自分散で正規化した共分散行列」の固有値分解に置き換えたもの。
+    （データ行列の特異値の2乗＝共分散行列の固有値）
+    """
+    n_features = covariance.shape[0]
+    small = 1e-12
+    llconst = n_features * np.log(2.0 * np.pi) + n_factors
+    variance = np.diag(covariance)
+    psi = np.ones(n_features) if noise_variance_init is None else np.asarray(noise_variance_init, dtype=np.float64)
+    
+    old_ll = -np.inf
+    loglike = old_ll
+    components = np.zeros((n_factors, n_features))
+    n_iter = 0
+    for n_iter in range(1, max_iter + 1):
+        sqrt_psi = np.sqrt(psi) + small
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance / np.outer(sqrt_psi, sqrt_psi))
+        # 降順に並べ替え（丸め誤差による負の固有値は0とする）
+        eigenvalues = np.maximum(eigenvalues[::-1], 0.0)
+        eigenvectors = eigenvectors[:, ::-1]
+        
+        s = eigenvalues[:n_factors]
+        components = np.sqrt(np.maximum(s - 1.0, 0.0))[:, np.newaxis] * eigenvectors[:, :n_factors].T
+        components *= sqrt_psi
+        
+        loglike = llconst + np.sum(np.log(s)) + eigenvalues[n_factors:].sum() + np.sum(np.log(psi))
+        loglike *= -n_samples / 2.0
+        if loglike - old_ll < tol:
+            break
+        old_ll = loglike
+        psi = np.maximum(variance - np.sum(components ** 2, axis=0), small)
+    
+    return {
+        'components': components,
+        'noise_variance': psi,
+        'loglike': float(loglike),
+        'n_iter': n_iter,
+    }
+
+def factor_score_projection(components: np.ndarray, noise_variance: np.ndarray) -> np.ndarray:
+    """標準化済みデータから因子スコアへの射影行列（尺度 × 因子、FactorAnalysis.transform と同じ）"""
+    weighted = components / noise_variance
+    cov_z = np.linalg.inv(np.eye(len(components)) + weighted @ components.T)
+    return weighted.T @ cov_z
+
+def bootstrap_correlations(
+    X: np.ndarray, n_replicates: int, rng: np.random.Generator
+) -> np.ndarray:
+    """再標本ごとの相関行列（再標本数 × 尺度数 × 尺度数）を一括で計算
+
+    再標本の添字を1つの配列として生成し、各行の出現回数を重みとして
+    重み付きの平均・共分散を行列演算でまとめて求める（再標本の行列は作らない）。
+    """
+    n_samples = X.shape[0]
+    indices = rng.integers(0, n_samples, size=(n_replicates, n_samples))
+    offsets = np.arange(n_replicates)[:, np.newaxis] * n_samples
+    weights = np.bincount((indices + offsets).ravel(), minlength=n_replicates * n_samples)
+    weights = weights.reshape(n_replicates, n_samples) / n_samples
+    
+    # 各行の外積を一度だけ求め、重み付き和で2次モーメントを得る
+    outer = np.einsum('ni,nj->nij', X, X).reshape(n_samples, -1)
+    second_moment = (weights @ outer).reshape(n_replicates, X.shape[1], X.shape[1])
+    mean = weights @ X
+    covariance = second_moment - np.einsum('bi,bj->bij', mean, mean)
+    
+    # StandardScaler と同様に分散0の列は1で割る
+    std = np.sqrt(np.maximum(np.einsum('bii->bi', covariance), 0.0))
+    std = np.where(std > 0, std, 1.0)
+    return covariance / np.einsum('bi,bj->bij', std, std)
+
+def _bootstrap_task(task: Tuple[np.ndarray, int, int, np.ndarray]) -> np.ndarray:
+    """相関行列のまとまりを推定し、因子負荷量（再標本数 × 尺度数 × 因子数）を返す（プロセスプールから呼ばれる）"""
+    correlations, n_factors, n_samples, noise_variance_init = task
+    return np.stack([
+        fit_factor_model(correlation, n_factors, n_samples, noise_variance_init=noise_variance_init)['components'].T
+        for correlation in correlations
+    ])
+
+def align_loadings(reference: np.ndarray, loadings: np.ndarray) -> np.ndarray:
+    """再標本の因子負荷量の因子の順序と符号を基準解に合わせる
+
+    因子間のタッカー一致係数の絶対値の和が最大になる対応を線形割当で求め、
+    一致係数が負の因子は符号を反転する。
+    """
+    norms = np.linalg.norm(reference, axis=0)[:, np.newaxis] * np.linalg.norm(loadings, axis=0)
+    congruence = (reference.T @ loadings) / np.where(norms > 0, norms, 1.0)
+    _, order = linear_sum_assignment(-np.abs(congruence))
+    signs = np.sign(congruence[np.arange(len(order)), order])
+    return loadings[:, order] * np.where(signs == 0, 1.0, signs)
+
+def validate_confidence(confidence: Any) -> float:
+    """ブートストラップ信頼区間の信頼水準（0より大きく1より小さい値のみ受け付ける）"""
+    value = float(confidence)
+    if not 0.0 < value < 1.0:
+        raise ValueError(f'confidence must be between 0 and 1 (exclusive), got {confidence}')
+    return value
+
+def bootstrap_loading_intervals(
+    X: np.ndarray,
+    reference: np.ndarray,
+    n_replicates: int,
+    confidence: float = 0.95,
+    workers: Optional[int] = None,
+    seed: int = BOOTSTRAP_SEED,
+    block_size: int = BOOTSTRAP_BLOCK_SIZE,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """因子負荷量（尺度 × 因子）のパーセンタイル信頼区間（下限・上限）"""
+    confidence = validate_confidence(confidence)
+    n_samples = X.shape[0]
+    n_factors = reference.shape[1]
+    rng = np.random.default_rng(seed)
+    # 基準解の独自分散を初期値にして各再標本のEM法を短縮
+    noise_variance_init = np.maximum(1.0 - (reference ** 2).sum(axis=1), 1e-3)
+    
+    tasks = (
+        (bootstrap_correlations(X, min(block_size, n_replicates - start), rng), n_factors, n_samples, noise_variance_init)
+        for start in range(0, n_replicates, block_size)
+    )
+    workers = resolve_workers(workers)
+    if workers > 1 and n_replicates > block_size:
+        fitted = ordered_parallel_map(_bootstrap_task, tasks, workers)
+    else:
+        fitted = ((task, _bootstrap_task(task)) for task in tasks)
+    
+    replicates = np.concatenate([
+        np.stack([align_loadings(reference, loadings) for loadings in block])
+        for _, block in fitted
+    ])
+    alpha = (1.0 - confidence) / 2.0
+    lower, upper = np.quantile(replicates, [alpha, 1.0 - alpha], axis=0)
+    return lower, upper
+
+def _with_bootstrap_intervals(
+    result: Dict[str, Any],
+    X: np.ndarray,
+    n_bootstrap: int,
+    confidence: float,
+    workers: Optional[int],
+) -> Dict[str, Any]:
+    """結果の因子負荷量に信頼区間を付加した新しい結果を返す（キャッシュ済みの結果は変更しない）"""
+    reference = np.array([
+        [loading['loading'] for loading in factor['loadings']]
+        for factor in result['factors']
+    ]).T
+    with metrics.stage('bootstrap'):
+        lower, upper = bootstrap_loading_intervals(X, reference, n_bootstrap, confidence, workers)
+    return {
+        **result,
+        'factors': [
+            {
+                **factor,
+                'loadings': [
+                    {**loading, 'ci_lower': float(lower[j, i]), 'ci_upper': float(upper[j, i])}
+                    for j, loading in enumerate(factor['loadings'])
+                ],
+            }
+            for i, factor in enumerate(result['factors'])
+        ],
+        'bootstrap': {
+            'replicates': n_bootstrap,
+            'confidence': confidence,
+            'seed': BOOTSTRAP_SEED,
+        },
+    }
+
+def perform_streaming_factor_analysis(chunks: Iterable[np.ndarray], n_factors: int = 3) -> Dict[str, Any]:
+    """SD法スコアをチャンク単位で読み込んで因子分析を実行
+
+    保持するのは件数・平均・共分散（尺度数の2乗）と因子スコア用の先頭10行のみで、
+    回答数によらず一定のメモリで動作する。scikit-learn は使用しない。
+    """
+    try:
+        accumulator = CovarianceAccumulator(len(SCALE_NAMES))
+        head: List[np.ndarray] = []
+        n_head = 0
+        with metrics.stage('accumulate'):
+            for chunk in chunks:
+                chunk = np.asarray(chunk, dtype=np.float64)
+                if n_head < N_FACTOR_SCORES:
+                    head.append(chunk[:N_FACTOR_SCORES - n_head].copy())
+                    n_head += len(head[-1])
+                accumulator.update(chunk)
+                metrics.count('chunks')
+        metrics.count('rows', len(accumulator))
+        
+        if len(accumulator) == 0:
+            return {
+                'factors': [],
+                'loadings': [],
+                'explained_variance': [],
+            }
+        
+        # 標準化後の共分散（相関行列）から因子を抽出
+        correlation = accumulator.correlation()
+        with metrics.stage('fit'):
+            model = fit_factor_model(correlation, n_factors, len(accumulator))
+        metrics.record('n_iter', model['n_iter'])
+        projection = factor_score_projection(model['components'], model['noise_variance'])
+        
+        # 因子スコアは先頭の行のみ計算し、説明分散は共分散から解析的に求める
+        head_scaled = (np.concatenate(head) - accumulator.mean) / accumulator.std()
+        factor_scores = (head_scaled @ projection).tolist()
+        explained_variance = np.diag(projection.T @ correlation @ projection).tolist()
+        
+        return _format_result(model['components'].T, explained_variance, factor_scores)
     except Exception as e:
         return {
             'factors': [],
@@ -75,15 +466,257 @@ def perform_factor_analysis(sd_scores: List[List[float]], n_factors: int = 3) ->
             'error': str(e),
         }
 
+def fit_statistics(loglike: float, n_features: int, n_factors: int, n_samples: int) -> Dict[str, float]:
+    """対数尤度・自由度・AIC・BIC（自由パラメータ数は負荷量＋独自分散－回転の不定性）"""
+    n_params = n_features * n_factors + n_features - n_factors * (n_factors - 1) / 2
+    degrees_of_freedom = ((n_features - n_factors) ** 2 - (n_features + n_factors)) / 2
+    return {
+        'loglike': loglike,
+        'n_params': n_params,
+        'degrees_of_freedom': degrees_of_freedom,
+        'aic': -2.0 * loglike + 2.0 * n_params,
+        'bic': -2.0 * loglike + n_params * np.log(n_samples),
+    }
+
+def check_factor_counts(
+    n_factors_grid: Sequence[int], n_features: int
+) -> Tuple[List[int], List[Dict[str, Any]]]:
+    """推定する因子数と、推定しない因子数（理由つき）に分ける
+
+    1未満・尺度数以上の因子数と、自由度 ((p - k)^2 - (p + k)) / 2 が負で識別できない因子数は推定しない。
+    """
+    accepted: List[int] = []
+    rejected: List[Dict[str, Any]] = []
+    for n_factors in sorted({int(k) for k in n_factors_grid}):
+        if not 1 <= n_factors < n_features:
+            rejected.append({'n_factors': n_factors, 'reason': f'n_factors must be between 1 and {n_features - 1}'})
+        elif fit_statistics(0.0, n_features, n_factors, 1)['degrees_of_freedom'] < 0:
+            rejected.append({
+                'n_factors': n_factors,
+                'reason': f'not identified with {n_features} scales (negative degrees of freedom)',
+            })
+        else:
+            accepted.append(n_factors)
+    return accepted, rejected
+
+def iter_grouped_chunks_from_params(
+    params: Dict[str, Any], group_by: Sequence[str], chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+    """パラメータからSD法スコアとグループ列を chunk_size 行ずつ取得
+
+    'db' がなければ 'sd_scores' と同じ長さの 'groups'（キー → 値の配列）を使う。
+    """
+    if params.get('db'):
+        yield from iter_grouped_sd_score_chunks(
+            group_by, params['db'], batch_size=chunk_size, **_db_filter_args(params)
+        )
+        return
+    sd_scores = params.get('sd_scores', [])
+    groups = params.get('groups') or {}
+    missing = [key for key in group_by if len(groups.get(key) or []) != len(sd_scores)]
+    if missing:
+        raise ValueError(f'groups must have one value per row: {", ".join(missing)}')
+    for start in range(0, len(sd_scores), chunk_size):
+        end = start + chunk_size
+        labels = {
+            key: np.array([str(value) for value in groups[key][start:end]], dtype=object)
+            for key in group_by
+        }
+        yield np.asarray(sd_scores[start:end], dtype=np.float64), labels
+
+def accumulate_groups(
+    chunks: Iterable[Tuple[np.ndarray, Dict[str, np.ndarray]]], group_by: Sequence[str]
+) -> Dict[Tuple[Optional[str], str], CovarianceAccumulator]:
+    """全体とグループごとの共分散を1パスで集計（キーは (グループ列, 値)、全体は (None, 'all')）"""
+    n_features = len(SCALE_NAMES)
+    accumulators = {(None, 'all'): CovarianceAccumulator(n_features)}
+    for scores, labels in chunks:
+        accumulators[(None, 'all')].update(scores)
+        for key in group_by:
+            values, inverse = np.unique(labels[key], return_inverse=True)
+            for index, value in enumerate(values):
+                group = (key, str(value))
+                if group not in accumulators:
+                    accumulators[group] = CovarianceAccumulator(n_features)
+                accumulators[group].update(scores[inverse == index])
+    return accumulators
+
+def _fit_task(task: Tuple[Tuple[Optional[str], str], int, np.ndarray, int]) -> Dict[str, Any]:
+    """一括分析の1モデル分の推定（プロセスプールから呼ばれる）"""
+    _, n_factors, correlation, n_samples = task
+    return fit_factor_model(correlation, n_factors, n_samples)
+
+def perform_batch_factor_analysis(
+    accumulators: Dict[Tuple[Optional[str], str], CovarianceAccumulator],
+    n_factors_grid: Sequence[int] = DEFAULT_FACTOR_GRID,
+    rotations: Sequence[str] = DEFAULT_ROTATIONS,
+    workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """グループ × 因子数 × 回転の全組み合わせを推定し、適合度とともに返す
+
+    識別できない因子数は推定せず、理由とともに 'rejected_n_factors' に含める。
+    相関行列はグループごとに一度だけ求めて全ての因子数で共有し、
+    回転は尤度を変えないため同じ推定結果に対して適用する。
+    """
+    unknown = [rotation for rotation in rotations if rotation not in ROTATIONS]
+    if unknown:
+        raise ValueError(f'Unknown rotation: {", ".join(unknown)}')
+    n_features = len(SCALE_NAMES)
+    n_factors_grid, rejected = check_factor_counts(n_factors_grid, n_features)
+
+    # 2件未満のグループは共分散が定まらないため除外
+    correlations = {group: acc.correlation() for group, acc in accumulators.items() if len(acc) >= 2}
+    tasks = [
+        (group, n_factors, correlation, len(accumulators[group]))
+        for group, correlation in correlations.items()
+        for n_factors in n_factors_grid
+    ]
+
+    workers = resolve_workers(workers)
+    if workers > 1 and len(tasks) > 1:
+        fitted = ordered_parallel_map(_fit_task, tasks, workers)
+    else:
+        fitted = ((task, _fit_task(task)) for task in tasks)
+
+    solutions = []
+    metrics.count('models', len(tasks))
+    for (group, n_factors, _, n_samples), model in fitted:
+        statistics = fit_statistics(model['loglike'], n_features, n_factors, n_samples)
+        for rotation in rotations:
+            rotated = rotate(model['components'].T, rotation)
+            ss_loadings = (rotated['loadings'] ** 2).sum(axis=0)
+            solution = {
+                'group_by': group[0],
+                'group': group[1],
+                'n_samples': n_samples,
+                'n_factors': n_factors,
+                'rotation': rotation,
+                'factors': _format_factors(rotated['loadings']),
+                'ss_loadings': ss_loadings.tolist(),
+                'proportion_variance': (ss_loadings / n_features).tolist(),
+                'noise_variance': model['noise_variance'].tolist(),
+                'n_iter': model['n_iter'],
+                **statistics,
+            }
+            if 'factor_correlation' in rotated:
+                solution['factor_correlation'] = rotated['factor_correlation'].tolist()
+            solutions.append(solution)
+
+    return {
+        'solutions': solutions,
+        'rejected_n_factors': rejected,
+        'groups': [
+            {'group_by': group[0], 'group': group[1], 'n_samples': len(acc)}
+            for group, acc in accumulators.items()
+        ],
+    }
+
+def perform_batch_from_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """パラメータの 'batch'（n_factors・rotations・group_by・workers）に従って一括分析"""
+    batch = params.get('batch') or {}
+    try:
+        group_by = list(batch.get('group_by') or [])
+        with metrics.stage('accumulate'):
+            accumulators = accumulate_groups(iter_grouped_chunks_from_params(params, group_by), group_by)
+        metrics.count('groups', len(accumulators))
+        return perform_batch_factor_analysis(
+            accumulators,
+            batch.get('n_factors') or DEFAULT_FACTOR_GRID,
+            batch.get('rotations') or DEFAULT_ROTATIONS,
+            workers=batch.get('workers'),
+        )
+    except Exception as e:
+        return {
+            'solutions': [],
+            'error': str(e),
+        }
+
+def _split_option(value: Optional[str]) -> List[str]:
+    """カンマ区切りのオプション値をリストに変換"""
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
 def main():
     """メイン処理"""
-    if len(sys.argv) < 2:
+    parser = build_parser('因子分析')
+    parser.add_argument('--db', help='SD法スコアを直接読み込むSQLiteデータベースのパス')
+    parser.add_argument('--audio-sample-id', help='音源IDで絞り込む（--db 使用時）')
+    parser.add_argument('--experiment-group', help='実験群で絞り込む（--db 使用時）')
+    parser.add_argument('--date-from', help='回答日時の下限（ISO 8601、--db 使用時）')
+    parser.add_argument('--date-to', help='回答日時の上限（ISO 8601、--db 使用時）')
+    parser.add_argument('--streaming', action='store_true', help='チャンク単位で読み込み、共分散から因子を抽出する')
+    parser.add_argument('--n-factors', type=int, default=3, help='因子数')
+    parser.add_argument('--batch', action='store_true', help='因子数・回転・グループの組み合わせを一括で推定する')
+    parser.add_argument('--factor-grid', help='一括推定する因子数（カンマ区切り、既定: 2,3,4）')
+    parser.add_argument('--rotations', help='一括推定する回転（none,varimax,promax のカンマ区切り）')
+    parser.add_argument('--group-by', help='グループ別に推定する列（audioSampleId,experimentGroup のカンマ区切り）')
+    parser.add_argument('--bootstrap', type=int, default=0, help='因子負荷量の信頼区間を求めるブートストラップ反復数')
+    parser.add_argument('--confidence', type=float, help='ブートストラップ信頼区間の信頼水準（既定: 0.95、JSONの confidence より優先）')
+    parser.add_argument('--workers', type=int, help='一括推定・ブートストラップの並列ワーカー数（0でCPUコア数）')
+    parser.add_argument('--metrics', action='store_true', help='処理段階ごとの計測結果を含める')
+    parser.add_argument('--trace', help='計測イベントをNDJSONで追記するファイル')
+    args = parser.parse_args()
+    metrics.begin(enabled=True if args.metrics else None, trace_path=args.trace)
+    if not args.db and not has_input(args):
         print(json.dumps({'error': 'No input data'}))
         sys.exit(1)
     
     try:
-        input_data = json.loads(sys.argv[1])
-        sd_scores = input_data.get('sd_scores', [])
+        params: Dict[str, Any] = {}
+        if args.db:
+            params = {
+                'db': args.db,
+                'filters': {
+                    'audioSampleId': args.audio_sample_id,
+                    'experimentGroup': args.experiment_group,
+                    'dateFrom': args.date_from,
+                    'dateTo': args.date_to,
+                },
+            }
+        elif not args.ndjson:
+            params = load_json_input(args)
+        n_factors = int(params.get('n_factors', args.n_factors))
+        
+        if args.batch or params.get('batch'):
+            if args.ndjson:
+                # NDJSON: {'sd_scores': [...], 'experimentGroup': ..., ...} の1行1回答
+                records = list(iter_records(args))
+                group_by = _split_option(args.group_by)
+                params = {
+                    'sd_scores': [record['sd_scores'] for record in records],
+                    'groups': {key: [record.get(key) for record in records] for key in group_by},
+                }
+            batch = dict(params.get('batch') or {})
+            if args.factor_grid:
+                batch['n_factors'] = [int(k) for k in _split_option(args.factor_grid)]
+            if args.rotations:
+                batch['rotations'] = _split_option(args.rotations)
+            if args.group_by:
+                batch['group_by'] = _split_option(args.group_by)
+            if args.workers is not None:
+                batch['workers'] = args.workers
+            result = perform_batch_from_params({**params, 'batch': batch})
+            print(json.dumps(metrics.attach(result), ensure_ascii=False))
+            return
+        
+        if args.ndjson:
+            # NDJSON: 1行に1回答分のSD法スコア（配列または {'sd_scores': [...]}）
+            rows = (
+                record.get('sd_scores') if isinstance(record, dict) else record
+                for record in iter_records(args)
+            )
+            if args.streaming:
+                chunks = (np.asarray(chunk, dtype=np.float64) for chunk in chunked(rows, STREAM_CHUNK_SIZE))
+                result = perform_streaming_factor_analysis(chunks, n_factors=n_factors)
+                print(json.dumps(metrics.attach(result), ensure_ascii=False))
+                return
+            sd_scores = list(rows)
+        elif args.streaming or params.get('streaming'):
+            chunks = iter_sd_score_chunks_from_params(params)
+            result = perform_streaming_factor_analysis(chunks, n_factors=n_factors)
+            print(json.dumps(metrics.attach(result), ensure_ascii=False))
+            return
+        else:
+            sd_scores = load_sd_scores_from_params(params)
         
         if len(sd_scores) == 0:
             print(json.dumps({
@@ -93,12 +726,23 @@ def main():
             }))
             sys.exit(0)
         
-        result = perform_factor_analysis(sd_scores, n_factors=3)
-        print(json.dumps(result, ensure_ascii=False))
+        n_bootstrap = args.bootstrap or int(params.get('bootstrap', 0))
+        confidence = args.confidence if args.confidence is not None else params.get('confidence', 0.95)
+        # 信頼水準はブートストラップを行う場合のみ使うため、その場合のみ検証する
+        if n_bootstrap > 0:
+            confidence = validate_confidence(confidence)
+        result = perform_factor_analysis(
+            sd_scores,
+            n_factors=n_factors,
+            n_bootstrap=n_bootstrap,
+            confidence=confidence,
+            workers=args.workers,
+            source=data_source(params),
+        )
+        print(json.dumps(metrics.attach(result), ensure_ascii=False))
     except Exception as e:
         print(json.dumps({'error': str(e)}))
         sys.exit(1)
 
 if __name__ == '__main__':
     main()
-
@@ -0,0 +1,335 @@
+"""
+特徴量ストア
+分析スクリプトが計算したベクトル（文埋め込み・標準化したSD法スコアなど）を
+追記専用の .npy セグメントとして保存し、評価ID（Evaluation.id）から行を引く
+
+セグメントは書き込み後に変更しないため、読み込み側は mmap_mode='r' で開くだけでよく、
+複数のワーカープロセスがOSのページキャッシュを共有してコピーせずに読める。
+書き込みは新しいセグメントとマニフェストの置き換えのみで、既存のセグメントは書き直さない。
+セグメント数が増えたら、有効な行だけを1つのセグメントに書き出して置き換える（compact）。
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 特徴量ストアの保存先（環境変数で変更可能）
+FEATURE_STORE_DIR = os.environ.get('FEATURE_STORE_DIR', 'prisma/analysis-features')
+
+# 追記後のセグメント数がこの値を超えたら1つにまとめる（環境変数で変更可能、0で自動では行わない）
+COMPACT_SEGMENTS = int(os.environ.get('FEATURE_STORE_COMPACT_SEGMENTS', '32'))
+
+# マニフェストの形式（キー構成を変えたら上げる）
+STORE_FORMAT = 1
+MANIFEST_NAME = 'manifest.json'
+LOCK_NAME = '.lock'
+SEGMENT_PREFIX = 'segment-'
+
+def _write_json(path: str, data: Any) -> None:
+    """一時ファイルに書いてから置き換える（読み込み側が途中の内容を見ないように）"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+class FeatureStore:
+    """名前ごとの追記専用の特徴量行列（行は評価IDなどの文字列キーで引く）
+
+    同じキーを再度追記すると新しい行が優先される（内容が変わった回答の再計算用）。
+    tags には行の計算元の指紋（本文のハッシュなど）を保存でき、missing で変化を検出できる。
+    version（モデル名など）が保存済みのものと異なる場合は空のストアとして扱い、
+    次の追記で古いセグメントを削除する。
+    """
+
+    def __init__(self, name: str, version: str = '', root: str = FEATURE_STORE_DIR):
+        self.name = name
+        self.version = version
+        self.path = os.path.join(root, name)
+        self._manifest_state: Optional[Tuple[int, int]] = None
+        self._manifest: Dict[str, Any] = self._empty_manifest()
+        self._segments: List[np.ndarray] = []
+        self._starts = np.zeros(1, dtype=np.int64)
+        self._keys: List[str] = []
+        self._tags: List[Optional[str]] = []
+        # キー → 全セグメントを通した行番号（後から追記した行が優先）
+        self._index: Dict[str, int] = {}
+        self.refresh()
+
+    def _empty_manifest(self) -> Dict[str, Any]:
+        return {'format': STORE_FORMAT, 'version': self.version, 'dtype': None, 'shape': None, 'segments': []}
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.path, MANIFEST_NAME), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return self._empty_manifest()
+        if manifest.get('format') != STORE_FORMAT or manifest.get('version') != self.version:
+            return self._empty_manifest()
+        return manifest
+
+    def refresh(self) -> None:
+        """他のプロセスが追記したセグメントを読み込む（読み込み済みのセグメントはそのまま使う）"""
+        try:
+            stat = os.stat(os.path.join(self.path, MANIFEST_NAME))
+            state: Optional[Tuple[int, int]] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            state = None
+        if state == self._manifest_state:
+            return
+        manifest = self._read_manifest()
+        loaded = [segment['number'] for segment in self._manifest['segments']]
+        numbers = [segment['number'] for segment in manifest['segments']]
+        if numbers[:len(loaded)] != loaded:
+            # バージョンの変更などで作り直された場合は最初から読み込む
+            self._segments, self._keys, self._tags, self._index = [], [], [], {}
+            loaded = []
+        for segment in manifest['segments'][len(loaded):]:
+            self._load_segment(segment['number'])
+        self._starts = np.cumsum([0] + [len(matrix) for matrix in self._segments], dtype=np.int64)
+        self._manifest = manifest
+        self._manifest_state = state
+
+    def _segment_path(self, number: int, suffix: str) -> str:
+        return os.path.join(self.path, f'{SEGMENT_PREFIX}{number:06d}{suffix}')
+
+    def _load_segment(self, number: int) -> None:
+        with open(self._segment_path(number, '.keys.json'), encoding='utf-8') as f:
+            keys = json.load(f)
+        matrix = np.load(self._segment_path(number, '.npy'), mmap_mode='r')
+        offset = len(self._keys)
+        self._keys.extend(keys['keys'])
+        self._tags.extend(keys['tags'] or [None] * len(keys['keys']))
+        self._index.update(zip(keys['keys'], range(offset, offset + len(keys['keys']))))
+        self._segments.append(matrix)
+
+    def __len__(self) -> int:
+        """キーの数（再追記で置き換えられた行は数えない）"""
+        return len(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    @property
+    def shape(self) -> Optional[Tuple[int, ...]]:
+        """1行の形状（未作成なら None）"""
+        shape = self._manifest['shape']
+        return tuple(shape) if shape is not None else None
+
+    def keys(self) -> List[str]:
+        """保存済みのキー（最初に追記した順）"""
+        return list(self._index)
+
+    def missing(self, keys: Sequence[str], tags: Optional[Sequence[Optional[str]]] = None) -> List[int]:
+        """未保存、または保存時と指紋が異なるキーの位置"""
+        positions = []
+        for position, key in enumerate(keys):
+            row = self._index.get(key)
+            if row is None or (tags is not None and self._tags[row] != tags[position]):
+                positions.append(position)
+        return positions
+
+    def rows(self, keys: Sequence[str]) -> np.ndarray:
+        """キーに対応する全体の行番号（未保存のキーは KeyError）"""
+        return np.fromiter((self._index[key] for key in keys), dtype=np.int64, count=len(keys))
+
+    def get(self, keys: Sequence[str]) -> np.ndarray:
+        """キーの順に行を集めた配列（セグメントごとにまとめて読む）"""
+        rows = self.rows(keys)
+        shape = self.shape or (0,)
+        result = np.empty((len(rows), *shape), dtype=self._manifest['dtype'] or np.float32)
+        segment_of = np.searchsorted(self._starts, rows, side='right') - 1
+        for segment in np.unique(segment_of):
+            selected = segment_of == segment
+            result[selected] = self._segments[segment][rows[selected] - self._starts[segment]]
+        return result
+
+    def segments(self) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """(キー, メモリマップした行列) をセグメントごとに返す（コピーなし、置き換え済みの行を含む）"""
+        for number, matrix in enumerate(self._segments):
+            start, end = self._starts[number], self._starts[number + 1]
+            yield self._keys[start:end], matrix
+
+    def _lock(self) -> Any:
+        """書き込み用のロックファイルを開いて排他ロックを取る（閉じると解放される）"""
+        os.makedirs(self.path, exist_ok=True)
+        lock = open(os.path.join(self.path, LOCK_NAME), 'w')
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def append(
+        self,
+        keys: Sequence[str],
+        rows: np.ndarray,
+        tags: Optional[Sequence[Optional[str]]] = None,
+    ) -> int:
+        """行を新しいセグメントとして追記し、追記した行数を返す
+
+        保存済みで指紋も同じキー・同じ呼び出し内で重複するキーは追記しない。
+        複数のプロセスからの追記はロックファイルで直列化する。
+        追記後のセグメント数が COMPACT_SEGMENTS を超えた場合は続けて compact する。
+        """
+        rows = np.asarray(rows)
+        if len(keys) != len(rows) or (tags is not None and len(tags) != len(keys)):
+            raise ValueError('keys, rows and tags must have the same length')
+        with self._lock():
+            # ロック中に他のプロセスの追記を反映してから差分を求める
+            self.refresh()
+            manifest = self._manifest
+            if manifest['shape'] is not None and (
+                tuple(manifest['shape']) != rows.shape[1:] or np.dtype(manifest['dtype']) != rows.dtype
+            ):
+                raise ValueError(
+                    f'Feature shape/dtype mismatch for {self.name}: '
+                    f'{rows.shape[1:]} {rows.dtype} (stored: {tuple(manifest["shape"])} {manifest["dtype"]})'
+                )
+
+            positions = {}
+            for position in self.missing(keys, tags):
+                positions[keys[position]] = position
+            if not positions:
+                return 0
+            selected = np.fromiter(positions.values(), dtype=np.int64, count=len(positions))
+
+            if not manifest['segments']:
+                # 初回（またはバージョン変更後）は古いセグメントを削除
+                self._remove_segments()
+            number = manifest['segments'][-1]['number'] + 1 if manifest['segments'] else 1
+            self._write_segment(
+                number,
+                list(positions),
+                rows[selected],
+                [tags[position] for position in selected.tolist()] if tags is not None else None,
+            )
+            # マニフェストの置き換えで追記が確定する（読み込み側は置き換え前後のどちらかを見る）
+            self._write_manifest(rows, [*manifest['segments'], {'number': number, 'rows': len(selected)}])
+            if COMPACT_SEGMENTS and len(self._segments) > COMPACT_SEGMENTS:
+                self._compact()
+            return len(selected)
+
+    def compact(self) -> int:
+        """有効な行（置き換えられていない行）だけを1つのセグメントに書き出し、削除した行数を返す
+
+        新しいセグメントを書いてからマニフェストを置き換え、その後で古いセグメントを削除する。
+        古いセグメントをメモリマップしている読み込み側は、POSIX ではファイルの削除後も
+        そのまま読める（次の refresh で新しいセグメントを読み込み直す）。
+        """
+        with self._lock():
+            self.refresh()
+            return self._compact()
+
+    def _compact(self) -> int:
+        """compact の本体（ロック中に呼ぶ）"""
+        stale = int(self._starts[-1]) - len(self._index)
+        if len(self._segments) <= 1 and stale == 0:
+            return 0
+        keys = self.keys()
+        rows = self.get(keys)
+        tags = [self._tags[row] for row in self.rows(keys).tolist()]
+        number = self._manifest['segments'][-1]['number'] + 1
+        self._write_segment(number, keys, rows, tags if any(tag is not None for tag in tags) else None)
+        self._write_manifest(rows, [{'number': number, 'rows': len(keys)}])
+        self._remove_segments(keep=number)
+        return stale
+
+    def _write_segment(
+        self, number: int, keys: List[str], rows: np.ndarray, tags: Optional[List[Optional[str]]]
+    ) -> None:
+        """セグメントの行列とキーを書き出す（マニフェストに載るまで読み込み側からは見えない）"""
+        segment_path = self._segment_path(number, '.npy')
+        np.save(f'{segment_path}.tmp.npy', rows)
+        os.replace(f'{segment_path}.tmp.npy', segment_path)
+        _write_json(self._segment_path(number, '.keys.json'), {'keys': keys, 'tags': tags})
+
+    def _write_manifest(self, rows: np.ndarray, segments: List[Dict[str, int]]) -> None:
+        """マニフェストを置き換えて読み込み直す"""
+        _write_json(os.path.join(self.path, MANIFEST_NAME), {
+            'format': STORE_FORMAT,
+            'version': self.version,
+            'dtype': rows.dtype.str,
+            'shape': list(rows.shape[1:]),
+            'segments': segments,
+        })
+        self.refresh()
+
+    def _remove_segments(self, keep: Optional[int] = None) -> None:
+        """セグメントのファイルを削除（keep の番号のセグメントは残す）"""
+        kept = self._segment_path(keep, '.') if keep is not None else None
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            if not name.startswith(SEGMENT_PREFIX) or (kept is not None and path.startswith(kept)):
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                # メモリマップ中のファイルを削除できない環境では次回の compact で削除する
+                print(f"Warning: failed to remove {path} ({e}).", file=sys.stderr)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'version': self.version,
+            'keys': len(self),
+            'rows': int(self._starts[-1]),
+            'segments': len(self._segments),
+            'shape': list(self.shape) if self.shape is not None else None,
+            'dtype': self._manifest['dtype'],
+        }
+
+# プロセス内で開いたストア（同じストアのメモリマップ・索引を使い回す）
+_stores: Dict[Tuple[str, str, str], FeatureStore] = {}
+
+def open_store(name: str, version: str = '', root: str = FEATURE_STORE_DIR) -> FeatureStore:
+    """ストアを開く（開き済みなら他のプロセスの追記を反映して返す）"""
+    key = (root, name, version)
+    store = _stores.get(key)
+    if store is None:
+        store = _stores[key] = FeatureStore(name, version, root)
+    else:
+        store.refresh()
+    return store
+
+def list_stores(root: str = FEATURE_STORE_DIR) -> List[Dict[str, Any]]:
+    """保存先にあるストアの概要"""
+    if not os.path.isdir(root):
+        return []
+    summaries = []
+    for name in sorted(os.listdir(root)):
+        try:
+            with open(os.path.join(root, name, MANIFEST_NAME), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            continue
+        summaries.append(FeatureStore(name, manifest.get('version', ''), root).stats())
+    return summaries
+
+def compact_stores(root: str = FEATURE_STORE_DIR) -> List[Dict[str, Any]]:
+    """保存先にある全てのストアを compact し、削除した行数を含む概要を返す"""
+    summaries = []
+    for summary in list_stores(root):
+        store = FeatureStore(summary['name'], summary['version'], root)
+        removed = store.compact()
+        summaries.append({**store.stats(), 'removed_rows': removed})
+    return summaries
+
+def main():
+    """保存済みのストアを一覧表示（--compact で1セグメントにまとめる）"""
+    parser = argparse.ArgumentParser(description='特徴量ストアの一覧・compact')
+    parser.add_argument('root', nargs='?', default=FEATURE_STORE_DIR, help='特徴量ストアの保存先')
+    parser.add_argument('--compact', action='store_true', help='各ストアの有効な行を1つのセグメントにまとめる')
+    args = parser.parse_args()
+    summaries = compact_stores(args.root) if args.compact else list_stores(args.root)
+    print(json.dumps(summaries, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
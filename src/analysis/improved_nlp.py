@@ -1,194 +1,874 @@
 """
 改善版NLP分析パイプライン
 MeCab + BERTを使用した高精度分析
+MeCab・トークナイザ・モデルは初回使用時に読み込む（キーワード・共起のみなら BERT は読み込まない）
 """
 
+import time
+
+_IMPORT_START = time.perf_counter()
+
+import heapq
+import importlib.util
 import json
+import os
 import sys
-from typing import List, Dict, Any, Tuple
-import re
+from functools import partial
+from operator import itemgetter
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence, Tuple, Union
+
+from analysis_cache import AnalysisCache, normalize_text
+from corpus import TokenizedCorpus, Vocabulary, tokenize_corpus
+from input_stream import build_parser, chunked, has_input, iter_records, load_json_input, record_text
+from lexicon import SENTIMENT_MATCHER
+import metrics
+from nlp_store import NLPResultStore, TextResult, content_hash, text_ordinal
+from parallel import ordered_parallel_map, resolve_workers
+from segmenter import STOPWORDS, segment, segmenter_version
 
 try:
-    import MeCab
-    MECAB_AVAILABLE = True
+    from cooccurrence import CooccurrenceCounter, SCORING_METHODS
+    from keywords import KeywordCounter
+    COOCCURRENCE_ENGINE_AVAILABLE = True
 except ImportError:
-    MECAB_AVAILABLE = False
+    COOCCURRENCE_ENGINE_AVAILABLE = False
+    SCORING_METHODS = ('count',)
+    print("Warning: NumPy is not available. Using dict-based keyword and co-occurrence counting.", file=sys.stderr)
+
+# ライブラリの有無はインポートせずに判定（読み込みは初回使用時）
+MECAB_AVAILABLE = importlib.util.find_spec('MeCab') is not None
+if not MECAB_AVAILABLE:
     print("Warning: MeCab is not available. Using simple tokenization.", file=sys.stderr)
 
-try:
-    from transformers import AutoTokenizer, AutoModelForSequenceClassification
-    import torch
-    BERT_AVAILABLE = True
-except ImportError:
-    BERT_AVAILABLE = False
+BERT_AVAILABLE = (
+    importlib.util.find_spec('transformers') is not None
+    and importlib.util.find_spec('torch') is not None
+)
+if not BERT_AVAILABLE:
     print("Warning: Transformers is not available. Using simple sentiment analysis.", file=sys.stderr)
 
-# MeCabインスタンス（グローバル）
+ANALYSES = ('keywords', 'cooccurrences', 'sentiment')
+
+# MeCabインスタンス（グローバル、初回使用時に生成）
+MeCab = None
 mecab = None
-if MECAB_AVAILABLE:
+_mecab_loaded = False
+
+# BERTモデル（グローバル、初回使用時に読み込み）
+# 日本語BERTモデル（軽量版）
+model_name = "cl-tohoku/bert-base-japanese-v3"
+torch = None
+tokenizer = None
+model = None
+# 推論バックエンド（sentiment_backends.py、環境変数 SENTIMENT_BACKEND で選択）
+sentiment_backend = None
+_bert_loaded = False
+# バッチ推論のバッチサイズ（環境変数で変更可能）
+SENTIMENT_BATCH_SIZE = int(os.environ.get('SENTIMENT_BATCH_SIZE', '32'))
+# ストリーム処理で一度に保持するテキスト数
+STREAM_CHUNK_SIZE = int(os.environ.get('NLP_STREAM_CHUNK_SIZE', '1000'))
+
+# インポート・読み込みにかかった時間（秒）
+LOAD_TIMINGS: Dict[str, float] = {}
+
+# 同一回答の再計算を避けるキャッシュ（モデル・辞書バージョンごと、MeCabがなければ簡易分割の規則ごと）
+token_cache = AnalysisCache('tokens', segmenter_version())
+sentiment_cache = AnalysisCache('sentiment', model_name)
+
+def _mecab_version() -> str:
+    """キャッシュキー用のMeCab・辞書バージョン"""
     try:
-        mecab = MeCab.Tagger("-Owakati")
+        dictionary = mecab.dictionary_info()
+        return f'{MeCab.VERSION}:{dictionary.filename}:{dictionary.version}'
     except:
+        return 'mecab'
+
+def get_mecab():
+    """MeCabインスタンスを返す（初回呼び出し時に生成、利用不可ならNone）"""
+    global MeCab, mecab, _mecab_loaded, MECAB_AVAILABLE
+    if _mecab_loaded or not MECAB_AVAILABLE:
+        return mecab
+    
+    _mecab_loaded = True
+    start = time.perf_counter()
+    try:
+        import MeCab as mecab_module
+        MeCab = mecab_module
+        mecab = MeCab.Tagger("-Owakati")
+        token_cache.version = _mecab_version()
+    except Exception as e:
         MECAB_AVAILABLE = False
+        mecab = None
+        print(f"Warning: failed to load MeCab ({e}). Using simple tokenization.", file=sys.stderr)
+    LOAD_TIMINGS['mecab'] = time.perf_counter() - start
+    return mecab
 
-# BERTモデル（グローバル）
-tokenizer = None
-model = None
-if BERT_AVAILABLE:
+def load_bert() -> bool:
+    """BERTのトークナイザとモデルを読み込む（初回のみ）。利用可能ならTrue"""
+    global torch, tokenizer, model, sentiment_backend, _bert_loaded, BERT_AVAILABLE
+    if _bert_loaded or not BERT_AVAILABLE:
+        return model is not None
+    
+    _bert_loaded = True
+    start = time.perf_counter()
     try:
-        # 日本語BERTモデル（軽量版）
-        model_name = "cl-tohoku/bert-base-japanese-v3"
+        import torch as torch_module
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+        LOAD_TIMINGS['bert_import'] = time.perf_counter() - start
+        
+        tokenizer_start = time.perf_counter()
         tokenizer = AutoTokenizer.from_pretrained(model_name)
+        LOAD_TIMINGS['bert_tokenizer'] = time.perf_counter() - tokenizer_start
+        
+        model_start = time.perf_counter()
         model = AutoModelForSequenceClassification.from_pretrained(model_name)
         model.eval()
-    except:
+        LOAD_TIMINGS['bert_model'] = time.perf_counter() - model_start
+        
+        # CPU推論の最適化（int8量子化・ONNX Runtime、スレッド数・コアの固定）
+        backend_start = time.perf_counter()
+        from sentiment_backends import SENTIMENT_BACKEND, create_backend
+        sentiment_backend = create_backend(SENTIMENT_BACKEND, model, torch_module, tokenizer, model_name)
+        LOAD_TIMINGS['bert_backend'] = time.perf_counter() - backend_start
+        if sentiment_backend.name != 'eager':
+            # 量子化したモデルのスコアはfp32と僅かに異なるため、キャッシュを分ける
+            sentiment_cache.version = f'{model_name}:{sentiment_backend.name}'
+        torch = torch_module
+    except Exception as e:
         BERT_AVAILABLE = False
+        tokenizer = None
+        model = None
+        sentiment_backend = None
+        print(f"Warning: failed to load BERT model ({e}). Using simple sentiment analysis.", file=sys.stderr)
+    return model is not None
+
+def warmup() -> Dict[str, float]:
+    """MeCab・BERTを事前に読み込み、読み込み時間を返す"""
+    get_mecab()
+    load_bert()
+    return dict(LOAD_TIMINGS)
+
+def cache_stats() -> Dict[str, Any]:
+    """キャッシュのヒット・ミス数"""
+    return {'tokens': token_cache.stats(), 'sentiment': sentiment_cache.stats()}
+
+def flush_caches() -> None:
+    """キャッシュをディスクに反映"""
+    token_cache.flush()
+    sentiment_cache.flush()
 
 def tokenize_with_mecab(text: str) -> List[str]:
-    """MeCabを使用した形態素解析"""
-    if not MECAB_AVAILABLE or mecab is None:
-        # フォールバック：簡易分割
-        return simple_tokenize(text)
+    """MeCabを使用した形態素解析（MeCabがなければ簡易分割）
     
-    try:
-        result = mecab.parse(text)
-        tokens = result.strip().split()
-        # ストップワード除去
-        stopwords = {'の', 'に', 'は', 'を', 'が', 'で', 'と', 'も', 'など', 'こと', 'ため', 'ため', 'よう'}
-        return [t for t in tokens if t not in stopwords and len(t) > 1]
-    except:
-        return simple_tokenize(text)
+    キャッシュキーと同じ正規化済みテキストを解析するため、
+    正規化後に一致する入力は常に同じトークン列になる。
+    """
+    # キャッシュのバージョン（辞書）を確定させてから引く
+    tagger = get_mecab()
+    text = normalize_text(text)
+    cached = token_cache.get(text)
+    if cached is not None:
+        return list(cached)
+    
+    if tagger is None:
+        # フォールバック：簡易分割
+        tokens = simple_tokenize(text)
+    else:
+        try:
+            result = tagger.parse(text)
+            tokens = result.strip().split()
+            # ストップワード除去
+            tokens = [t for t in tokens if t not in STOPWORDS and len(t) > 1]
+        except:
+            # 失敗時の簡易分割はMeCabの結果としてキャッシュしない
+            return simple_tokenize(text)
+    token_cache.put(text, tokens)
+    return tokens
 
 def simple_tokenize(text: str) -> List[str]:
-    """簡易的な形態素解析（フォールバック）"""
-    text = re.sub(r'[。、！？]', ' ', text)
-    tokens = text.split()
-    return [t for t in tokens if len(t) > 1]
+    """簡易的な形態素解析（フォールバック：文字種の境界で分割）"""
+    return segment(text)
 
 def extract_keywords_improved(text: str, top_n: int = 10) -> List[Tuple[str, int]]:
     """改善版キーワード抽出（MeCab使用）"""
-    tokens = tokenize_with_mecab(text)
-    
+    vocabulary = Vocabulary()
+    token_ids = vocabulary.encode(tokenize_with_mecab(text))
+    return [(vocabulary.token(token_id), freq) for token_id, freq in count_keywords(token_ids, top_n)]
+
+def count_keywords(token_ids: Sequence[int], top_n: int = 10) -> List[Tuple[int, int]]:
+    """トークンID配列から頻度上位のキーワードIDを抽出（同頻度は初出順）"""
     # 頻度カウント
-    word_freq: Dict[str, int] = {}
-    for token in tokens:
-        word_freq[token] = word_freq.get(token, 0) + 1
+    word_freq: Dict[int, int] = {}
+    for token_id in token_ids:
+        word_freq[token_id] = word_freq.get(token_id, 0) + 1
     
-    # 頻度順にソート
-    sorted_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
-    
-    return sorted_words[:top_n]
+    # 上位のみ選択（全体をソートせず、安定ソートの先頭 top_n 件と同じ結果）
+    return heapq.nlargest(top_n, word_freq.items(), key=itemgetter(1))
 
 def analyze_sentiment_bert(text: str) -> float:
     """BERTを使用した感情分析"""
-    if not BERT_AVAILABLE or tokenizer is None or model is None:
+    if not load_bert():
         # フォールバック：簡易分析
         return analyze_sentiment_simple(text)
     
+    # キャッシュキーと同じ正規化済みテキストを推論する
+    text = normalize_text(text)
+    cached = sentiment_cache.get(text)
+    if cached is not None:
+        return cached
+    
+    score = _infer_sentiment(text)
+    sentiment_cache.put(text, score)
+    return score
+
+def _infer_sentiment(text: str) -> float:
+    """BERTによる1件の推論（失敗時は簡易分析）"""
     try:
         # トークナイズ
-        inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=512)
+        inputs = tokenizer(text, return_tensors=sentiment_backend.tensor_type, truncation=True, max_length=512)
         
         # 推論
-        with torch.no_grad():
-            outputs = model(**inputs)
-            logits = outputs.logits
+        logits = sentiment_backend.logits(inputs)
         
-        # スコアを-1 to 1に変換（簡易版）
-        # 実際の実装では、感情分析用のファインチューニング済みモデルを使用
-        score = float(logits[0][0]) / 10.0  # 簡易的な正規化
-        return max(-1.0, min(1.0, score))
+        return logit_to_score(float(logits[0][0]))
     except:
         return analyze_sentiment_simple(text)
 
-def analyze_sentiment_simple(text: str) -> float:
-    """簡易感情分析（フォールバック）"""
-    positive_words = ['良い', 'いい', '好き', '気に入った', '満足', '快適', '心地よい', '素晴らしい']
-    negative_words = ['悪い', '嫌い', '不快', '気に入らない', '不満', 'うるさい', 'うっとうしい']
-    
-    score = 0.0
-    for word in positive_words:
-        if word in text:
-            score += 0.2
-    for word in negative_words:
-        if word in text:
-            score -= 0.2
-    
+def logit_to_score(logit: float) -> float:
+    """ロジットを-1 to 1のスコアに変換（簡易版）"""
+    # 実際の実装では、感情分析用のファインチューニング済みモデルを使用
+    score = logit / 10.0  # 簡易的な正規化
     return max(-1.0, min(1.0, score))
 
-def build_cooccurrence_matrix(texts: List[str]) -> Dict[Tuple[str, str], int]:
-    """共起行列の構築"""
-    cooccurrence: Dict[Tuple[str, str], int] = {}
+def analyze_sentiment_bert_batch(texts: List[str], batch_size: Optional[int] = None) -> List[float]:
+    """BERTを使用した一括感情分析（トークン長でバケット化してバッチ推論）"""
+    if batch_size is None:
+        batch_size = SENTIMENT_BATCH_SIZE
+    batch_size = max(1, batch_size)
+
+    if not load_bert():
+        return SENTIMENT_MATCHER.score_batch(texts)
+
+    # キャッシュ済みの回答は推論せず、未計算の回答は重複を除いて推論する
+    # （キャッシュキーと同じ正規化済みテキストを推論する）
+    texts = [normalize_text(text) for text in texts]
+    scores: List[float] = [0.0] * len(texts)
+    pending: Dict[str, List[int]] = {}
+    for i, text in enumerate(texts):
+        cached = sentiment_cache.get(text)
+        if cached is not None:
+            scores[i] = cached
+        else:
+            pending.setdefault(sentiment_cache.key(text), []).append(i)
+
+    unique_texts = [texts[indices[0]] for indices in pending.values()]
+    for indices, score in zip(pending.values(), _infer_sentiment_batch(unique_texts, batch_size)):
+        sentiment_cache.put(texts[indices[0]], score)
+        for i in indices:
+            scores[i] = score
+
+    return scores
+
+def _infer_sentiment_batch(texts: List[str], batch_size: int) -> List[float]:
+    """BERTによるバッチ推論（トークン長でバケット化）"""
+    if not texts:
+        return []
+
+    try:
+        # パディングなしで一括トークナイズし、長さを取得
+        encodings = tokenizer(texts, truncation=True, max_length=512)
+    except:
+        return [_infer_sentiment(text) for text in texts]
+
+    # 長さ順に並べ、近い長さ同士でバッチを組む（パディングを最小化）
+    lengths = [len(ids) for ids in encodings['input_ids']]
+    order = sorted(range(len(texts)), key=lambda i: lengths[i])
+
+    scores: List[float] = [0.0] * len(texts)
+    for start in range(0, len(order), batch_size):
+        bucket = order[start:start + batch_size]
+        try:
+            features = [{key: encodings[key][i] for key in encodings.keys()} for i in bucket]
+            inputs = tokenizer.pad(features, return_tensors=sentiment_backend.tensor_type)
+            logits = sentiment_backend.logits(inputs)
+            for row, i in enumerate(bucket):
+                scores[i] = logit_to_score(float(logits[row][0]))
+        except:
+            # バッチが失敗した場合のみ1件ずつ処理（失敗した項目は簡易分析）
+            for i in bucket:
+                scores[i] = _infer_sentiment(texts[i])
+
+    return scores
+
+def analyze_sentiment_simple(text: str) -> float:
+    """簡易感情分析（フォールバック、極性辞書を1パスで照合）"""
+    return SENTIMENT_MATCHER.score(text)
+
+def build_cooccurrence_matrix(texts: Union[List[str], TokenizedCorpus]) -> Dict[Tuple[str, str], int]:
+    """共起行列の構築（テキストまたはトークン化済みコーパスを受け付ける）"""
+    corpus = texts if isinstance(texts, TokenizedCorpus) else tokenize_corpus(texts, tokenize_with_mecab)
+    counter = new_cooccurrence_counter(corpus.vocabulary)
+    counter.add_documents(corpus)
+    return counter.items()
+
+class DictCooccurrenceCounter:
+    """NumPyが使えない環境向けの辞書ベース共起集計（頻度のみ）"""
+
+    def __init__(self, vocabulary: Vocabulary):
+        self.vocabulary = vocabulary
+        self.cooccurrence: Dict[Tuple[int, int], int] = {}
+
+    def add_documents(self, documents: Iterable[Sequence[int]]) -> None:
+        for tokens in documents:
+            count_document_cooccurrences(tokens, self.vocabulary, self.cooccurrence)
+
+    def merge(self, other: 'DictCooccurrenceCounter') -> None:
+        """別の集計（後続のテキストを処理したもの）を出現順を保って統合"""
+        for (a, b), freq in other.cooccurrence.items():
+            x = self.vocabulary.intern(other.vocabulary.token(a))
+            y = self.vocabulary.intern(other.vocabulary.token(b))
+            pair = (x, y) if self.vocabulary.token(x) <= self.vocabulary.token(y) else (y, x)
+            self.cooccurrence[pair] = self.cooccurrence.get(pair, 0) + freq
+
+    def top(self, k: int = 20, scoring: str = 'count') -> List[Tuple[str, str, int, float]]:
+        if scoring != 'count':
+            raise ValueError(f'Scoring method requires NumPy: {scoring}')
+        top_pairs = sorted(self.cooccurrence.items(), key=lambda x: x[1], reverse=True)[:k]
+        return [
+            (self.vocabulary.token(a), self.vocabulary.token(b), freq, float(freq))
+            for (a, b), freq in top_pairs
+        ]
+
+    def items(self) -> Dict[Tuple[str, str], int]:
+        return {
+            (self.vocabulary.token(a), self.vocabulary.token(b)): freq
+            for (a, b), freq in self.cooccurrence.items()
+        }
+
+class DictKeywordCounter:
+    """NumPyが使えない環境向けの辞書ベースのキーワード頻度集計"""
+
+    def __init__(self, vocabulary: Vocabulary):
+        self.vocabulary = vocabulary
+        self.keywords: Dict[int, int] = {}
+
+    def add_documents(self, corpus: TokenizedCorpus, top_n: int = 10) -> None:
+        for token_ids in corpus:
+            for token_id, freq in count_keywords(token_ids, top_n):
+                self.keywords[token_id] = self.keywords.get(token_id, 0) + freq
+
+    def merge(self, other: 'DictKeywordCounter') -> None:
+        """別の集計（後続のテキストを処理したもの）を出現順を保って統合"""
+        for token_id, freq in other.keywords.items():
+            word_id = self.vocabulary.intern(other.vocabulary.token(token_id))
+            self.keywords[word_id] = self.keywords.get(word_id, 0) + freq
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def top(self, k: int = 20) -> List[Tuple[str, int]]:
+        return [
+            (self.vocabulary.token(token_id), freq)
+            for token_id, freq in heapq.nlargest(k, self.keywords.items(), key=itemgetter(1))
+        ]
+
+def new_keyword_counter(vocabulary: Vocabulary) -> Union['KeywordCounter', DictKeywordCounter]:
+    """利用可能なキーワード集計エンジンを返す（NumPy版を優先）"""
+    if COOCCURRENCE_ENGINE_AVAILABLE:
+        return KeywordCounter(vocabulary)
+    return DictKeywordCounter(vocabulary)
+
+def new_cooccurrence_counter(vocabulary: Vocabulary) -> Union['CooccurrenceCounter', DictCooccurrenceCounter]:
+    """利用可能な共起集計エンジンを返す（NumPy版を優先）"""
+    if COOCCURRENCE_ENGINE_AVAILABLE:
+        return CooccurrenceCounter(vocabulary)
+    return DictCooccurrenceCounter(vocabulary)
+
+def count_document_cooccurrences(
+    tokens: Sequence[int],
+    vocabulary: Vocabulary,
+    cooccurrence: Optional[Dict[Tuple[int, int], int]] = None,
+) -> Dict[Tuple[int, int], int]:
+    """1文書分の共起をカウント（既存のカウントに加算）"""
+    if cooccurrence is None:
+        cooccurrence = {}
     
-    for text in texts:
-        tokens = tokenize_with_mecab(text)
-        # ウィンドウサイズ2で共起をカウント
-        for i in range(len(tokens) - 1):
-            for j in range(i + 1, min(i + 3, len(tokens))):
-                pair = tuple(sorted([tokens[i], tokens[j]]))
-                cooccurrence[pair] = cooccurrence.get(pair, 0) + 1
+    # ウィンドウサイズ2で共起をカウント
+    for i in range(len(tokens) - 1):
+        for j in range(i + 1, min(i + 3, len(tokens))):
+            a, b = tokens[i], tokens[j]
+            pair = (a, b) if vocabulary.token(a) <= vocabulary.token(b) else (b, a)
+            cooccurrence[pair] = cooccurrence.get(pair, 0) + 1
     
     return cooccurrence
 
-def analyze_free_texts_improved(free_texts: List[str]) -> Dict[str, Any]:
-    """改善版自由記述テキスト分析"""
-    all_keywords: Dict[str, int] = {}
-    sentiments: List[float] = []
-    cooccurrence_matrix: Dict[Tuple[str, str], int] = {}
+def _count_chunk(
+    texts: List[str],
+    vocabulary: Vocabulary,
+    keyword_counter: Union['KeywordCounter', DictKeywordCounter],
+    counter: Optional[Union['CooccurrenceCounter', DictCooccurrenceCounter]],
+) -> None:
+    """チャンク内のテキストを1回ずつトークン化し、キーワードと共起（counter指定時）を加算"""
+    # 形態素解析は各テキストにつき1回のみ（以降の分析はID配列を共有）
+    with metrics.stage('tokenize'):
+        corpus = tokenize_corpus(texts, tokenize_with_mecab, vocabulary)
+    if metrics.is_enabled():
+        metrics.count('tokens', sum(len(token_ids) for token_ids in corpus))
     
-    for text in free_texts:
-        if not text or len(text.strip()) == 0:
-            continue
-        
-        # キーワード抽出（改善版）
-        keywords = extract_keywords_improved(text, top_n=10)
-        for keyword, freq in keywords:
-            all_keywords[keyword] = all_keywords.get(keyword, 0) + freq
-        
-        # 感情分析（BERT使用）
-        sentiment = analyze_sentiment_bert(text)
-        sentiments.append(sentiment)
+    # キーワード抽出（改善版、各テキストの上位10語）
+    with metrics.stage('keywords'):
+        keyword_counter.add_documents(corpus, top_n=10)
     
     # 共起行列の構築
-    cooccurrence_matrix = build_cooccurrence_matrix(free_texts)
+    if counter is not None:
+        with metrics.stage('cooccurrence'):
+            counter.add_documents(corpus)
+
+def _init_parallel_worker() -> None:
+    """並列ワーカーの初期化（プロセスごとにMeCabインスタンスとキャッシュを持つ）"""
+    global mecab, _mecab_loaded, token_cache
+    # 親プロセスのインスタンスは引き継がず、初回使用時に生成し直す
+    mecab = None
+    _mecab_loaded = False
+    # 親プロセスのSQLite接続は共有せず、メモリ上のキャッシュのみ使う
+    token_cache = AnalysisCache('tokens', token_cache.version, path=None)
+
+def _analyze_chunk_parallel(
+    chunk: List[Optional[str]], with_tokens: bool, with_cooccurrences: bool, with_sentiment: bool
+) -> Tuple[Any, ...]:
+    """並列ワーカーでのチャンク処理（キーワード頻度・共起集計・感情スコアの部分集計を返す）"""
+    valid_texts = [text for text in chunk if text and len(text.strip()) > 0]
+    vocabulary = Vocabulary()
+    keyword_counter = new_keyword_counter(vocabulary)
+    counter = new_cooccurrence_counter(vocabulary) if with_cooccurrences else None
+    if with_tokens:
+        _count_chunk(valid_texts, vocabulary, keyword_counter, counter)
+    sentiments = SENTIMENT_MATCHER.score_batch(valid_texts) if with_sentiment else None
+    return keyword_counter, counter, sentiments
+
+def analyze_free_texts_improved(
+    free_texts: Iterable[str],
+    batch_size: Optional[int] = None,
+    cooccurrence_scoring: str = 'count',
+    workers: Optional[int] = None,
+    analyses: Iterable[str] = ANALYSES,
+) -> Dict[str, Any]:
+    """改善版自由記述テキスト分析（テキストを一定件数ずつ逐次処理）
     
-    # 平均感情スコア
-    avg_sentiment = sum(sentiments) / len(sentiments) if sentiments else 0.0
+    cooccurrence_scoring: 共起ペアの順位付け（'count' / 'pmi' / 'npmi'）
+    workers: 並列ワーカー数（1で逐次、0以下でCPUコア数）。結果は逐次処理と一致する
+    analyses: 実行する分析（'keywords' / 'cooccurrences' / 'sentiment'）。
+              感情分析を含まない場合はBERTを読み込まない
+    """
+    if cooccurrence_scoring not in SCORING_METHODS:
+        raise ValueError(f'Unknown scoring method: {cooccurrence_scoring}')
+    analyses = set(analyses)
+    unknown = analyses - set(ANALYSES)
+    if unknown:
+        raise ValueError(f'Unknown analyses: {sorted(unknown)}')
+    with_sentiment = 'sentiment' in analyses
+    with_cooccurrences = 'cooccurrences' in analyses
+    with_tokens = with_cooccurrences or 'keywords' in analyses
+    
+    vocabulary = Vocabulary()
+    keyword_counter = new_keyword_counter(vocabulary)
+    cooccurrence_counter = new_cooccurrence_counter(vocabulary) if with_cooccurrences else None
+    sentiment_sum = 0.0
+    analyzed_count = 0
+    total_count = 0
+    
+    workers = resolve_workers(workers)
+    if workers > 1:
+        # マップ：チャンクごとに別プロセスで集計（BERT推論は親プロセスでバッチ実行）
+        bert_ready = with_sentiment and load_bert()
+        chunks = ordered_parallel_map(
+            partial(
+                _analyze_chunk_parallel,
+                with_tokens=with_tokens,
+                with_cooccurrences=with_cooccurrences,
+                with_sentiment=with_sentiment and not bert_ready,
+            ),
+            chunked(free_texts, STREAM_CHUNK_SIZE),
+            workers,
+            initializer=_init_parallel_worker,
+        )
+        # リデュース：入力順に統合するため、同頻度の並び順も逐次処理と一致する
+        for chunk, (partial_keywords, partial_counter, sentiments) in chunks:
+            metrics.count('chunks')
+            total_count += len(chunk)
+            valid_texts = [text for text in chunk if text and len(text.strip()) > 0]
+            analyzed_count += len(valid_texts)
+            with metrics.stage('merge'):
+                keyword_counter.merge(partial_keywords)
+                if cooccurrence_counter is not None:
+                    cooccurrence_counter.merge(partial_counter)
+            if with_sentiment and sentiments is None:
+                with metrics.stage('sentiment'):
+                    sentiments = analyze_sentiment_bert_batch(valid_texts, batch_size=batch_size)
+            for sentiment in sentiments or []:
+                sentiment_sum += sentiment
+    else:
+        for chunk in chunked(free_texts, STREAM_CHUNK_SIZE):
+            metrics.count('chunks')
+            total_count += len(chunk)
+            valid_texts = [text for text in chunk if text and len(text.strip()) > 0]
+            analyzed_count += len(valid_texts)
+            
+            if with_tokens:
+                _count_chunk(valid_texts, vocabulary, keyword_counter, cooccurrence_counter)
+            
+            # 感情分析（BERTによるバッチ推論）
+            if with_sentiment:
+                with metrics.stage('sentiment'):
+                    for sentiment in analyze_sentiment_bert_batch(valid_texts, batch_size=batch_size):
+                        sentiment_sum += sentiment
+    
+    flush_caches()
+    
+    result: Dict[str, Any] = {}
     
     # トップキーワード
-    top_keywords = sorted(all_keywords.items(), key=lambda x: x[1], reverse=True)[:20]
+    if 'keywords' in analyses:
+        with metrics.stage('rank_keywords'):
+            top_keywords = keyword_counter.top(20)
+        result['keywords'] = [{'word': word, 'frequency': freq} for word, freq in top_keywords]
     
     # トップ共起ペア
-    top_cooccurrences = sorted(cooccurrence_matrix.items(), key=lambda x: x[1], reverse=True)[:20]
+    if cooccurrence_counter is not None:
+        cooccurrences = []
+        with metrics.stage('rank_cooccurrences'):
+            top_pairs = cooccurrence_counter.top(20, scoring=cooccurrence_scoring)
+        for word1, word2, freq, score in top_pairs:
+            pair = {'word1': word1, 'word2': word2, 'frequency': freq}
+            if cooccurrence_scoring != 'count':
+                pair['score'] = score
+            cooccurrences.append(pair)
+        result['cooccurrences'] = cooccurrences
+    
+    # 平均感情スコア
+    if with_sentiment:
+        result['average_sentiment'] = sentiment_sum / analyzed_count if analyzed_count else 0.0
+    
+    result.update({
+        'total_texts': total_count,
+        'analyzed_texts': analyzed_count,
+        'analysis_method': 'improved' if (MECAB_AVAILABLE or BERT_AVAILABLE) else 'simple',
+    })
+    _record_metrics(total_count, analyzed_count, len(vocabulary))
+    return result
+
+def _record_metrics(total_count: int, analyzed_count: int, vocabulary_size: int) -> None:
+    """件数・キャッシュ統計・読み込み時間を計測結果に記録"""
+    if not metrics.is_enabled():
+        return
+    metrics.count('texts', total_count)
+    metrics.count('analyzed_texts', analyzed_count)
+    metrics.record('vocabulary_size', vocabulary_size)
+    metrics.record('cache', cache_stats())
+    metrics.record('load_timings', dict(LOAD_TIMINGS))
+
+def _result_versions() -> Dict[str, str]:
+    """結果ストアの集計に使った解析方式・形態素解析・感情分析のバージョン"""
+    return {
+        'analysis_method': 'improved' if (MECAB_AVAILABLE or BERT_AVAILABLE) else 'simple',
+        'token_version': token_cache.version,
+        # BERTを読み込めない場合は極性辞書で採点する（感情スコアのキャッシュは使わない）
+        'sentiment_version': sentiment_cache.version if model is not None else 'lexicon',
+    }
+
+def _open_result_store(store_path: str) -> Tuple[NLPResultStore, str]:
+    """結果ストアを開き、解析方式・辞書・モデルが変わっていれば過去の結果を破棄する"""
+    # 解析方式・バージョンを確定させるため、先に読み込みを済ませる
+    get_mecab()
+    load_bert()
+    versions = _result_versions()
+    store = NLPResultStore(store_path)
+    # 別の辞書・モデルで解析した結果を累積値に混在させない
+    if any(store.get_meta(key) != value for key, value in versions.items()):
+        store.reset()
+        for key, value in versions.items():
+            store.set_meta(key, value)
+    return store, versions['analysis_method']
+
+def _analyze_into_store(
+    store: NLPResultStore,
+    new_records: Dict[str, Tuple[str, str, str]],
+    batch_size: Optional[int] = None,
+) -> int:
+    """新規・変更テキスト（評価ID → (本文, 本文ハッシュ, 並び順)）を解析して保存し、語彙数を返す"""
+    new_texts = [text for text, _, _ in new_records.values()]
+    with metrics.stage('tokenize'):
+        corpus = tokenize_corpus(new_texts, tokenize_with_mecab)
+    vocabulary = corpus.vocabulary
+    with metrics.stage('sentiment'):
+        sentiments = analyze_sentiment_bert_batch(new_texts, batch_size=batch_size)
+    
+    results: List[TextResult] = []
+    for (evaluation_id, (_, digest, ordinal)), token_ids, sentiment in zip(
+        new_records.items(), corpus, sentiments
+    ):
+        keywords = [
+            (vocabulary.token(token_id), freq)
+            for token_id, freq in count_keywords(token_ids, top_n=10)
+        ]
+        cooccurrences = [
+            (vocabulary.token(a), vocabulary.token(b), freq)
+            for (a, b), freq in count_document_cooccurrences(token_ids, vocabulary).items()
+        ]
+        results.append(TextResult(evaluation_id, digest, ordinal, sentiment, keywords, cooccurrences))
+    with metrics.stage('store_add'):
+        store.add(results)
+    flush_caches()
+    return len(vocabulary)
+
+def _sync_store(
+    store: NLPResultStore,
+    records: Iterable[Tuple[str, str, str]],
+    batch_size: Optional[int] = None,
+) -> Dict[str, int]:
+    """全件の (評価ID, 本文, 並び順) と保存済みの結果を比較し、差分のみ反映する"""
+    with metrics.stage('store_diff'):
+        stored = store.stored_texts()
+    
+    # 本文を保持するのは新規・変更テキストのみ
+    current: Dict[str, str] = {}
+    new_records: Dict[str, Tuple[str, str, str]] = {}
+    reordered: List[Tuple[str, str]] = []
+    total_count = 0
+    for evaluation_id, text, ordinal in records:
+        total_count += 1
+        if not text or len(text.strip()) == 0:
+            continue
+        digest = content_hash(text)
+        current[evaluation_id] = digest
+        previous = stored.get(evaluation_id)
+        if previous is None or previous[0] != digest:
+            new_records[evaluation_id] = (text, digest, ordinal)
+        elif previous[1] != ordinal:
+            reordered.append((evaluation_id, ordinal))
+    
+    stale_ids = [
+        evaluation_id for evaluation_id, (digest, _) in stored.items()
+        if current.get(evaluation_id) != digest
+    ]
+    
+    # 削除・変更されたテキストの寄与分を差し引く
+    with metrics.stage('store_remove'):
+        store.remove(stale_ids)
+        if reordered:
+            store.set_ordinals(reordered)
+    
+    # 新規・変更テキストのみ解析
+    vocabulary_size = _analyze_into_store(store, new_records, batch_size)
+    return {
+        'total_texts': total_count,
+        'new_texts': len(new_records),
+        'removed_texts': len([i for i in stale_ids if i not in current]),
+        'vocabulary_size': vocabulary_size,
+    }
+
+def _store_summary(store: NLPResultStore, counts: Dict[str, int], analysis_method: str) -> Dict[str, Any]:
+    """ストアの累積値から結果を組み立てる"""
+    with metrics.stage('store_query'):
+        sentiment_sum, analyzed_count = store.sentiment_summary()
+        top_keywords = store.top_keywords(20)
+        top_cooccurrences = store.top_cooccurrences(20)
+    
+    metrics.count('new_texts', counts['new_texts'])
+    _record_metrics(counts['total_texts'], analyzed_count, counts['vocabulary_size'])
     
     return {
         'keywords': [{'word': word, 'frequency': freq} for word, freq in top_keywords],
         'cooccurrences': [
-            {'word1': pair[0], 'word2': pair[1], 'frequency': freq}
-            for pair, freq in top_cooccurrences
+            {'word1': word1, 'word2': word2, 'frequency': freq}
+            for word1, word2, freq in top_cooccurrences
         ],
-        'average_sentiment': avg_sentiment,
-        'total_texts': len(free_texts),
-        'analyzed_texts': len(sentiments),
-        'analysis_method': 'improved' if (MECAB_AVAILABLE or BERT_AVAILABLE) else 'simple',
+        'average_sentiment': sentiment_sum / analyzed_count if analyzed_count else 0.0,
+        'total_texts': counts['total_texts'],
+        'analyzed_texts': analyzed_count,
+        'new_texts': counts['new_texts'],
+        'removed_texts': counts['removed_texts'],
+        'analysis_method': analysis_method,
     }
 
+def analyze_free_texts_incremental(
+    records: Iterable[Dict[str, Any]],
+    store_path: str,
+    batch_size: Optional[int] = None,
+) -> Dict[str, Any]:
+    """差分更新版自由記述テキスト分析
+    
+    records は {'id': 評価ID, 'text': 自由記述} の全件（逐次読み込み可）。
+    新規・変更テキストのみ解析し、削除・変更分の寄与を累積値から差し引く。
+    同頻度の並び順は全件解析と同じく records の順での初出順。
+    """
+    store, analysis_method = _open_result_store(store_path)
+    with store:
+        # 呼び出し側が全件を渡すため、データベースの基準点は使えなくなる
+        store.delete_meta(DB_WATERMARK_KEY)
+        counts = _sync_store(
+            store,
+            (
+                (str(record['id']), record.get('text'), text_ordinal(position))
+                for position, record in enumerate(records)
+            ),
+            batch_size,
+        )
+        store.commit()
+        return _store_summary(store, counts, analysis_method)
+
+# 差分更新の基準点（最後に取り込んだ回答の登録日時・評価IDと、それまでの件数）のメタデータ名
+DB_WATERMARK_KEY = 'db_watermark'
+
+def analyze_free_texts_from_db(
+    db_path: str,
+    store_path: str,
+    batch_size: Optional[int] = None,
+    rescan: bool = False,
+) -> Dict[str, Any]:
+    """評価データベースを直接読む差分更新版自由記述テキスト分析
+    
+    前回取り込んだ最後の回答（登録日時, 評価ID）を基準点として保存し、
+    それより後に登録された回答だけを読み込んで解析する（全件の本文は読まない）。
+    基準点までの件数が前回と異なる場合（削除・過去日時での追加）と rescan 指定時は、
+    全件の本文ハッシュを比較して差分を反映する。
+    本文の編集は基準点では検出できないため、rescan で反映する。
+    同頻度の並び順は全件解析（rowid 順）と同じ初出順。
+    """
+    from evaluation_db import count_free_texts_until, iter_free_text_rows
+    
+    store, analysis_method = _open_result_store(store_path)
+    with store:
+        watermark = json.loads(store.get_meta(DB_WATERMARK_KEY) or 'null')
+        incremental = False
+        if watermark is not None and not rescan:
+            with metrics.stage('watermark'):
+                until = (watermark['created_at'], watermark['id'])
+                incremental = count_free_texts_until(until, db_path) == watermark['count']
+        
+        last: Optional[Tuple[int, str]] = None
+        seen = 0
+        
+        def rows(after: Optional[Tuple[int, str]]) -> Iterator[Tuple[str, str, str]]:
+            nonlocal last, seen
+            for evaluation_id, text, created_at, rowid in iter_free_text_rows(db_path, after):
+                last = (created_at, evaluation_id)
+                seen += 1
+                yield evaluation_id, text, text_ordinal(rowid)
+        
+        if incremental:
+            # 基準点より後の回答のみ解析（同じIDが保存済みなら置き換える）
+            new_records = {
+                evaluation_id: (text, content_hash(text), ordinal)
+                for evaluation_id, text, ordinal in rows(until)
+            }
+            with metrics.stage('store_remove'):
+                store.remove(new_records)
+            vocabulary_size = _analyze_into_store(store, new_records, batch_size)
+            counts = {
+                'total_texts': store.text_count(),
+                'new_texts': len(new_records),
+                'removed_texts': 0,
+                'vocabulary_size': vocabulary_size,
+            }
+            last = last or until
+            seen += watermark['count']
+        else:
+            counts = _sync_store(store, rows(None), batch_size)
+        
+        if last is not None:
+            store.set_meta(DB_WATERMARK_KEY, json.dumps({'created_at': last[0], 'id': last[1], 'count': seen}))
+        store.commit()
+        result = _store_summary(store, counts, analysis_method)
+        result['incremental'] = incremental
+        return result
+
 def main():
     """メイン処理"""
-    if len(sys.argv) < 2:
+    parser = build_parser('改善版NLP分析')
+    parser.add_argument('--store', help='差分更新用の結果ストアのパス')
+    parser.add_argument('--db', help='評価データベースから直接読み込む（--store と併用）')
+    parser.add_argument('--rescan', action='store_true', help='--db で全件の本文を比較し直す')
+    parser.add_argument('--batch-size', type=int, help='感情分析のバッチサイズ')
+    parser.add_argument(
+        '--cooccurrence-scoring', choices=SCORING_METHODS, default='count', help='共起ペアの順位付け'
+    )
+    parser.add_argument('--workers', type=int, help='並列ワーカー数（0でCPUコア数）')
+    parser.add_argument(
+        '--analyses', default=','.join(ANALYSES), help='実行する分析（カンマ区切り: keywords,cooccurrences,sentiment）'
+    )
+    parser.add_argument('--warmup', action='store_true', help='MeCab・BERTを事前に読み込む')
+    parser.add_argument('--timings', action='store_true', help='インポート・読み込み時間を結果に含める')
+    parser.add_argument('--metrics', action='store_true', help='処理段階ごとの計測結果を含める')
+    parser.add_argument('--trace', help='計測イベントをNDJSONで追記するファイル')
+    args = parser.parse_args()
+    metrics.begin(enabled=True if args.metrics else None, trace_path=args.trace)
+    analyses = [name.strip() for name in args.analyses.split(',') if name.strip()]
+    
+    if args.warmup:
+        warmup()
+        if not has_input(args):
+            # 入力なしのウォームアップは読み込み時間のみ出力
+            print(json.dumps({'load_timings': LOAD_TIMINGS}))
+            sys.exit(0)
+    
+    if not (args.db and args.store) and not has_input(args):
         print(json.dumps({'error': 'No input data'}))
         sys.exit(1)
     
     try:
-        input_data = json.loads(sys.argv[1])
-        free_texts = input_data.get('free_texts', [])
-        
-        result = analyze_free_texts_improved(free_texts)
-        print(json.dumps(result, ensure_ascii=False))
+        if args.db and args.store:
+            # 差分更新モード（評価データベースを直接読む）
+            result = analyze_free_texts_from_db(
+                args.db, args.store, batch_size=args.batch_size, rescan=args.rescan
+            )
+        elif args.ndjson:
+            # NDJSON: 1行1レコードを逐次処理（メモリ使用量は件数に依存しない）
+            records = iter_records(args)
+            if args.store:
+                result = analyze_free_texts_incremental(records, args.store, batch_size=args.batch_size)
+            else:
+                free_texts = (record_text(record) for record in records)
+                result = analyze_free_texts_improved(
+                    free_texts,
+                    batch_size=args.batch_size,
+                    cooccurrence_scoring=args.cooccurrence_scoring,
+                    workers=args.workers,
+                    analyses=analyses,
+                )
+        else:
+            input_data = load_json_input(args)
+            batch_size = input_data.get('batch_size', args.batch_size)
+            store_path = input_data.get('store', args.store)
+            
+            if input_data.get('db') and store_path:
+                # 差分更新モード（評価データベースを直接読む）
+                result = analyze_free_texts_from_db(
+                    input_data['db'], store_path,
+                    batch_size=batch_size, rescan=bool(input_data.get('rescan', args.rescan)),
+                )
+            elif 'records' in input_data and store_path:
+                # 差分更新モード
+                result = analyze_free_texts_incremental(
+                    input_data['records'], store_path, batch_size=batch_size
+                )
+            else:
+                free_texts = input_data.get('free_texts', [])
+                result = analyze_free_texts_improved(
+                    free_texts,
+                    batch_size=batch_size,
+                    cooccurrence_scoring=input_data.get('cooccurrence_scoring', args.cooccurrence_scoring),
+                    workers=input_data.get('workers', args.workers),
+                    analyses=input_data.get('analyses', analyses),
+                )
+        if args.timings:
+            result['load_timings'] = LOAD_TIMINGS
+        print(json.dumps(metrics.attach(result), ensure_ascii=False))
     except Exception as e:
         print(json.dumps({'error': str(e)}))
         sys.exit(1)
 
+LOAD_TIMINGS['import'] = time.perf_counter() - _IMPORT_START
+
 if __name__ == '__main__':
     main()
-
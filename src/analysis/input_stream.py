@@ -0,0 +1,97 @@
+"""
+分析スクリプト共通の入力処理
+引数のJSON文字列（従来形式）、標準入力、ファイル、NDJSONストリームに対応
+"""
+
+import argparse
+import json
+import sys
+from itertools import islice
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar('T')
+
+def build_parser(description: str) -> argparse.ArgumentParser:
+    """共通の入力オプションを持つ引数パーサ"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('data', nargs='?', help='入力JSON文字列（従来形式）')
+    parser.add_argument('--input', '-i', help="入力ファイルのパス（'-' で標準入力）")
+    parser.add_argument('--ndjson', action='store_true', help='1行1レコードのNDJSONとして読み込む')
+    return parser
+
+def stdin_has_data() -> bool:
+    """標準入力にデータがあるか（読み進めずに先頭を覗く）
+
+    端末と、すぐにEOFになる標準入力（/dev/null、Node の spawn や cron で
+    何も書き込まれずに閉じたパイプ）はデータなしとみなす。
+    """
+    if sys.stdin is None or sys.stdin.isatty():
+        return False
+    buffer = getattr(sys.stdin, 'buffer', None)
+    if buffer is None or not hasattr(buffer, 'peek'):
+        # 差し替えられた標準入力（テスト等）は覗けないため入力ありとみなす
+        return True
+    try:
+        return len(buffer.peek(1)) > 0
+    except (OSError, ValueError):
+        return False
+
+def has_input(args: argparse.Namespace) -> bool:
+    """入力が指定されているか
+
+    引数のJSON・--input（'-' を含む）の明示指定を優先し、
+    指定がなければ標準入力にデータがある場合のみ入力ありとする。
+    """
+    if args.data or args.input:
+        return True
+    return stdin_has_data()
+
+def open_input(args: argparse.Namespace) -> IO[str]:
+    """入力ストリームを開く"""
+    if args.input and args.input != '-':
+        return open(args.input, encoding='utf-8')
+    return sys.stdin
+
+def load_json_input(args: argparse.Namespace) -> Dict[str, Any]:
+    """入力全体を1つのJSONオブジェクトとして読み込む"""
+    if args.data:
+        return json.loads(args.data)
+    stream = open_input(args)
+    try:
+        return json.load(stream)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def iter_ndjson(stream: IO[str]) -> Iterator[Any]:
+    """NDJSONを1行ずつ読み込む（空行は無視）"""
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+def iter_records(args: argparse.Namespace) -> Iterator[Any]:
+    """NDJSON入力のレコードを逐次返す"""
+    stream = open_input(args)
+    try:
+        yield from iter_ndjson(stream)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def record_text(record: Any) -> Optional[str]:
+    """NDJSONレコードから自由記述テキストを取り出す（文字列または {'text': ...}）"""
+    if isinstance(record, str):
+        return record
+    if isinstance(record, dict):
+        return record.get('text', record.get('freeText'))
+    return None
+
+def chunked(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """イテラブルを一定件数ずつのリストに分割"""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
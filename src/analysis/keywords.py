@@ -0,0 +1,114 @@
+"""
+キーワード頻度の集計エンジン
+文書ごとの頻度上位語をNumPyの一括演算で求め、語彙IDを添字とする整数配列に加算する
+（メモリ使用量は語彙数に比例し、テキスト数に依存しない）
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+from corpus import TokenizedCorpus, Vocabulary
+
+# 初出順の未設定値
+_UNSEEN = np.iinfo(np.int64).max
+
+def top_document_keywords(tokens: np.ndarray, offsets: np.ndarray, top_n: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+    """各文書の頻度上位 top_n 語を (語彙ID, 頻度) の配列で返す
+
+    文書順に連結し、文書内は頻度の降順・同頻度は文書内の初出順
+    （1文書ずつ辞書で数えて安定ソートした場合と同じ並び）。
+    """
+    tokens = np.asarray(tokens, dtype=np.int64)
+    if len(tokens) == 0 or top_n <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    lengths = np.diff(np.asarray(offsets, dtype=np.int64))
+    doc_index = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+    # (文書, 語) の組を1つの整数にまとめて数える
+    width = int(tokens.max()) + 1
+    codes, first, counts = np.unique(doc_index * width + tokens, return_index=True, return_counts=True)
+    docs = codes // width
+
+    order = np.lexsort((first, -counts, docs))
+    sorted_docs = docs[order]
+    # 文書内の順位（同じ文書の先頭からの位置）
+    rank = np.arange(len(order)) - np.searchsorted(sorted_docs, sorted_docs)
+    selected = order[rank < top_n]
+    return codes[selected] % width, counts[selected]
+
+class KeywordCounter:
+    """語彙IDごとの頻度と初出順（必要に応じて配列を拡張）"""
+
+    __slots__ = ('vocabulary', 'counts', 'first', 'position')
+
+    def __init__(self, vocabulary: Vocabulary, capacity: int = 1024):
+        self.vocabulary = vocabulary
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.first = np.full(capacity, _UNSEEN, dtype=np.int64)
+        # これまでに加算した件数（初出順の通し番号用）
+        self.position = 0
+
+    def _reserve(self, size: int) -> None:
+        """語彙ID size - 1 まで格納できるよう容量を倍々に拡張"""
+        capacity = len(self.counts)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        grown = len(self.counts)
+        self.counts = np.concatenate([self.counts, np.zeros(capacity - grown, dtype=np.int64)])
+        self.first = np.concatenate([self.first, np.full(capacity - grown, _UNSEEN, dtype=np.int64)])
+
+    def add(self, token_ids: np.ndarray, freqs: np.ndarray) -> None:
+        """(語彙ID, 頻度) を並び順に加算（初めて加算された順を同頻度の順位に使う）"""
+        token_ids = np.asarray(token_ids, dtype=np.int64)
+        if len(token_ids) == 0:
+            return
+        self._reserve(int(token_ids.max()) + 1)
+        np.add.at(self.counts, token_ids, freqs)
+        np.minimum.at(self.first, token_ids, self.position + np.arange(len(token_ids), dtype=np.int64))
+        self.position += len(token_ids)
+
+    def add_documents(self, corpus: TokenizedCorpus, top_n: int = 10) -> None:
+        """各文書の頻度上位 top_n 語の頻度を加算"""
+        if len(corpus.tokens) == 0:
+            return
+        tokens = np.frombuffer(corpus.tokens, dtype=np.uint32)
+        offsets = np.frombuffer(corpus.offsets, dtype=np.uint64)
+        self.add(*top_document_keywords(tokens, offsets, top_n))
+
+    def merge(self, other: 'KeywordCounter') -> None:
+        """別の集計（後続のテキストを処理したもの）を統合する
+
+        語彙は文字列で対応付けるため、別プロセスで集計した結果も統合できる。
+        """
+        ids = np.flatnonzero(other.counts)
+        if len(ids) > 0:
+            # 初出順に登録して、逐次処理と同じ順に語彙IDを割り当てる
+            ids = ids[np.argsort(other.first[ids])]
+            translation = np.array(
+                [self.vocabulary.intern(other.vocabulary.token(int(i))) for i in ids], dtype=np.int64
+            )
+            self._reserve(int(translation.max()) + 1)
+            np.add.at(self.counts, translation, other.counts[ids])
+            np.minimum.at(self.first, translation, other.first[ids] + self.position)
+        self.position += other.position
+
+    def __len__(self) -> int:
+        """頻度が1以上の語の数"""
+        return int(np.count_nonzero(self.counts))
+
+    def top(self, k: int = 20) -> List[Tuple[str, int]]:
+        """頻度上位k語（同頻度は初出順）を (語, 頻度) で返す"""
+        candidates = np.flatnonzero(self.counts)
+        if len(candidates) == 0 or k <= 0:
+            return []
+        counts = self.counts[candidates]
+        if len(candidates) > k:
+            # k番目の頻度以上の候補のみを並べ替える
+            threshold = np.partition(counts, len(counts) - k)[len(counts) - k]
+            keep = counts >= threshold
+            candidates, counts = candidates[keep], counts[keep]
+        order = np.lexsort((self.first[candidates], -counts))[:k]
+        return [(self.vocabulary.token(int(candidates[i])), int(counts[i])) for i in order]
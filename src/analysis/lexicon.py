@@ -0,0 +1,128 @@
+"""
+感情極性辞書マッチャー
+Aho–Corasick オートマトンで辞書中の全語を1パスで照合し、重み付きで感情スコアを算出
+"""
+
+import json
+import os
+import sys
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set
+
+# 既定の極性辞書（語 → 重み）
+POSITIVE_WORDS = ['良い', 'いい', '好き', '気に入った', '満足', '快適', '心地よい', '素晴らしい']
+NEGATIVE_WORDS = ['悪い', '嫌い', '不快', '気に入らない', '不満', 'うるさい', 'うっとうしい']
+DEFAULT_WEIGHT = 0.2
+
+DEFAULT_LEXICON: Dict[str, float] = {
+    **{word: DEFAULT_WEIGHT for word in POSITIVE_WORDS},
+    **{word: -DEFAULT_WEIGHT for word in NEGATIVE_WORDS},
+}
+
+# 辞書ファイルのパス（環境変数で変更可能）
+LEXICON_PATH = os.environ.get('SENTIMENT_LEXICON_PATH')
+
+def load_lexicon(path: str) -> Dict[str, float]:
+    """辞書ファイルを読み込む（JSON: {"語": 重み} または TSV: 語<TAB>重み）"""
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            return {str(word): float(weight) for word, weight in json.load(f).items()}
+
+        lexicon: Dict[str, float] = {}
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split('\t')
+            weight = float(fields[1]) if len(fields) > 1 else DEFAULT_WEIGHT
+            lexicon[fields[0]] = weight
+        return lexicon
+
+class LexiconMatcher:
+    """Aho–Corasick 法による多パターン照合器"""
+
+    def __init__(self, lexicon: Dict[str, float]):
+        self.words: List[str] = []
+        self.weights: List[float] = []
+        # 状態遷移・失敗遷移・出力（各状態で一致する語ID、なければ-1）
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[int] = [-1]
+        # 失敗遷移をたどって最初に出力を持つ状態（辞書サフィックスリンク）
+        self.output_link: List[int] = [-1]
+
+        for word, weight in lexicon.items():
+            if word:
+                self._add(word, weight)
+        self._build()
+
+    def _add(self, word: str, weight: float) -> None:
+        state = 0
+        for char in word:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(-1)
+                self.output_link.append(-1)
+            state = next_state
+        if self.output[state] == -1:
+            self.output[state] = len(self.words)
+            self.words.append(word)
+            self.weights.append(weight)
+        else:
+            self.weights[self.output[state]] = weight
+
+    def _build(self) -> None:
+        """幅優先で失敗遷移と辞書サフィックスリンクを構築"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                link = self.fail[next_state]
+                self.output_link[next_state] = link if self.output[link] != -1 else self.output_link[link]
+                queue.append(next_state)
+
+    def matches(self, text: str) -> Set[int]:
+        """テキスト中に出現する語IDの集合（1パス）"""
+        found: Set[int] = set()
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            match = state if self.output[state] != -1 else self.output_link[state]
+            while match > 0:
+                found.add(self.output[match])
+                match = self.output_link[match]
+        return found
+
+    def score(self, text: str) -> float:
+        """出現した語の重みの合計（各語1回まで、-1 to 1にクリップ）"""
+        score = 0.0
+        for word_id in sorted(self.matches(text)):
+            score += self.weights[word_id]
+        return max(-1.0, min(1.0, score))
+
+    def score_batch(self, texts: Iterable[str]) -> List[float]:
+        """複数テキストを一括でスコアリング"""
+        return [self.score(text) for text in texts]
+
+def build_default_matcher(path: Optional[str] = LEXICON_PATH) -> LexiconMatcher:
+    """設定された辞書ファイル（なければ既定の辞書）から照合器を構築"""
+    if path:
+        try:
+            return LexiconMatcher(load_lexicon(path))
+        except (OSError, ValueError) as e:
+            print(f"Warning: failed to load sentiment lexicon ({e}). Using default lexicon.", file=sys.stderr)
+    return LexiconMatcher(DEFAULT_LEXICON)
+
+# インポート時に一度だけ構築
+SENTIMENT_MATCHER = build_default_matcher()
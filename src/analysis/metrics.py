@@ -0,0 +1,158 @@
+"""
+分析処理の計測（任意で有効化）
+処理段階ごとの所要時間・件数・キャッシュ統計・ピークメモリを記録し、
+結果の 'metrics' キーに付加する（ANALYSIS_TRACE_PATH 指定時はNDJSONのトレースも出力）
+
+無効時は何も記録しない共有オブジェクトに差し替えるため、計測箇所のオーバーヘッドはほぼない。
+"""
+
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import nullcontext
+from typing import Any, ContextManager, Dict, IO, Optional
+
+# 環境変数による設定
+METRICS_ENABLED = os.environ.get('ANALYSIS_METRICS', '').lower() not in ('', '0', 'false', 'no')
+TRACE_PATH = os.environ.get('ANALYSIS_TRACE_PATH')
+
+def peak_rss_mb() -> float:
+    """このプロセスのピーク常駐メモリ（MB、Linux は KB 単位・macOS はバイト単位で返る）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class _Stage:
+    """1つの処理段階の計測（with 文で使用）"""
+
+    __slots__ = ('recorder', 'name', 'start')
+
+    def __init__(self, recorder: 'Recorder', name: str):
+        self.recorder = recorder
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> '_Stage':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.recorder.add_time(self.name, time.perf_counter() - self.start)
+
+class Recorder:
+    """処理段階の所要時間・件数・任意の値を記録"""
+
+    enabled = True
+
+    def __init__(self, trace_path: Optional[str] = TRACE_PATH):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counts: Dict[str, int] = {}
+        self.values: Dict[str, Any] = {}
+        self.trace: Optional[IO[str]] = None
+        if trace_path:
+            try:
+                self.trace = open(trace_path, 'a', encoding='utf-8', buffering=1)
+            except OSError as e:
+                print(f"Warning: failed to open trace file ({e}).", file=sys.stderr)
+
+    def stage(self, name: str) -> ContextManager:
+        return _Stage(self, name)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = {'seconds': 0.0, 'calls': 0}
+        entry['seconds'] += seconds
+        entry['calls'] += 1
+        self.emit('stage', name=name, seconds=seconds)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def record(self, name: str, value: Any) -> None:
+        self.values[name] = value
+
+    def emit(self, event: str, **fields: Any) -> None:
+        """トレースイベントを1行のJSONとして書き出す"""
+        if self.trace is None:
+            return
+        fields.update({'event': event, 'ts': time.time(), 'pid': os.getpid(), 'script': _script_name()})
+        self.trace.write(json.dumps(fields, ensure_ascii=False) + '\n')
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'wall_seconds': time.perf_counter() - self.started,
+            'stages': self.stages,
+            'counts': self.counts,
+            'peak_rss_mb': peak_rss_mb(),
+            **self.values,
+        }
+
+    def close(self) -> None:
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+
+class NullRecorder:
+    """無効時の計測（全ての操作が何もしない）"""
+
+    enabled = False
+    _stage = nullcontext()
+
+    def stage(self, name: str) -> ContextManager:
+        return self._stage
+
+    def count(self, name: str, n: int = 1) -> None:
+        pass
+
+    def record(self, name: str, value: Any) -> None:
+        pass
+
+    def emit(self, event: str, **fields: Any) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+NULL_RECORDER = NullRecorder()
+_recorder: Any = NULL_RECORDER
+
+def _script_name() -> str:
+    return os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else 'python'
+
+def begin(enabled: Optional[bool] = None, trace_path: Optional[str] = None) -> None:
+    """計測を開始（enabled=None なら環境変数の設定に従い、トレース出力のみの指定でも有効）"""
+    global _recorder
+    _recorder.close()
+    trace_path = trace_path or TRACE_PATH
+    if enabled is None:
+        enabled = METRICS_ENABLED or bool(trace_path)
+    _recorder = Recorder(trace_path) if enabled else NULL_RECORDER
+
+def is_enabled() -> bool:
+    return _recorder.enabled
+
+def stage(name: str) -> ContextManager:
+    """処理段階の所要時間を計測するコンテキスト"""
+    return _recorder.stage(name)
+
+def count(name: str, n: int = 1) -> None:
+    """件数を加算"""
+    _recorder.count(name, n)
+
+def record(name: str, value: Any) -> None:
+    """任意の値（キャッシュ統計など）を記録"""
+    _recorder.record(name, value)
+
+def attach(result: Dict[str, Any]) -> Dict[str, Any]:
+    """有効時は計測結果を 'metrics' キーに加えた結果を返し、トレースに集計を書き出す
+
+    キャッシュされた結果を変更しないよう、result 自体には書き込まない。
+    """
+    if not _recorder.enabled:
+        return result
+    snapshot = _recorder.snapshot()
+    _recorder.emit('summary', **snapshot)
+    return {**result, 'metrics': snapshot}
@@ -3,99 +3,130 @@ NLP分析パイプライン
 日本語の自由記述テキストを分析
 """
 
+import heapq
 import json
 import sys
-from typing import List, Dict, Any
-import re
+import os
+from operator import itemgetter
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+from input_stream import build_parser, chunked, has_input, iter_records, load_json_input, record_text
+from lexicon import SENTIMENT_MATCHER
+import metrics
+from parallel import ordered_parallel_map, resolve_workers
+from segmenter import STOPWORDS, segment
+
+# 並列処理時に1プロセスへ渡すテキスト数
+PARALLEL_CHUNK_SIZE = int(os.environ.get('NLP_STREAM_CHUNK_SIZE', '1000'))
 
 # 簡易版の形態素解析（実際の実装ではMeCabを使用）
 def simple_tokenize(text: str) -> List[str]:
-    """簡易的な形態素解析（スペース・句読点で分割）"""
-    # 日本語の句読点で分割
-    text = re.sub(r'[。、！？]', ' ', text)
-    # スペースで分割
-    tokens = text.split()
-    return [t for t in tokens if len(t) > 1]
+    """簡易的な形態素解析（漢字・カタカナ・英数字などの文字種の境界で分割）"""
+    return segment(text)
 
 def extract_keywords(text: str, top_n: int = 10) -> List[str]:
     """キーワード抽出（簡易版）"""
     tokens = simple_tokenize(text)
     
-    # ストップワード
-    stopwords = {'の', 'に', 'は', 'を', 'が', 'で', 'と', 'も', 'など', 'こと', 'ため'}
-    
-    # 頻度カウント
+    # 頻度カウント（ストップワードはMeCab使用時と共通）
     word_freq: Dict[str, int] = {}
     for token in tokens:
-        if token not in stopwords:
+        if token not in STOPWORDS:
             word_freq[token] = word_freq.get(token, 0) + 1
     
-    # 頻度順にソート
-    sorted_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
+    # 頻度上位のみ選択（同頻度は初出順）
+    top_words = heapq.nlargest(top_n, word_freq.items(), key=itemgetter(1))
     
-    return [word for word, freq in sorted_words[:top_n]]
+    return [word for word, freq in top_words]
 
 def analyze_sentiment(text: str) -> float:
-    """感情分析（簡易版：-1 to 1）"""
-    positive_words = ['良い', 'いい', '好き', '気に入った', '満足', '快適', '心地よい', '素晴らしい']
-    negative_words = ['悪い', '嫌い', '不快', '気に入らない', '不満', 'うるさい', 'うっとうしい']
-    
-    text_lower = text.lower()
-    score = 0.0
+    """感情分析（簡易版：-1 to 1、極性辞書を1パスで照合）"""
+    return SENTIMENT_MATCHER.score(text)
+
+def analyze_sentiment_batch(texts: Iterable[str]) -> List[float]:
+    """複数テキストの一括感情分析"""
+    return SENTIMENT_MATCHER.score_batch(texts)
+
+def _analyze_chunk(texts: List[Optional[str]]) -> Tuple[List[Tuple[str, int]], List[float]]:
+    """チャンク単位の部分集計（キーワード頻度は出現順、感情スコアは入力順）"""
+    keyword_counts: Dict[str, int] = {}
+    valid_texts = [text for text in texts if text and len(text.strip()) > 0]
     
-    for word in positive_words:
-        if word in text:
-            score += 0.2
+    # キーワード抽出
+    with metrics.stage('keywords'):
+        for text in valid_texts:
+            for keyword in extract_keywords(text):
+                keyword_counts[keyword] = keyword_counts.get(keyword, 0) + 1
     
-    for word in negative_words:
-        if word in text:
-            score -= 0.2
+    # 感情分析
+    with metrics.stage('sentiment'):
+        sentiments = analyze_sentiment_batch(valid_texts)
     
-    return max(-1.0, min(1.0, score))
+    return list(keyword_counts.items()), sentiments
 
-def analyze_free_texts(free_texts: List[str]) -> Dict[str, Any]:
-    """自由記述テキストの一括分析"""
+def analyze_free_texts(free_texts: Iterable[str], workers: Optional[int] = None) -> Dict[str, Any]:
+    """自由記述テキストの一括分析（テキストを逐次処理）
+    
+    workers: 並列ワーカー数（1で逐次、0以下でCPUコア数）。結果は逐次処理と一致する
+    """
     all_keywords: Dict[str, int] = {}
     sentiments: List[float] = []
+    total_count = 0
     
-    for text in free_texts:
-        if not text or len(text.strip()) == 0:
-            continue
-        
-        # キーワード抽出
-        keywords = extract_keywords(text)
-        for keyword in keywords:
-            all_keywords[keyword] = all_keywords.get(keyword, 0) + 1
-        
-        # 感情分析
-        sentiment = analyze_sentiment(text)
-        sentiments.append(sentiment)
+    workers = resolve_workers(workers)
+    if workers > 1:
+        # チャンクごとに並列集計し、入力順に統合（マップ・リデュース）
+        partials = ordered_parallel_map(_analyze_chunk, chunked(free_texts, PARALLEL_CHUNK_SIZE), workers)
+    else:
+        partials = ((chunk, _analyze_chunk(chunk)) for chunk in chunked(free_texts, PARALLEL_CHUNK_SIZE))
+    
+    for chunk, (keyword_counts, chunk_sentiments) in partials:
+        metrics.count('chunks')
+        total_count += len(chunk)
+        for keyword, freq in keyword_counts:
+            all_keywords[keyword] = all_keywords.get(keyword, 0) + freq
+        sentiments.extend(chunk_sentiments)
     
     # 平均感情スコア
     avg_sentiment = sum(sentiments) / len(sentiments) if sentiments else 0.0
     
     # トップキーワード
-    top_keywords = sorted(all_keywords.items(), key=lambda x: x[1], reverse=True)[:20]
+    with metrics.stage('rank_keywords'):
+        top_keywords = heapq.nlargest(20, all_keywords.items(), key=itemgetter(1))
+    metrics.count('texts', total_count)
+    metrics.count('analyzed_texts', len(sentiments))
     
     return {
         'keywords': [{'word': word, 'frequency': freq} for word, freq in top_keywords],
         'average_sentiment': avg_sentiment,
-        'total_texts': len(free_texts),
+        'total_texts': total_count,
         'analyzed_texts': len(sentiments),
     }
 
 def main():
     """メイン処理"""
-    if len(sys.argv) < 2:
+    parser = build_parser('NLP分析')
+    parser.add_argument('--workers', type=int, help='並列ワーカー数（0でCPUコア数）')
+    parser.add_argument('--metrics', action='store_true', help='処理段階ごとの計測結果を含める')
+    parser.add_argument('--trace', help='計測イベントをNDJSONで追記するファイル')
+    args = parser.parse_args()
+    metrics.begin(enabled=True if args.metrics else None, trace_path=args.trace)
+    if not has_input(args):
         print(json.dumps({'error': 'No input data'}))
         sys.exit(1)
     
     try:
-        input_data = json.loads(sys.argv[1])
-        free_texts = input_data.get('free_texts', [])
+        if args.ndjson:
+            # NDJSON: 1行1レコードを逐次処理
+            free_texts = (record_text(record) for record in iter_records(args))
+        else:
+            input_data = load_json_input(args)
+            free_texts = input_data.get('free_texts', [])
+            if args.workers is None:
+                args.workers = input_data.get('workers')
         
-        result = analyze_free_texts(free_texts)
-        print(json.dumps(result, ensure_ascii=False))
+        result = analyze_free_texts(free_texts, workers=args.workers)
+        print(json.dumps(metrics.attach(result), ensure_ascii=False))
     except Exception as e:
         print(json.dumps({'error': str(e)}))
         sys.exit(1)
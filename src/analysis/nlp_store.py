@@ -0,0 +1,254 @@
+"""
+NLP分析結果の永続ストア
+評価IDと本文ハッシュごとにテキスト単位の分析結果を保持し、
+キーワード・共起・感情スコアの累積値を差分更新する（SQLite）
+
+同頻度の並び順は全件解析と同じく初出順とするため、テキストの並び順（ordinal）と
+テキスト内の順位から作る初出キー（first_key）の最小値を累積値と一緒に保持する
+"""
+
+import hashlib
+import json
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# ストアの形式（テーブル構成を変えたら上げる、PRAGMA user_version に保存）
+STORE_FORMAT = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS texts (
+    evaluation_id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    ordinal TEXT NOT NULL,
+    sentiment REAL NOT NULL,
+    keywords TEXT NOT NULL,
+    cooccurrences TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS keyword_totals (
+    word TEXT PRIMARY KEY,
+    frequency INTEGER NOT NULL,
+    first_key TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cooccurrence_totals (
+    word1 TEXT NOT NULL,
+    word2 TEXT NOT NULL,
+    frequency INTEGER NOT NULL,
+    first_key TEXT NOT NULL,
+    PRIMARY KEY (word1, word2)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+def content_hash(text: str) -> str:
+    """本文のハッシュ値"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def text_ordinal(position: int) -> str:
+    """テキストの並び順（文字列の大小が数値の大小と一致するよう桁を揃える）"""
+    return f'{position:016d}'
+
+def first_key(ordinal: str, rank: int) -> str:
+    """テキストの並び順とテキスト内の順位から作る初出キー"""
+    return f'{ordinal}:{rank:06d}'
+
+# 初出キーを texts から作り直すSQL（削除・並び順の変更後）
+REBUILD_FIRST_KEYS = ("""
+WITH firsts AS (
+    SELECT json_extract(j.value, '$[0]') AS word,
+           MIN(t.ordinal || ':' || printf('%06d', j.key)) AS first_key
+    FROM texts t, json_each(t.keywords) j GROUP BY 1
+)
+UPDATE keyword_totals SET first_key = firsts.first_key
+FROM firsts WHERE firsts.word = keyword_totals.word
+""", """
+WITH firsts AS (
+    SELECT json_extract(j.value, '$[0]') AS word1, json_extract(j.value, '$[1]') AS word2,
+           MIN(t.ordinal || ':' || printf('%06d', j.key)) AS first_key
+    FROM texts t, json_each(t.cooccurrences) j GROUP BY 1, 2
+)
+UPDATE cooccurrence_totals SET first_key = firsts.first_key
+FROM firsts WHERE firsts.word1 = cooccurrence_totals.word1 AND firsts.word2 = cooccurrence_totals.word2
+""")
+
+class TextResult:
+    """1テキスト分の分析結果（累積値への寄与分）"""
+
+    __slots__ = ('evaluation_id', 'content_hash', 'ordinal', 'sentiment', 'keywords', 'cooccurrences')
+
+    def __init__(
+        self,
+        evaluation_id: str,
+        content_hash: str,
+        ordinal: str,
+        sentiment: float,
+        keywords: List[Tuple[str, int]],
+        cooccurrences: List[Tuple[str, str, int]],
+    ):
+        self.evaluation_id = evaluation_id
+        self.content_hash = content_hash
+        self.ordinal = ordinal
+        self.sentiment = sentiment
+        self.keywords = keywords
+        self.cooccurrences = cooccurrences
+
+class NLPResultStore:
+    """評価IDをキーとしたNLP分析結果ストア"""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        if self.conn.execute('PRAGMA user_version').fetchone()[0] != STORE_FORMAT:
+            # 形式が古いストアは作り直す（次回の解析で全件を再集計する）
+            self.conn.executescript(
+                'DROP TABLE IF EXISTS texts; DROP TABLE IF EXISTS keyword_totals; '
+                'DROP TABLE IF EXISTS cooccurrence_totals; DROP TABLE IF EXISTS meta;'
+            )
+            self.conn.execute(f'PRAGMA user_version = {STORE_FORMAT}')
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> 'NLPResultStore':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        self.conn.execute(
+            'INSERT INTO meta (key, value) VALUES (?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+            (key, value),
+        )
+
+    def reset(self) -> None:
+        """全ての分析結果と累積値を削除"""
+        self.conn.executescript(
+            'DELETE FROM texts; DELETE FROM keyword_totals; '
+            'DELETE FROM cooccurrence_totals; DELETE FROM meta;'
+        )
+
+    def delete_meta(self, key: str) -> None:
+        self.conn.execute('DELETE FROM meta WHERE key = ?', (key,))
+
+    def stored_texts(self) -> Dict[str, Tuple[str, str]]:
+        """保存済みの評価ID → (本文ハッシュ, 並び順)"""
+        return {
+            evaluation_id: (digest, ordinal)
+            for evaluation_id, digest, ordinal in self.conn.execute(
+                'SELECT evaluation_id, content_hash, ordinal FROM texts'
+            )
+        }
+
+    def text_count(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM texts').fetchone()[0]
+
+    def set_ordinals(self, ordinals: Iterable[Tuple[str, str]]) -> None:
+        """保存済みテキストの並び順を (評価ID, 並び順) で更新し、初出キーを作り直す"""
+        self.conn.executemany(
+            'UPDATE texts SET ordinal = ? WHERE evaluation_id = ?',
+            [(ordinal, evaluation_id) for evaluation_id, ordinal in ordinals],
+        )
+        self._rebuild_first_keys()
+
+    def _rebuild_first_keys(self) -> None:
+        # executescript は途中でコミットするため、1文ずつ同じトランザクションで実行する
+        for statement in REBUILD_FIRST_KEYS:
+            self.conn.execute(statement)
+
+    def remove(self, evaluation_ids: Iterable[str]) -> int:
+        """テキスト単位の結果を削除し、累積値から寄与分を差し引く（削除した件数を返す）"""
+        removed = 0
+        for evaluation_id in evaluation_ids:
+            row = self.conn.execute(
+                'SELECT keywords, cooccurrences FROM texts WHERE evaluation_id = ?',
+                (evaluation_id,),
+            ).fetchone()
+            if row is None:
+                continue
+            keywords = json.loads(row[0])
+            cooccurrences = json.loads(row[1])
+            self.conn.executemany(
+                'UPDATE keyword_totals SET frequency = frequency - ? WHERE word = ?',
+                [(freq, word) for word, freq in keywords],
+            )
+            self.conn.executemany(
+                'UPDATE cooccurrence_totals SET frequency = frequency - ? '
+                'WHERE word1 = ? AND word2 = ?',
+                [(freq, word1, word2) for word1, word2, freq in cooccurrences],
+            )
+            self.conn.execute('DELETE FROM texts WHERE evaluation_id = ?', (evaluation_id,))
+            removed += 1
+        if removed:
+            self.conn.execute('DELETE FROM keyword_totals WHERE frequency <= 0')
+            self.conn.execute('DELETE FROM cooccurrence_totals WHERE frequency <= 0')
+            # 削除したテキストが初出だった語の初出キーを残りのテキストから求め直す
+            self._rebuild_first_keys()
+        return removed
+
+    def add(self, results: Iterable[TextResult]) -> None:
+        """テキスト単位の結果を保存し、累積値に加算する"""
+        for result in results:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO texts '
+                '(evaluation_id, content_hash, ordinal, sentiment, keywords, cooccurrences) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (
+                    result.evaluation_id,
+                    result.content_hash,
+                    result.ordinal,
+                    result.sentiment,
+                    json.dumps(result.keywords, ensure_ascii=False),
+                    json.dumps(result.cooccurrences, ensure_ascii=False),
+                ),
+            )
+            self.conn.executemany(
+                'INSERT INTO keyword_totals (word, frequency, first_key) VALUES (?, ?, ?) '
+                'ON CONFLICT(word) DO UPDATE SET frequency = frequency + excluded.frequency, '
+                'first_key = MIN(first_key, excluded.first_key)',
+                [
+                    (word, freq, first_key(result.ordinal, rank))
+                    for rank, (word, freq) in enumerate(result.keywords)
+                ],
+            )
+            self.conn.executemany(
+                'INSERT INTO cooccurrence_totals (word1, word2, frequency, first_key) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(word1, word2) DO UPDATE SET '
+                'frequency = frequency + excluded.frequency, '
+                'first_key = MIN(first_key, excluded.first_key)',
+                [
+                    (word1, word2, freq, first_key(result.ordinal, rank))
+                    for rank, (word1, word2, freq) in enumerate(result.cooccurrences)
+                ],
+            )
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def top_keywords(self, limit: int = 20) -> List[Tuple[str, int]]:
+        """累積頻度上位のキーワード（同頻度は初出順）"""
+        return self.conn.execute(
+            'SELECT word, frequency FROM keyword_totals '
+            'ORDER BY frequency DESC, first_key LIMIT ?',
+            (limit,),
+        ).fetchall()
+
+    def top_cooccurrences(self, limit: int = 20) -> List[Tuple[str, str, int]]:
+        """累積頻度上位の共起ペア（同頻度は初出順）"""
+        return self.conn.execute(
+            'SELECT word1, word2, frequency FROM cooccurrence_totals '
+            'ORDER BY frequency DESC, first_key LIMIT ?',
+            (limit,),
+        ).fetchall()
+
+    def sentiment_summary(self) -> Tuple[float, int]:
+        """感情スコアの合計と件数"""
+        total, count = self.conn.execute('SELECT SUM(sentiment), COUNT(*) FROM texts').fetchone()
+        return (total or 0.0, count)
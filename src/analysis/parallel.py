@@ -0,0 +1,46 @@
+"""
+並列処理ユーティリティ
+チャンク単位の処理をプロセスプールで実行し、入力順に結果を返す
+"""
+
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Deque, Iterable, Iterator, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+# 並列ワーカー数の既定値（1なら逐次処理）
+DEFAULT_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', '1'))
+
+def resolve_workers(workers: Optional[int]) -> int:
+    """ワーカー数を決定（0以下はCPUコア数）"""
+    if workers is None:
+        workers = DEFAULT_WORKERS
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+def ordered_parallel_map(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    workers: int,
+    initializer: Optional[Callable[..., None]] = None,
+    initargs: Tuple[Any, ...] = (),
+) -> Iterator[Tuple[T, R]]:
+    """プロセスプールで func を適用し、入力順に (入力, 結果) を返す
+
+    同時に投入するタスクはワーカー数の2倍までに制限し、
+    ストリーム入力でもメモリ使用量が件数に比例しないようにする。
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        in_flight: Deque[Tuple[T, Future]] = deque()
+        for item in items:
+            in_flight.append((item, executor.submit(func, item)))
+            if len(in_flight) >= workers * 2:
+                item, future = in_flight.popleft()
+                yield item, future.result()
+        while in_flight:
+            item, future = in_flight.popleft()
+            yield item, future.result()
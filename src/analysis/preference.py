@@ -0,0 +1,358 @@
+"""
+音源の選好度推定（Bradley–Terry モデル）
+BestWorstComparison の「最良 > 最悪」を1回の対比較とみなし、
+音源ごとの効用（対数強度）を MM アルゴリズムで推定する
+
+対比較は音源数 × 音源数の勝敗数の行列に集約してから推定するため、
+1回の反復の計算量は比較数によらず音源数の2乗になる。
+セグメント（年齢グループ・EV保有など）ごとの推定は並列に実行でき、
+前回の推定値から反復を始めることで回答が追加されたときの再推定を短縮する。
+"""
+
+import json
+import os
+import sys
+from contextlib import closing
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from analysis_cache import AnalysisCache
+from evaluation_db import DB_PATH, FETCH_BATCH_SIZE, DateLike, connect, to_timestamp_ms
+from input_stream import build_parser, has_input, load_json_input
+import metrics
+from parallel import ordered_parallel_map, resolve_workers
+
+# 全ての音源の組に加える仮想的な勝ち数（比較のない音源・全勝/全敗の音源でも推定値を有限にする）
+PREFERENCE_PRIOR = float(os.environ.get('PREFERENCE_PRIOR', '0.1'))
+# MM アルゴリズムの収束判定（対数強度の最大変化量）と最大反復数
+PREFERENCE_TOL = 1e-8
+PREFERENCE_MAX_ITER = 10000
+
+# セグメントに使える回答者の列（キー → SQL式）
+SEGMENT_COLUMNS = {
+    'ageGroup': 'r.ageGroup',
+    'gender': 'r.gender',
+    'evOwnership': 'r.evOwnership',
+    'experimentGroup': 'r.experimentGroup',
+}
+
+# 前回の推定値（セグメント → 音源ID → 効用）。回答が追加されたときの初期値に使う
+STATE_VERSION = 'bradley-terry-1'
+state_cache = AnalysisCache('preference_model', STATE_VERSION, max_entries=256)
+
+class Comparisons:
+    """対比較（勝者・敗者の音源コード）とセグメント列"""
+
+    def __init__(
+        self,
+        item_ids: List[str],
+        item_names: List[str],
+        winners: np.ndarray,
+        losers: np.ndarray,
+        segments: Dict[str, Tuple[np.ndarray, List[Any]]],
+    ):
+        self.item_ids = item_ids
+        self.item_names = item_names
+        self.winners = winners
+        self.losers = losers
+        self.segments = segments
+
+    def __len__(self) -> int:
+        return len(self.winners)
+
+def load_comparisons(
+    db_path: str = DB_PATH,
+    date_from: Optional[DateLike] = None,
+    date_to: Optional[DateLike] = None,
+    batch_size: int = FETCH_BATCH_SIZE,
+) -> Comparisons:
+    """BestWorstComparison を対比較として読み込む（音源は AudioSample の全件）"""
+    conditions: List[str] = []
+    params: List[Any] = []
+    if date_from is not None:
+        conditions.append('b.createdAt >= ?')
+        params.append(to_timestamp_ms(date_from))
+    if date_to is not None:
+        conditions.append('b.createdAt <= ?')
+        params.append(to_timestamp_ms(date_to))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    segment_keys = list(SEGMENT_COLUMNS)
+
+    with closing(connect(db_path)) as conn:
+        items = conn.execute('SELECT id, name FROM AudioSample ORDER BY rowid').fetchall()
+        index = {item_id: i for i, (item_id, _) in enumerate(items)}
+        cursor = conn.execute(
+            f"SELECT b.bestAudioId, b.worstAudioId, {', '.join(SEGMENT_COLUMNS.values())} "
+            f'FROM BestWorstComparison b JOIN Respondent r ON r.id = b.respondentId {where} ORDER BY b.rowid',
+            params,
+        )
+        winners: List[int] = []
+        losers: List[int] = []
+        segment_codes: List[List[int]] = [[] for _ in segment_keys]
+        segment_levels: List[Dict[Any, int]] = [{} for _ in segment_keys]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for best, worst, *segment_values in rows:
+                # 同じ音源同士・存在しない音源の比較は除外
+                if best == worst or best not in index or worst not in index:
+                    continue
+                winners.append(index[best])
+                losers.append(index[worst])
+                for codes, levels, value in zip(segment_codes, segment_levels, segment_values):
+                    codes.append(levels.setdefault(value, len(levels)))
+
+    return Comparisons(
+        item_ids=[item_id for item_id, _ in items],
+        item_names=[name for _, name in items],
+        winners=np.asarray(winners, dtype=np.int64),
+        losers=np.asarray(losers, dtype=np.int64),
+        segments={
+            key: (np.asarray(codes, dtype=np.int64), list(levels))
+            for key, codes, levels in zip(segment_keys, segment_codes, segment_levels)
+        },
+    )
+
+def comparisons_from_records(records: Sequence[Dict[str, Any]]) -> Comparisons:
+    """{'bestAudioId', 'worstAudioId', 'ageGroup', ...} のリストから対比較を作る（音源は出現順）"""
+    index: Dict[str, int] = {}
+    winners: List[int] = []
+    losers: List[int] = []
+    segments: Dict[str, Tuple[List[int], Dict[Any, int]]] = {key: ([], {}) for key in SEGMENT_COLUMNS}
+    for record in records:
+        best, worst = record['bestAudioId'], record['worstAudioId']
+        if best == worst:
+            continue
+        winners.append(index.setdefault(best, len(index)))
+        losers.append(index.setdefault(worst, len(index)))
+        for key, (codes, levels) in segments.items():
+            codes.append(levels.setdefault(record.get(key), len(levels)))
+    names = {record['bestAudioId']: record.get('bestAudioName') for record in records}
+    names.update({record['worstAudioId']: record.get('worstAudioName') for record in records})
+    return Comparisons(
+        item_ids=list(index),
+        item_names=[names.get(item_id) or item_id for item_id in index],
+        winners=np.asarray(winners, dtype=np.int64),
+        losers=np.asarray(losers, dtype=np.int64),
+        segments={key: (np.asarray(codes, dtype=np.int64), list(levels)) for key, (codes, levels) in segments.items()},
+    )
+
+def win_matrices(comparisons: Comparisons, segment_by: Optional[str] = None) -> Tuple[np.ndarray, List[Any]]:
+    """セグメントごとの勝敗数の行列（[セグメント, 勝者, 敗者]）を bincount 1回で求める"""
+    n = len(comparisons.item_ids)
+    if segment_by is None:
+        codes, levels = np.zeros(len(comparisons), dtype=np.int64), [None]
+    elif segment_by in comparisons.segments:
+        codes, levels = comparisons.segments[segment_by]
+    else:
+        raise ValueError(f'Unknown segment: {segment_by}')
+    flat = (codes * n + comparisons.winners) * n + comparisons.losers
+    wins = np.bincount(flat, minlength=len(levels) * n * n).astype(np.float64)
+    return wins.reshape(len(levels), n, n), levels
+
+def fit_bradley_terry(
+    wins: np.ndarray,
+    initial: Optional[np.ndarray] = None,
+    prior: float = PREFERENCE_PRIOR,
+    tol: float = PREFERENCE_TOL,
+    max_iter: int = PREFERENCE_MAX_ITER,
+) -> Dict[str, Any]:
+    """勝敗数の行列（wins[i, j] = i が j に勝った回数）から Bradley–Terry モデルを推定
+
+    MM アルゴリズム（Hunter, 2004）: p_i ← W_i / Σ_j n_ij / (p_i + p_j)
+    効用は対数強度を平均0に中心化した値。標準誤差はフィッシャー情報量の擬似逆行列から求める。
+    """
+    n = wins.shape[0]
+    observed = wins
+    if prior > 0:
+        wins = wins + prior * (1.0 - np.eye(n))
+    totals = wins + wins.T
+    total_wins = wins.sum(axis=1)
+
+    log_strength = np.zeros(n) if initial is None else np.asarray(initial, dtype=np.float64) - np.mean(initial)
+    strength = np.exp(log_strength)
+    converged = n < 2
+    n_iter = 0
+    while not converged and n_iter < max_iter:
+        n_iter += 1
+        denominator = (totals / (strength[:, None] + strength[None, :])).sum(axis=1)
+        # 仮想的な勝ち数がない場合、勝ち・比較のない音源の強度は下限に張り付く
+        tiny = np.finfo(np.float64).tiny
+        updated = np.log(np.maximum(total_wins, tiny)) - np.log(np.maximum(denominator, tiny))
+        updated -= updated.mean()
+        converged = bool(np.max(np.abs(updated - log_strength)) < tol)
+        log_strength = updated
+        strength = np.exp(log_strength)
+
+    # 勝率の行列 P[i, j] = p_i / (p_i + p_j)
+    probability = strength[:, None] / (strength[:, None] + strength[None, :])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_likelihood = float(np.nansum(observed * np.log(probability)))
+    weight = totals * probability * probability.T
+    information = np.diag(weight.sum(axis=1)) - weight
+    covariance = np.linalg.pinv(information)
+    return {
+        'utility': log_strength,
+        'share': strength / strength.sum(),
+        'standard_error': np.sqrt(np.maximum(np.diag(covariance), 0.0)),
+        'win_probability': probability,
+        'log_likelihood': log_likelihood,
+        'n_iter': n_iter,
+        'converged': converged,
+    }
+
+def _fit_task(task: Tuple[Tuple[Optional[str], Any], np.ndarray, Optional[np.ndarray], float]) -> Dict[str, Any]:
+    """1セグメント分の推定（プロセスプールから呼ばれる）"""
+    _, wins, initial, prior = task
+    return fit_bradley_terry(wins, initial, prior)
+
+def _state_key(segment_by: Optional[str], segment: Any) -> str:
+    return f'{segment_by}\0{json.dumps(segment, ensure_ascii=False)}'
+
+def _initial_utility(item_ids: List[str], state: Optional[Dict[str, float]]) -> Optional[np.ndarray]:
+    """前回の推定値を今回の音源順に並べる（前回になかった音源は0）"""
+    if not state:
+        return None
+    return np.array([state.get(item_id, 0.0) for item_id in item_ids])
+
+def perform_preference_analysis(
+    comparisons: Comparisons,
+    segment_by: Sequence[str] = (),
+    prior: float = PREFERENCE_PRIOR,
+    warm_start: bool = True,
+    workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """全体と各セグメントの Bradley–Terry モデルを推定して音源ごとの効用を返す"""
+    tasks = []
+    with metrics.stage('matrix'):
+        for key in [None, *segment_by]:
+            matrices, levels = win_matrices(comparisons, key)
+            for segment, wins in zip(levels, matrices):
+                state = state_cache.get(_state_key(key, segment)) if warm_start else None
+                tasks.append(((key, segment), wins, _initial_utility(comparisons.item_ids, state), prior))
+
+    workers = resolve_workers(workers)
+    with metrics.stage('fit'):
+        if workers > 1 and len(tasks) > 1:
+            fitted = list(ordered_parallel_map(_fit_task, tasks, workers))
+        else:
+            fitted = [(task, _fit_task(task)) for task in tasks]
+    metrics.count('models', len(tasks))
+
+    models = []
+    for ((key, segment), wins, initial, _), model in fitted:
+        state_cache.put(_state_key(key, segment), dict(zip(comparisons.item_ids, model['utility'].tolist())))
+        ranking = np.argsort(-model['utility'], kind='stable')
+        models.append({
+            'segment_by': key,
+            'segment': segment,
+            'n_comparisons': int(wins.sum()),
+            'items': [
+                {
+                    'id': comparisons.item_ids[i],
+                    'name': comparisons.item_names[i],
+                    'utility': float(model['utility'][i]),
+                    'share': float(model['share'][i]),
+                    'standard_error': float(model['standard_error'][i]),
+                    'wins': int(wins[i].sum()),
+                    'losses': int(wins[:, i].sum()),
+                }
+                for i in ranking
+            ],
+            'log_likelihood': model['log_likelihood'],
+            'n_iter': model['n_iter'],
+            'converged': model['converged'],
+            'warm_start': initial is not None,
+        })
+    state_cache.flush()
+
+    overall = models[0]
+    return {
+        'items': overall['items'],
+        'n_comparisons': len(comparisons),
+        'win_probability': fitted[0][1]['win_probability'].tolist(),
+        'item_ids': comparisons.item_ids,
+        'segments': models[1:],
+        'model': {
+            'prior': prior,
+            'log_likelihood': overall['log_likelihood'],
+            'n_iter': overall['n_iter'],
+            'converged': overall['converged'],
+            'warm_start': overall['warm_start'],
+        },
+    }
+
+def perform_preference_from_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """パラメータ（db または comparisons、segment_by・prior・warm_start・workers）から推定"""
+    try:
+        with metrics.stage('load'):
+            if params.get('db'):
+                filters = params.get('filters') or {}
+                comparisons = load_comparisons(
+                    params['db'],
+                    date_from=filters.get('dateFrom') or None,
+                    date_to=filters.get('dateTo') or None,
+                )
+            else:
+                comparisons = comparisons_from_records(params.get('comparisons', []))
+        metrics.count('comparisons', len(comparisons))
+        if len(comparisons.item_ids) == 0:
+            return {'items': [], 'segments': [], 'n_comparisons': 0}
+        return perform_preference_analysis(
+            comparisons,
+            segment_by=list(params.get('segment_by') or []),
+            prior=float(params.get('prior', PREFERENCE_PRIOR)),
+            warm_start=params.get('warm_start', True),
+            workers=params.get('workers'),
+        )
+    except Exception as e:
+        return {
+            'items': [],
+            'segments': [],
+            'error': str(e),
+        }
+
+def main():
+    """メイン処理"""
+    parser = build_parser('音源の選好度推定（Bradley–Terry）')
+    parser.add_argument('--db', help='BestWorstComparison を直接読み込むSQLiteデータベースのパス')
+    parser.add_argument('--date-from', help='回答日時の下限（ISO 8601、--db 使用時）')
+    parser.add_argument('--date-to', help='回答日時の上限（ISO 8601、--db 使用時）')
+    parser.add_argument('--segment-by', help=f"セグメント別に推定する列（{','.join(SEGMENT_COLUMNS)} のカンマ区切り）")
+    parser.add_argument('--prior', type=float, help=f'音源の組ごとの仮想的な勝ち数（既定: {PREFERENCE_PRIOR}）')
+    parser.add_argument('--no-warm-start', action='store_true', help='前回の推定値を初期値に使わない')
+    parser.add_argument('--workers', type=int, help='セグメント別推定の並列ワーカー数（0でCPUコア数）')
+    parser.add_argument('--metrics', action='store_true', help='処理段階ごとの計測結果を含める')
+    parser.add_argument('--trace', help='計測イベントをNDJSONで追記するファイル')
+    args = parser.parse_args()
+    metrics.begin(enabled=True if args.metrics else None, trace_path=args.trace)
+    if not args.db and not has_input(args):
+        print(json.dumps({'error': 'No input data'}))
+        sys.exit(1)
+
+    try:
+        if args.db:
+            params: Dict[str, Any] = {
+                'db': args.db,
+                'filters': {'dateFrom': args.date_from, 'dateTo': args.date_to},
+            }
+        else:
+            params = load_json_input(args)
+        if args.segment_by:
+            params['segment_by'] = [key.strip() for key in args.segment_by.split(',') if key.strip()]
+        if args.prior is not None:
+            params['prior'] = args.prior
+        if args.no_warm_start:
+            params['warm_start'] = False
+        if args.workers is not None:
+            params['workers'] = args.workers
+        result = perform_preference_from_params(params)
+        print(json.dumps(metrics.attach(result), ensure_ascii=False))
+    except Exception as e:
+        print(json.dumps({'error': str(e)}))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
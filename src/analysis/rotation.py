@@ -0,0 +1,68 @@
+"""
+因子負荷量の回転
+バリマックス（直交）とプロマックス（斜交）
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+ROTATIONS = ('none', 'varimax', 'promax')
+
+def varimax(
+    loadings: np.ndarray, tol: float = 1e-6, max_iter: int = 100, normalize: bool = False
+) -> Dict[str, np.ndarray]:
+    """バリマックス回転（尺度 × 因子）
+
+    normalize=False は sklearn の FactorAnalysis(rotation='varimax') と同じ（Kaiser 正規化なし）。
+    normalize=True は各尺度の共通性で割ってから回転し（Kaiser 正規化）、R の stats::varimax と同じ。
+    """
+    n_rows, n_cols = loadings.shape
+    if normalize:
+        scale = np.sqrt((loadings ** 2).sum(axis=1, keepdims=True))
+        # 共通性が0の尺度は回転に寄与しないためそのまま
+        scale[scale == 0] = 1.0
+        normalized = loadings / scale
+    else:
+        normalized = loadings
+    rotation = np.eye(n_cols)
+    criterion = 0.0
+    for _ in range(max_iter):
+        rotated = normalized @ rotation
+        target = rotated ** 3 - rotated * ((rotated ** 2).sum(axis=0) / n_rows)
+        u, s, vt = np.linalg.svd(normalized.T @ target)
+        rotation = u @ vt
+        new_criterion = np.sum(s)
+        if criterion != 0 and new_criterion < criterion * (1 + tol):
+            break
+        criterion = new_criterion
+    return {'loadings': loadings @ rotation, 'rotation': rotation}
+
+def promax(loadings: np.ndarray, power: int = 4) -> Dict[str, np.ndarray]:
+    """プロマックス回転（バリマックス解を累乗した目標行列へ最小二乗で斜交回転）
+
+    R の stats::promax と同じ手順（Kaiser 正規化したバリマックス、収束判定 1e-5・最大1000回）で、
+    パターン行列と因子間相関を返す。
+    """
+    orthogonal = varimax(loadings, tol=1e-5, max_iter=1000, normalize=True)
+    rotated = orthogonal['loadings']
+    target = rotated * np.abs(rotated) ** (power - 1)
+    transform, *_ = np.linalg.lstsq(rotated, target, rcond=None)
+    # 回転後の因子の分散が1になるよう列を正規化
+    transform = transform * np.sqrt(np.diag(np.linalg.inv(transform.T @ transform)))
+    rotation = orthogonal['rotation'] @ transform
+    return {
+        'loadings': rotated @ transform,
+        'rotation': rotation,
+        'factor_correlation': np.linalg.inv(rotation.T @ rotation),
+    }
+
+def rotate(loadings: np.ndarray, method: Optional[str] = 'none') -> Dict[str, np.ndarray]:
+    """指定した方法で回転（'none' はそのまま返す）"""
+    if method in (None, 'none'):
+        return {'loadings': loadings, 'rotation': np.eye(loadings.shape[1])}
+    if method == 'varimax':
+        return varimax(loadings)
+    if method == 'promax':
+        return promax(loadings)
+    raise ValueError(f'Unknown rotation: {method}')
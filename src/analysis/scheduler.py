@@ -0,0 +1,263 @@
+"""
+分析スナップショットの定期更新
+一定時間ごと、または前回の更新後に追加された評価が閾値に達したときに
+NLP分析と因子分析を実行し、バージョン付きのJSONスナップショットとして保存する
+（APIルートはスナップショットを返すだけになり、重い計算をリクエスト処理から外せる）
+
+使用方法:
+  python3 analysis/scheduler.py            # 更新が必要なら1回だけ実行
+  python3 analysis/scheduler.py --watch    # 常駐して定期的に確認
+  python3 analysis/scheduler.py --force    # 条件によらず更新
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import improved_nlp
+import factor_analysis
+from evaluation_db import DB_PATH, evaluation_watermark, iter_free_texts, load_sd_scores
+
+# スナップショットの保存先（環境変数で変更可能）
+SNAPSHOT_DIR = os.environ.get('ANALYSIS_SNAPSHOT_DIR', 'prisma/analysis-snapshots')
+# 前回の更新からこの秒数が経過したら更新
+REFRESH_INTERVAL = int(os.environ.get('ANALYSIS_REFRESH_INTERVAL', '3600'))
+# 前回の更新からこの件数以上の評価が追加・削除されたら更新
+REFRESH_THRESHOLD = int(os.environ.get('ANALYSIS_REFRESH_THRESHOLD', '50'))
+# 常駐時に更新の要否を確認する間隔（秒）
+POLL_INTERVAL = int(os.environ.get('ANALYSIS_POLL_INTERVAL', '60'))
+# 残しておく過去のスナップショット数
+KEEP_SNAPSHOTS = int(os.environ.get('ANALYSIS_KEEP_SNAPSHOTS', '10'))
+
+# スナップショットの形式（キー構成を変えたら上げる）
+SNAPSHOT_FORMAT = 1
+LATEST_NAME = 'latest.json'
+SNAPSHOT_PREFIX = 'analysis-'
+# バージョン付きのファイル名（analysis-<バージョン>-<日時>.json）
+SNAPSHOT_PATTERN = re.compile(rf'^{re.escape(SNAPSHOT_PREFIX)}(\d+)-.*\.json$')
+
+# スナップショットに含める分析
+ANALYSES = ('nlp', 'factor_analysis')
+
+def latest_snapshot(snapshot_dir: str = SNAPSHOT_DIR) -> Optional[Dict[str, Any]]:
+    """最新のスナップショット（なければ、または形式が異なれば None）"""
+    try:
+        with open(os.path.join(snapshot_dir, LATEST_NAME), encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return snapshot if snapshot.get('format') == SNAPSHOT_FORMAT else None
+
+def snapshot_history(snapshot_dir: str = SNAPSHOT_DIR) -> List[Tuple[int, str]]:
+    """保存済みのバージョン付きスナップショットを (バージョン, ファイル名) のバージョン順で返す"""
+    try:
+        names = os.listdir(snapshot_dir)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        (int(match.group(1)), name)
+        for name, match in ((name, SNAPSHOT_PATTERN.match(name)) for name in names)
+        if match
+    )
+
+def next_version(snapshot_dir: str = SNAPSHOT_DIR, snapshot: Optional[Dict[str, Any]] = None) -> int:
+    """次のバージョン（保存済みのファイルと latest.json の最大値 + 1）
+
+    latest.json が壊れている・形式が古い場合も、既存のファイルと同じバージョンを使わない。
+    """
+    versions = [version for version, _ in snapshot_history(snapshot_dir)]
+    if snapshot is not None:
+        versions.append(snapshot['version'])
+    return max(versions, default=0) + 1
+
+def refresh_reason(
+    snapshot: Optional[Dict[str, Any]],
+    watermark: Dict[str, int],
+    now: float,
+    interval: int = REFRESH_INTERVAL,
+    threshold: int = REFRESH_THRESHOLD,
+) -> Optional[str]:
+    """更新が必要な理由（'initial' / 'threshold' / 'interval'、不要なら None）
+
+    評価データが前回から変わっていない場合は、経過時間によらず更新しない。
+    """
+    if snapshot is None:
+        return 'initial'
+    previous = snapshot['watermark']
+    if watermark == previous:
+        return None
+    if abs(watermark['evaluations'] - previous['evaluations']) >= threshold:
+        return 'threshold'
+    if now - snapshot['generated_at_ms'] / 1000 >= interval:
+        return 'interval'
+    return None
+
+def _run(name: str, func: Any, durations: Dict[str, float]) -> Dict[str, Any]:
+    """分析を実行して所要時間を記録（失敗しても他の分析は続ける）"""
+    start = time.perf_counter()
+    try:
+        return func()
+    except Exception as e:
+        print(f"Warning: {name} failed ({e}).", file=sys.stderr)
+        return {'error': str(e)}
+    finally:
+        durations[name] = time.perf_counter() - start
+
+def _factor_analysis(db_path: str) -> Dict[str, Any]:
+    sd_scores = load_sd_scores(db_path)
+    if len(sd_scores) == 0:
+        return {'factors': [], 'loadings': [], 'explained_variance': []}
+    return factor_analysis.perform_factor_analysis(sd_scores, source=factor_analysis.data_source({'db': db_path}))
+
+def build_snapshot(
+    db_path: str,
+    version: int,
+    watermark: Dict[str, int],
+    reason: str,
+    interval: int = REFRESH_INTERVAL,
+    threshold: int = REFRESH_THRESHOLD,
+) -> Dict[str, Any]:
+    """NLP分析と因子分析を実行してスナップショットを構築"""
+    durations: Dict[str, float] = {}
+    nlp = _run('nlp', lambda: improved_nlp.analyze_free_texts_improved(iter_free_texts(db_path)), durations)
+    factors = _run('factor_analysis', lambda: _factor_analysis(db_path), durations)
+    now = datetime.now(timezone.utc)
+    return {
+        'format': SNAPSHOT_FORMAT,
+        'version': version,
+        'generated_at': now.isoformat(),
+        'generated_at_ms': int(now.timestamp() * 1000),
+        'reason': reason,
+        'watermark': watermark,
+        'refresh': {'interval_seconds': interval, 'threshold': threshold},
+        'durations': durations,
+        'nlp': nlp,
+        'factor_analysis': factors,
+    }
+
+def keep_previous_sections(
+    snapshot: Dict[str, Any], previous: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """失敗した分析は前回のスナップショットの成功した結果で置き換える
+
+    置き換えた場合はエラーを 'errors' に残し、基準点（watermark）を前回のものにする
+    （評価データが変わったままになるため、次回の確認で再度更新される）。
+    各分析の結果を計算したバージョンは 'section_versions' に記録する。
+    """
+    section_versions = {name: snapshot['version'] for name in ANALYSES}
+    errors: Dict[str, str] = {}
+    for name in ANALYSES:
+        if 'error' not in snapshot[name]:
+            continue
+        if previous is None or 'error' in previous.get(name, {'error': None}):
+            continue
+        errors[name] = snapshot[name]['error']
+        snapshot[name] = previous[name]
+        section_versions[name] = previous.get('section_versions', {}).get(name, previous['version'])
+    snapshot['section_versions'] = section_versions
+    if errors:
+        snapshot['errors'] = errors
+        snapshot['watermark'] = previous['watermark']
+    return snapshot
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    """一時ファイルに書いてから置き換える（読み込み側が途中の内容を見ないように）"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def write_snapshot(snapshot: Dict[str, Any], snapshot_dir: str = SNAPSHOT_DIR) -> str:
+    """バージョン・日時入りのファイルと latest.json に保存し、古いスナップショットを削除"""
+    os.makedirs(snapshot_dir, exist_ok=True)
+    stamp = datetime.fromtimestamp(snapshot['generated_at_ms'] / 1000, timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    path = os.path.join(snapshot_dir, f"{SNAPSHOT_PREFIX}{snapshot['version']:06d}-{stamp}.json")
+    _write_json(path, snapshot)
+    _write_json(os.path.join(snapshot_dir, LATEST_NAME), snapshot)
+
+    # ファイル名ではなくバージョン番号の順に古いものから削除（桁数が増えても順序を保つ）
+    history = snapshot_history(snapshot_dir)
+    for _, name in history[:max(len(history) - KEEP_SNAPSHOTS, 0)]:
+        os.remove(os.path.join(snapshot_dir, name))
+    return path
+
+def refresh(
+    db_path: str = DB_PATH,
+    snapshot_dir: str = SNAPSHOT_DIR,
+    force: bool = False,
+    interval: int = REFRESH_INTERVAL,
+    threshold: int = REFRESH_THRESHOLD,
+) -> Dict[str, Any]:
+    """更新が必要ならスナップショットを作り直し、結果の概要を返す"""
+    snapshot = latest_snapshot(snapshot_dir)
+    watermark = evaluation_watermark(db_path)
+    reason = 'forced' if force else refresh_reason(snapshot, watermark, time.time(), interval, threshold)
+    if reason is None:
+        return {'refreshed': False, 'version': snapshot['version'], 'generated_at': snapshot['generated_at']}
+
+    version = next_version(snapshot_dir, snapshot)
+    new_snapshot = keep_previous_sections(
+        build_snapshot(db_path, version, watermark, reason, interval, threshold), snapshot
+    )
+    path = write_snapshot(new_snapshot, snapshot_dir)
+    summary = {
+        'refreshed': True,
+        'reason': reason,
+        'version': version,
+        'generated_at': new_snapshot['generated_at'],
+        'path': path,
+        'durations': new_snapshot['durations'],
+    }
+    if 'errors' in new_snapshot:
+        summary['errors'] = new_snapshot['errors']
+    return summary
+
+def run_forever(
+    db_path: str = DB_PATH,
+    snapshot_dir: str = SNAPSHOT_DIR,
+    poll_interval: int = POLL_INTERVAL,
+    interval: int = REFRESH_INTERVAL,
+    threshold: int = REFRESH_THRESHOLD,
+) -> None:
+    """一定間隔で更新の要否を確認し続ける（モデル・キャッシュはプロセス内で再利用）"""
+    improved_nlp.warmup()
+    while True:
+        try:
+            summary = refresh(db_path, snapshot_dir, interval=interval, threshold=threshold)
+            if summary['refreshed']:
+                print(json.dumps(summary, ensure_ascii=False), flush=True)
+        except Exception as e:
+            print(f"Warning: snapshot refresh failed ({e}).", file=sys.stderr)
+        time.sleep(poll_interval)
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='分析スナップショットの定期更新')
+    parser.add_argument('--db', default=DB_PATH, help='評価データのSQLiteデータベース')
+    parser.add_argument('--snapshot-dir', default=SNAPSHOT_DIR, help='スナップショットの保存先')
+    parser.add_argument('--watch', action='store_true', help='常駐して定期的に更新の要否を確認する')
+    parser.add_argument('--force', action='store_true', help='条件によらず更新する')
+    parser.add_argument('--interval', type=int, default=REFRESH_INTERVAL, help='更新間隔（秒）')
+    parser.add_argument('--threshold', type=int, default=REFRESH_THRESHOLD, help='更新する評価の増減数')
+    parser.add_argument('--poll', type=int, default=POLL_INTERVAL, help='常駐時の確認間隔（秒）')
+    args = parser.parse_args()
+
+    try:
+        if args.watch:
+            run_forever(args.db, args.snapshot_dir, args.poll, args.interval, args.threshold)
+        else:
+            summary = refresh(args.db, args.snapshot_dir, args.force, args.interval, args.threshold)
+            print(json.dumps(summary, ensure_ascii=False))
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(json.dumps({'error': str(e)}))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
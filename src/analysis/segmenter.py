@@ -0,0 +1,56 @@
+"""
+文字種による簡易分かち書き（MeCabが使えない場合のフォールバック）
+漢字・カタカナ・英数字・ひらがなの連続を1語とし、漢字に続く送り仮名は助詞の手前まで含める
+語の直後のひらがなは先頭の助詞1文字を除いて1語とする（「音がとても」→「音」「とても」）
+"""
+
+import os
+import re
+from typing import List
+
+# ストップワード（MeCab使用時と共通）
+STOPWORDS = frozenset({'の', 'に', 'は', 'を', 'が', 'で', 'と', 'も', 'など', 'こと', 'ため', 'よう'})
+
+# 長い漢字の連続を文字バイグラムに分割するか（環境変数で変更可能）
+SEGMENTER_BIGRAMS = os.environ.get('SEGMENTER_BIGRAMS', '').lower() not in ('', '0', 'false', 'no')
+
+# 分割規則のバージョン（規則・ストップワードを変えたら上げる。トークンのキャッシュキーに使う）
+SEGMENTER_VERSION = 1
+
+_KANJI = '㐀-䶿一-鿿豈-﫿々〆ヶ'
+_HIRAGANA = 'ぁ-ゖ'
+_KATAKANA = 'ァ-ヺー-ヾｦ-ﾟ'
+_LATIN = 'A-Za-z0-9０-９Ａ-Ｚａ-ｚ'
+# 送り仮名の終わりとみなす1文字の助詞
+_PARTICLES = ''.join(sorted(word for word in STOPWORDS if len(word) == 1))
+_OKURIGANA = ''.join(chr(c) for c in range(ord('ぁ'), ord('ゖ') + 1) if chr(c) not in _PARTICLES)
+
+# 1: 漢字 2: 送り仮名（助詞の手前まで） 3: カタカナ・英数字
+# 4: 語の直後のひらがな（先頭の助詞1文字を除く） 5: 語に続かないひらがな
+# （先読み・後読みを使わず、1回の findall で分割する）
+_TOKEN_PATTERN = re.compile(
+    f'(?:([{_KANJI}]+)([{_OKURIGANA}]*)|([{_KATAKANA}]+|[{_LATIN}]+))(?:[{_PARTICLES}]?([{_HIRAGANA}]+))?'
+    f'|([{_HIRAGANA}]+)'
+)
+
+def segmenter_version(bigrams: bool = SEGMENTER_BIGRAMS) -> str:
+    """キャッシュキー用の分割規則のバージョン（バイグラム分割の有無を含む）"""
+    return f'segmenter-{SEGMENTER_VERSION}:{"bigrams" if bigrams else "words"}'
+
+def segment(text: str, bigrams: bool = SEGMENTER_BIGRAMS) -> List[str]:
+    """文字種の境界でテキストを語に分割（1文字の語とストップワードは除く）
+
+    bigrams: 3文字以上の漢字の連続を重なりのある2文字ずつに分割する
+             （複合語が長く連なる文章で、部分一致する語を数えやすくする）
+    """
+    tokens: List[str] = []
+    for kanji, okurigana, other, following, hiragana in _TOKEN_PATTERN.findall(text):
+        if bigrams and len(kanji) > 2:
+            tokens.extend(kanji[i:i + 2] for i in range(len(kanji) - 1))
+        else:
+            token = kanji + okurigana if kanji else other or hiragana
+            if len(token) > 1 and token not in STOPWORDS:
+                tokens.append(token)
+        if len(following) > 1 and following not in STOPWORDS:
+            tokens.append(following)
+    return tokens
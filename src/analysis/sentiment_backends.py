@@ -0,0 +1,199 @@
+"""
+感情分析モデルのCPU推論バックエンド
+  eager     : PyTorch の通常実行（fp32、従来どおり）
+  int8      : 線形層を動的int8量子化した PyTorch モデル
+  onnx      : ONNX にエクスポートしたグラフを ONNX Runtime で実行
+  onnx-int8 : ONNX グラフの重みを動的int8量子化して ONNX Runtime で実行
+
+スレッド数（intra_op / inter_op）と使用するCPUコアは環境変数で指定できる。
+CPUコアの固定はプロセス全体に及ぶため、推論専用のプロセス（ベンチマークの計測プロセス）でのみ行う。
+ONNX へのエクスポート・量子化は初回のみ行い、ファイルを再利用する。
+"""
+
+import importlib.util
+import inspect
+import os
+import re
+import sys
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+BACKENDS = ('eager', 'int8', 'onnx', 'onnx-int8')
+
+# 使用するバックエンド（環境変数で変更可能）
+SENTIMENT_BACKEND = os.environ.get('SENTIMENT_BACKEND', 'eager')
+# 1つの演算内の並列スレッド数・演算間の並列スレッド数（未指定ならライブラリの既定値）
+INTRA_OP_THREADS = os.environ.get('SENTIMENT_INTRA_OP_THREADS')
+INTER_OP_THREADS = os.environ.get('SENTIMENT_INTER_OP_THREADS')
+# 推論に使うCPUコア（例: "0-3" / "0,2,4,6"、未指定なら制限しない）
+# 演算内スレッド数の既定値になる（プロセスの固定は pin_cores を呼ぶ推論専用のプロセスのみ）
+CPU_CORES = os.environ.get('SENTIMENT_CPU_CORES')
+# エクスポートしたONNXグラフの保存先
+ONNX_DIR = os.environ.get('SENTIMENT_ONNX_DIR', 'prisma/analysis-models')
+
+ONNXRUNTIME_AVAILABLE = importlib.util.find_spec('onnxruntime') is not None
+
+def parse_cores(spec: Optional[str]) -> List[int]:
+    """"0-3,6" 形式のコア指定を番号のリストに変換"""
+    cores: List[int] = []
+    for part in (spec or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            cores.extend(range(int(first), int(last) + 1))
+        else:
+            cores.append(int(part))
+    return sorted(set(cores))
+
+def thread_settings(
+    intra_op: Optional[int] = None,
+    inter_op: Optional[int] = None,
+    cores: Optional[List[int]] = None,
+) -> Dict[str, Any]:
+    """スレッド数・コアの設定（引数 > 環境変数、コア指定時の intra_op 既定値はコア数）"""
+    if cores is None:
+        cores = parse_cores(CPU_CORES)
+    if intra_op is None and INTRA_OP_THREADS:
+        intra_op = int(INTRA_OP_THREADS)
+    if inter_op is None and INTER_OP_THREADS:
+        inter_op = int(INTER_OP_THREADS)
+    if intra_op is None and cores:
+        intra_op = len(cores)
+    return {'intra_op': intra_op, 'inter_op': inter_op, 'cores': cores}
+
+def pin_cores(cores: List[int]) -> None:
+    """このプロセス全体（全スレッドと以降に生成する子プロセスを含む）を指定したコアに固定
+
+    因子分析の並列処理など、同じプロセスで実行する他の処理もこのコアに制限されるため、
+    推論だけを行うプロセスでのみ呼ぶ（常駐ワーカー・スケジューラでは呼ばない）。
+    """
+    if not cores:
+        return
+    if not hasattr(os, 'sched_setaffinity'):
+        print("Warning: CPU affinity is not supported on this platform.", file=sys.stderr)
+        return
+    os.sched_setaffinity(0, cores)
+
+def _configure_torch(torch: Any, settings: Dict[str, Any]) -> None:
+    """PyTorch のスレッド数を設定（inter_op は並列処理の開始前のみ変更可能）"""
+    if settings['intra_op']:
+        torch.set_num_threads(settings['intra_op'])
+    if settings['inter_op']:
+        try:
+            torch.set_num_interop_threads(settings['inter_op'])
+        except RuntimeError as e:
+            print(f"Warning: failed to set inter-op threads ({e}).", file=sys.stderr)
+
+class EagerBackend:
+    """PyTorch の通常実行"""
+
+    name = 'eager'
+    tensor_type = 'pt'
+
+    def __init__(self, model: Any, torch: Any, settings: Dict[str, Any]):
+        _configure_torch(torch, settings)
+        self.torch = torch
+        self.model = model
+
+    def logits(self, inputs: Dict[str, Any]) -> np.ndarray:
+        """トークナイズ済みの入力（バッチ）からロジットを返す"""
+        with self.torch.inference_mode():
+            return self.model(**inputs).logits.float().numpy()
+
+class QuantizedBackend(EagerBackend):
+    """線形層（BERTの計算量の大半）の重みをint8にし、活性値は実行時に量子化する"""
+
+    name = 'int8'
+
+    def __init__(self, model: Any, torch: Any, settings: Dict[str, Any]):
+        super().__init__(model, torch, settings)
+        quantize_dynamic = getattr(torch, 'ao', torch).quantization.quantize_dynamic
+        # 元のモデルを置き換えてメモリを二重に持たない
+        self.model = quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+class OnnxBackend:
+    """ONNX Runtime による実行（初回にエクスポートしたグラフを再利用）"""
+
+    name = 'onnx'
+    tensor_type = 'np'
+
+    def __init__(self, model: Any, torch: Any, settings: Dict[str, Any], tokenizer: Any, model_name: str,
+                 quantize: bool = False):
+        if not ONNXRUNTIME_AVAILABLE:
+            raise RuntimeError('onnxruntime is not available')
+        import onnxruntime
+
+        path = onnx_model_path(model_name)
+        if not os.path.exists(path):
+            export_onnx(model, torch, tokenizer, path)
+        if quantize:
+            self.name = 'onnx-int8'
+            fp32_path, path = path, onnx_model_path(model_name, quantized=True)
+            if not os.path.exists(path):
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+                quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if settings['intra_op']:
+            options.intra_op_num_threads = settings['intra_op']
+        if settings['inter_op']:
+            options.inter_op_num_threads = settings['inter_op']
+            options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    def logits(self, inputs: Dict[str, Any]) -> np.ndarray:
+        feed = {name: np.asarray(inputs[name], dtype=np.int64) for name in self.input_names}
+        return self.session.run(['logits'], feed)[0]
+
+def onnx_model_path(model_name: str, quantized: bool = False) -> str:
+    """モデル名ごとのONNXファイルのパス"""
+    stem = re.sub(r'[^A-Za-z0-9_.-]', '_', model_name)
+    return os.path.join(ONNX_DIR, f"{stem}{'.int8' if quantized else ''}.onnx")
+
+def export_onnx(model: Any, torch: Any, tokenizer: Any, path: str) -> None:
+    """バッチサイズ・系列長を可変にしてONNXへエクスポート（一時ファイルに書いてから置き換え）"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    sample = tokenizer(['エクスポート用の入力'], return_tensors='pt')
+    # グラフの入力名は forward の引数順に対応するため、トークナイザの出力順ではなく引数順に並べる
+    input_names = [name for name in inspect.signature(model.forward).parameters if name in sample]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['logits'] = {0: 'batch'}
+    tmp_path = f'{path}.tmp'
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            ({name: sample[name] for name in input_names},),
+            tmp_path,
+            input_names=input_names,
+            output_names=['logits'],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    os.replace(tmp_path, path)
+
+def create_backend(
+    name: str,
+    model: Any,
+    torch: Any,
+    tokenizer: Any,
+    model_name: str,
+    settings: Optional[Dict[str, Any]] = None,
+) -> Any:
+    """バックエンドを生成（利用できない場合は eager に切り替える）"""
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown sentiment backend: {name}')
+    if settings is None:
+        settings = thread_settings()
+    try:
+        if name == 'int8':
+            return QuantizedBackend(model, torch, settings)
+        if name in ('onnx', 'onnx-int8'):
+            return OnnxBackend(model, torch, settings, tokenizer, model_name, quantize=name == 'onnx-int8')
+    except Exception as e:
+        print(f"Warning: failed to initialize {name} backend ({e}). Using eager PyTorch.", file=sys.stderr)
+    return EagerBackend(model, torch, settings)
@@ -0,0 +1,85 @@
+"""
+分析スクリプトのテスト共通設定
+analysis/ の各モジュールはスクリプトとして実行される前提で互いを直接インポートするため、
+analysis/ をインポートパスに追加する
+
+実行方法（src/ で）:
+  python3 -m pytest -q analysis/tests
+"""
+
+import json
+import os
+import random
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 開発環境の永続キャッシュ・保存先を読み書きしない
+os.environ.pop('ANALYSIS_CACHE_PATH', None)
+# transformers がインストールされていてもモデルをダウンロードしない（キャッシュになければ簡易版で分析）
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+
+# リポジトリの Prisma データベース（テスト用データベースのテーブル定義の取得元）
+PRISMA_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'prisma', 'dev.db')
+SURVEY_TABLES = ('AudioSample', 'Respondent', 'Evaluation', 'BestWorstComparison')
+SD_KEYS = ['quiet', 'pleasant', 'premium', 'modern', 'powerful', 'safe', 'exciting', 'natural']
+
+
+def create_survey_db(path: str, n_respondents: int = 24, seed: int = 0) -> str:
+    """dev.db と同じテーブル定義で、乱数で作った回答を持つデータベースを作る
+
+    音源3件・実験群2つ・年代3つで、SD法スコアの一部の尺度は欠損させる。
+    登録日時は rowid の順とずらす。
+    """
+    rng = random.Random(seed)
+    with sqlite3.connect(PRISMA_DB) as source:
+        schema = [
+            sql for (sql,) in source.execute(
+                f"SELECT sql FROM sqlite_master WHERE tbl_name IN ({','.join('?' * len(SURVEY_TABLES))}) "
+                'AND sql IS NOT NULL',
+                SURVEY_TABLES,
+            )
+        ]
+    with sqlite3.connect(path) as conn:
+        for sql in schema:
+            conn.execute(sql)
+        samples = [('s1', 'NBox Model1'), ('s2', 'NBox Model2'), ('s3', 'NBox Model3')]
+        for sample_id, name in samples:
+            conn.execute(
+                "INSERT INTO AudioSample (id, name, fileUrl, duration, category) VALUES (?, ?, '', 10, 'ev')",
+                (sample_id, name),
+            )
+        texts = ['静かで快適', 'エンジン音が力強い', '高級感のある低音', '', None, 'うるさいが力強い']
+        for r in range(n_respondents):
+            respondent_id = f'r{r:03d}'
+            conn.execute(
+                'INSERT INTO Respondent (id, sessionId, experimentGroup, ageGroup, gender, '
+                'drivingExperience, audioSensitivity) VALUES (?, ?, ?, ?, ?, 5, 3)',
+                (respondent_id, f'session{r}', 'AB'[r % 2], ['20-29', '30-39', '40-49'][r % 3], 'mf'[r % 2]),
+            )
+            for order, (sample_id, _) in enumerate(rng.sample(samples, len(samples))):
+                scores = {key: rng.randint(-3, 3) for key in SD_KEYS if rng.random() > 0.05}
+                conn.execute(
+                    'INSERT INTO Evaluation (id, respondentId, audioSampleId, presentationOrder, sdScores, '
+                    'purchaseIntent, willingnessToPay, freeText, createdAt) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (
+                        f'e{r:03d}{sample_id}', respondent_id, sample_id, order, json.dumps(scores),
+                        rng.randint(1, 7), rng.choice([None, 0, 10000, 50000]), rng.choice(texts),
+                        1_700_000_000_000 + rng.randint(0, 10_000_000),
+                    ),
+                )
+            best, worst = rng.sample([sample_id for sample_id, _ in samples], 2)
+            conn.execute(
+                'INSERT INTO BestWorstComparison (id, respondentId, bestAudioId, worstAudioId, bestReason, '
+                "worstReason) VALUES (?, ?, ?, ?, '', '')",
+                (f'b{r:03d}', respondent_id, best, worst),
+            )
+    return path
+
+
+@pytest.fixture
+def survey_db(tmp_path) -> str:
+    return create_survey_db(str(tmp_path / 'survey.db'))
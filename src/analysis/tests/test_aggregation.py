@@ -0,0 +1,104 @@
+"""aggregation: 1回の読み込みからのクロス集計・グループ平均"""
+
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import aggregation
+from evaluation_db import SD_SCALE_KEYS
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'aggregation.py')
+
+
+def query(path, sql):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(sql).fetchall()
+
+
+def test_crosstab_matches_group_by(survey_db):
+    table = aggregation.load_evaluation_table(survey_db, batch_size=10)
+    result = table.crosstab(['experimentGroup', 'ageGroup'])
+    expected = {
+        (group, age): count for group, age, count in query(
+            survey_db,
+            'SELECT r.experimentGroup, r.ageGroup, COUNT(*) FROM Evaluation e '
+            'JOIN Respondent r ON r.id = e.respondentId GROUP BY 1, 2',
+        )
+    }
+    groups, ages = result['levels']
+    counts = {(g, a): result['counts'][i][j] for i, g in enumerate(groups) for j, a in enumerate(ages)}
+    assert counts == {key: expected.get(key, 0) for key in counts}
+    assert sum(expected.values()) == len(table) == 72
+
+
+def test_chi_square_matches_scipy(survey_db):
+    stats = pytest.importorskip('scipy.stats')
+    table = aggregation.load_evaluation_table(survey_db)
+    result = table.crosstab(['ageGroup', 'purchaseBand'])
+    counts = np.array(result['counts'])
+    chi2, p_value, dof, _ = stats.chi2_contingency(counts, correction=False)
+    assert result['statistics']['chi2'] == pytest.approx(chi2)
+    assert result['statistics']['p_value'] == pytest.approx(p_value)
+    assert result['statistics']['dof'] == dof
+    assert result['statistics']['cramers_v'] == pytest.approx(np.sqrt(chi2 / (counts.sum() * (min(counts.shape) - 1))))
+
+
+def test_profiles_match_sql_means(survey_db):
+    table = aggregation.load_evaluation_table(survey_db)
+    profile = table.profiles('audioSampleId', columns=['purchaseIntent', 'willingnessToPay', 'quiet'])
+    for i, sample in enumerate(profile['levels']):
+        expected = query(
+            survey_db,
+            "SELECT AVG(purchaseIntent), AVG(willingnessToPay), COUNT(willingnessToPay), "
+            "AVG(COALESCE(json_extract(sdScores, '$.quiet'), 0)) "
+            f"FROM Evaluation WHERE audioSampleId = '{sample}'",
+        )[0]
+        np.testing.assert_allclose(profile['mean'][i], [expected[0], expected[1], expected[3]])
+        # willingnessToPay の NULL は件数・平均から除く
+        assert profile['count'][i][1] == expected[2] < 24
+
+
+def test_dashboard_views(survey_db):
+    table = aggregation.load_evaluation_table(survey_db)
+    dashboard = aggregation.dashboard_aggregates(table)
+    assert dashboard['total_evaluations'] == 72
+    # 音源は評価データの出現順
+    first_samples = [row[0] for row in query(survey_db, 'SELECT audioSampleId FROM Evaluation ORDER BY rowid')]
+    order = sorted(set(first_samples), key=first_samples.index)
+    names = {'s1': 'NBox Model1', 's2': 'NBox Model2', 's3': 'NBox Model3'}
+    assert [item['name'] for item in dashboard['sd_scores']] == [names[sample] for sample in order]
+    assert all(sum(item['distribution']) == 24 for item in dashboard['purchase_intent'])
+    assert set(dashboard['sd_scores'][0]['scores']) == set(SD_SCALE_KEYS)
+    rows = {row['row']: row['columns'] for row in dashboard['cross_tabulation']}
+    assert list(rows) == aggregation.AGE_GROUPS
+    assert sum(sum(columns.values()) for columns in rows.values()) == 72
+
+
+def test_filters_from_params(survey_db):
+    result = aggregation.aggregate_from_params({
+        'db': survey_db,
+        'view': 'dashboard',
+        # 空文字の条件は指定なしとして扱う
+        'filters': {'experimentGroup': 'A', 'audioSampleId': 's2', 'dateFrom': ''},
+    })
+    assert result['total_evaluations'] == query(
+        survey_db,
+        "SELECT COUNT(*) FROM Evaluation e JOIN Respondent r ON r.id = e.respondentId "
+        "WHERE r.experimentGroup = 'A' AND e.audioSampleId = 's2'",
+    )[0][0] == 12
+
+
+def test_cli_with_db_and_empty_stdin(survey_db):
+    completed = subprocess.run(
+        [sys.executable, SCRIPT, '--db', survey_db, '--dimensions', 'gender,purchaseBand'],
+        stdin=subprocess.DEVNULL, capture_output=True, text=True,
+    )
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    result = json.loads(completed.stdout)
+    assert result['dimensions'] == ['gender', 'purchaseBand']
+    assert np.sum(result['counts']) == 72
@@ -0,0 +1,64 @@
+"""分析結果キャッシュと正規化テキストによるトークン化のテスト"""
+
+import pytest
+
+import analysis_cache
+from analysis_cache import AnalysisCache, normalize_text
+import improved_nlp
+
+
+def test_key_depends_on_normalized_text_namespace_and_version():
+    cache = AnalysisCache('tokens', 'v1', path=None)
+    assert cache.key('ＡＢＣ　静か ') == cache.key('ABC 静か')
+    assert cache.key('静か') != AnalysisCache('sentiment', 'v1', path=None).key('静か')
+    assert cache.key('静か') != AnalysisCache('tokens', 'v2', path=None).key('静か')
+
+
+def test_lru_evicts_least_recently_used():
+    cache = AnalysisCache('tokens', 'v1', max_entries=2, path=None)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['hits'] == 3 and cache.stats()['misses'] == 1
+
+
+def test_disk_store_round_trip(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = AnalysisCache('tokens', 'v1', path=path)
+    cache.put('静か', ['静か'])
+    cache.flush()
+    # 別のインスタンス（メモリは空）からディスクの値を読む
+    reopened = AnalysisCache('tokens', 'v1', path=path)
+    assert reopened.get('静か') == ['静か']
+    assert reopened.stats()['disk_hits'] == 1
+    analysis_cache._disk_stores.pop(path).conn.close()
+
+
+def test_tokens_are_computed_from_the_normalized_key(monkeypatch):
+    monkeypatch.setattr(improved_nlp, 'token_cache', AnalysisCache('tokens', 'simple', path=None))
+    half_width = improved_nlp.tokenize_with_mecab('ｴﾝｼﾞﾝ音が静か')
+    full_width = improved_nlp.tokenize_with_mecab('エンジン音が静か')
+    assert half_width == full_width == improved_nlp.simple_tokenize(normalize_text('ｴﾝｼﾞﾝ音が静か'))
+
+    # 呼び出し順を入れ替えても結果は同じ
+    monkeypatch.setattr(improved_nlp, 'token_cache', AnalysisCache('tokens', 'simple', path=None))
+    assert improved_nlp.tokenize_with_mecab('エンジン音が静か') == full_width
+    assert improved_nlp.tokenize_with_mecab('ｴﾝｼﾞﾝ音が静か') == full_width
+
+
+def test_simple_tokenization_is_cached(monkeypatch):
+    cache = AnalysisCache('tokens', 'simple', path=None)
+    monkeypatch.setattr(improved_nlp, 'token_cache', cache)
+    calls = []
+    original = improved_nlp.simple_tokenize
+    monkeypatch.setattr(improved_nlp, 'simple_tokenize', lambda text: calls.append(text) or original(text))
+    if improved_nlp.get_mecab() is not None:
+        pytest.skip('MeCab is installed')
+    first = improved_nlp.tokenize_with_mecab('静かで快適')
+    second = improved_nlp.tokenize_with_mecab('静かで快適 ')
+    assert first == second
+    assert calls == ['静かで快適']
+    assert cache.stats()['hits'] == 1
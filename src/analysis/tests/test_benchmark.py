@@ -0,0 +1,78 @@
+"""benchmark: 合成データの再現性と基準結果との比較による劣化判定"""
+
+import json
+import sys
+
+import numpy as np
+import pytest
+
+import benchmark
+
+
+def result(stage, wall_seconds=1.0, peak_rss_mb=100.0, rows=1000, **extra):
+    return {'stage': stage, 'rows': rows, 'wall_seconds': wall_seconds, 'peak_rss_mb': peak_rss_mb, **extra}
+
+
+def test_synthetic_data_is_deterministic_per_seed():
+    np.testing.assert_array_equal(benchmark.generate_sd_scores(200, seed=3), benchmark.generate_sd_scores(200, seed=3))
+    assert benchmark.generate_free_texts(50, seed=3) == benchmark.generate_free_texts(50, seed=3)
+    assert not np.array_equal(benchmark.generate_sd_scores(200, seed=3), benchmark.generate_sd_scores(200, seed=4))
+    assert benchmark.generate_free_texts(50, seed=3) != benchmark.generate_free_texts(50, seed=4)
+
+    scores = benchmark.generate_sd_scores(200, seed=3)
+    assert scores.shape == (200, 8)
+    assert scores.min() >= -3 and scores.max() <= 3
+    assert np.array_equal(scores, np.rint(scores))
+
+
+def test_regressions_exceed_threshold_ratio():
+    baseline = {'results': [result('factor'), result('nlp')]}
+    current = {'results': [result('factor', wall_seconds=1.19), result('nlp', wall_seconds=1.3, peak_rss_mb=150.0)]}
+
+    regressions = benchmark.compare_results(current, baseline, threshold=0.2)
+    assert [(r['stage'], r['metric']) for r in regressions] == [('nlp', 'wall_seconds'), ('nlp', 'peak_rss_mb')]
+    assert regressions[0]['ratio'] == 1.3
+    assert benchmark.compare_results(current, baseline, threshold=0.5) == []
+
+
+def test_short_runs_are_not_compared_by_time():
+    short = benchmark.MIN_COMPARABLE_SECONDS / 4
+    baseline = {'results': [result('factor', wall_seconds=short)]}
+    current = {'results': [result('factor', wall_seconds=short * 3)]}
+    assert benchmark.compare_results(current, baseline) == []
+
+    # どちらかが下限以上なら比較する
+    current = {'results': [result('factor', wall_seconds=benchmark.MIN_COMPARABLE_SECONDS * 2)]}
+    assert [r['metric'] for r in benchmark.compare_results(current, baseline)] == ['wall_seconds']
+
+
+def test_errors_in_baseline_are_skipped_and_current_errors_reported():
+    baseline = {'results': [
+        {'stage': 'bert', 'rows': 1000, 'error': 'BERT is not available'},
+        result('factor'),
+        result('nlp', rows=500),
+    ]}
+    current = {'results': [
+        result('bert', wall_seconds=100.0),
+        {'stage': 'factor', 'rows': 1000, 'error': 'boom'},
+        result('nlp', rows=1000, wall_seconds=100.0),
+    ]}
+    assert benchmark.compare_results(current, baseline) == [
+        {'stage': 'factor', 'rows': 1000, 'metric': 'error', 'error': 'boom'},
+    ]
+
+
+def test_cli_exits_nonzero_on_regression(tmp_path, monkeypatch, capsys):
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps({'results': [result('factor')]}))
+    runs = iter([{'results': [result('factor', wall_seconds=1.1)]}, {'results': [result('factor', wall_seconds=2.0)]}])
+    monkeypatch.setattr(benchmark, 'run_benchmarks', lambda *args: next(runs))
+    monkeypatch.setattr(sys, 'argv', ['benchmark.py', '--stages', 'factor_analysis', '--compare', str(baseline)])
+
+    benchmark.main()
+    assert json.loads(capsys.readouterr().out)['regressions'] == []
+
+    with pytest.raises(SystemExit) as exited:
+        benchmark.main()
+    assert exited.value.code == 1
+    assert 'Regression: factor x 1000 wall_seconds' in capsys.readouterr().err
@@ -0,0 +1,120 @@
+"""共起集計エンジンのテスト（辞書による逐次集計との一致）"""
+
+import math
+import pickle
+import random
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pytest
+
+import cooccurrence
+from cooccurrence import CooccurrenceCounter
+from corpus import Vocabulary, tokenize_corpus
+
+
+def random_documents(seed: int, n_documents: int = 300) -> List[List[str]]:
+    rng = random.Random(seed)
+    words = [f'w{i:02d}' for i in range(25)]
+    return [[rng.choice(words) for _ in range(rng.randint(0, 12))] for _ in range(n_documents)]
+
+
+def dict_cooccurrences(documents: List[List[str]], window: int = 2) -> Dict[Tuple[str, str], int]:
+    """変更前の実装（辞書の挿入順＝初出順）"""
+    counts: Dict[Tuple[str, str], int] = {}
+    for tokens in documents:
+        for i in range(len(tokens) - 1):
+            for j in range(i + 1, min(i + window + 1, len(tokens))):
+                pair = tuple(sorted([tokens[i], tokens[j]]))
+                counts[pair] = counts.get(pair, 0) + 1
+    return counts
+
+
+def count_in_chunks(documents: List[List[str]], chunk_size: int) -> CooccurrenceCounter:
+    vocabulary = Vocabulary()
+    counter = CooccurrenceCounter(vocabulary)
+    for start in range(0, len(documents), chunk_size):
+        corpus = tokenize_corpus(documents[start:start + chunk_size], list, vocabulary)
+        counter.add_documents(corpus)
+    return counter
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000])
+@pytest.mark.parametrize('reduce_min_rows', [1, 50, 1 << 20])
+def test_streamed_chunks_match_dict_counting(monkeypatch, chunk_size, reduce_min_rows):
+    monkeypatch.setattr(cooccurrence, 'REDUCE_MIN_ROWS', reduce_min_rows)
+    documents = random_documents(0)
+    counter = count_in_chunks(documents, chunk_size)
+    expected = dict_cooccurrences(documents)
+    assert list(counter.items().items()) == list(expected.items())
+    ranked = sorted(expected.items(), key=lambda x: x[1], reverse=True)[:20]
+    assert [(w1, w2, freq) for w1, w2, freq, _ in counter.top(20)] == [(a, b, f) for (a, b), f in ranked]
+
+
+def test_reduction_work_is_linear_in_streamed_pairs(monkeypatch):
+    monkeypatch.setattr(cooccurrence, 'REDUCE_MIN_ROWS', 1)
+    processed = []
+    original = CooccurrenceCounter._reduce
+
+    def counting_reduce(self):
+        if self._pending:
+            processed.append(len(self.counts) + self._pending_rows)
+        original(self)
+
+    monkeypatch.setattr(CooccurrenceCounter, '_reduce', counting_reduce)
+    documents = random_documents(1, n_documents=2000)
+    counter = count_in_chunks(documents, chunk_size=1)
+    streamed = sum(dict_cooccurrences(documents).values())
+    assert sum(counter.items().values()) == streamed
+    # チャンクごとに全ペアを集約し直すと O(チャンク数 × ペア数) になる
+    assert sum(processed) <= 3 * streamed
+
+
+def test_merge_of_partial_counters_matches_sequential():
+    documents = random_documents(2)
+    expected = count_in_chunks(documents, chunk_size=1000)
+    merged = CooccurrenceCounter(Vocabulary())
+    for start in range(0, len(documents), 64):
+        # 別プロセスで集計した場合と同じく、語彙は別々に持つ
+        part = count_in_chunks(documents[start:start + 64], chunk_size=16)
+        merged.merge(pickle.loads(pickle.dumps(part)))
+    assert list(merged.items().items()) == list(expected.items().items())
+    assert merged.top(20) == expected.top(20)
+
+
+def test_pickling_reduces_pending_pairs():
+    counter = count_in_chunks(random_documents(3, n_documents=20), chunk_size=1)
+    restored = pickle.loads(pickle.dumps(counter))
+    assert restored._pending == []
+    assert restored.items() == counter.items()
+
+
+def test_pmi_and_npmi_match_definition():
+    documents = random_documents(4)
+    counter = count_in_chunks(documents, chunk_size=50)
+    pairs = dict_cooccurrences(documents)
+    total = sum(pairs.values())
+    marginal: Dict[str, int] = {}
+    for (a, b), freq in pairs.items():
+        marginal[a] = marginal.get(a, 0) + freq
+        marginal[b] = marginal.get(b, 0) + freq
+    pmi = counter.scores('pmi')
+    npmi = counter.scores('npmi')
+    for index in range(len(counter)):
+        a, b = counter._pair(index)
+        joint = pairs[(a, b)] / total
+        expected = math.log(joint / ((marginal[a] / (2 * total)) * (marginal[b] / (2 * total))))
+        assert pmi[index] == pytest.approx(expected)
+        assert npmi[index] == pytest.approx(expected / -math.log(joint))
+
+
+def test_matrix_is_upper_triangular_counts():
+    documents = [['a', 'b', 'a', 'c']]
+    counter = count_in_chunks(documents, chunk_size=1)
+    matrix = counter.matrix().toarray()
+    vocabulary = counter.vocabulary
+    ids = {token: i for i, token in enumerate(vocabulary)}
+    assert matrix[ids['a'], ids['b']] == 2
+    assert matrix[ids['a'], ids['a']] == 1
+    assert matrix[ids['a'], ids['c']] + matrix[ids['b'], ids['c']] == 2
+    assert np.tril(matrix, -1).sum() == 0
@@ -0,0 +1,59 @@
+"""トークン化済みコーパスとキーワード抽出のテスト"""
+
+import random
+from typing import Dict, List, Tuple
+
+from corpus import TokenizedCorpus, Vocabulary, tokenize_corpus
+import improved_nlp
+
+
+def baseline_keywords(tokens: List[str], top_n: int = 10) -> List[Tuple[str, int]]:
+    """変更前の実装（辞書で数えて頻度の安定ソート）"""
+    word_freq: Dict[str, int] = {}
+    for token in tokens:
+        word_freq[token] = word_freq.get(token, 0) + 1
+    return sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:top_n]
+
+
+def test_vocabulary_assigns_ids_in_first_appearance_order():
+    vocabulary = Vocabulary()
+    ids = vocabulary.encode(['静か', '高級', '静か', '力強い'])
+    assert list(ids) == [0, 1, 0, 2]
+    assert list(vocabulary) == ['静か', '高級', '力強い']
+    assert vocabulary.token(2) == '力強い'
+    assert len(vocabulary) == 3
+
+
+def test_corpus_documents_are_slices_of_one_array():
+    texts = ['静か 高級', '', '高級 高級 力強い']
+    corpus = tokenize_corpus(texts, str.split)
+    assert len(corpus) == 3
+    assert list(corpus.offsets) == [0, 2, 2, 5]
+    decoded = [[corpus.vocabulary.token(i) for i in document] for document in corpus]
+    assert decoded == [text.split() for text in texts]
+    assert list(corpus.document(2)) == list(corpus.tokens[2:5])
+
+
+def test_corpus_shares_vocabulary():
+    vocabulary = Vocabulary()
+    first = TokenizedCorpus(vocabulary)
+    first.add(['静か'])
+    second = tokenize_corpus(['高級 静か'], str.split, vocabulary)
+    assert list(second.tokens) == [1, 0]
+
+
+def test_count_keywords_matches_stable_sort():
+    rng = random.Random(0)
+    words = [f'w{i}' for i in range(30)]
+    for _ in range(200):
+        tokens = [rng.choice(words) for _ in range(rng.randint(0, 60))]
+        vocabulary = Vocabulary()
+        ids = vocabulary.encode(tokens)
+        counted = [(vocabulary.token(i), freq) for i, freq in improved_nlp.count_keywords(ids, 10)]
+        assert counted == baseline_keywords(tokens)
+
+
+def test_extract_keywords_matches_baseline_tokenization():
+    text = '静かで高級感がある。静かなのが良い。高級車らしい静かさ'
+    tokens = improved_nlp.tokenize_with_mecab(text)
+    assert improved_nlp.extract_keywords_improved(text) == baseline_keywords(tokens)
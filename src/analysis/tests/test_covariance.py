@@ -0,0 +1,53 @@
+"""covariance: Chan らの併合式による共分散の逐次集計"""
+
+import numpy as np
+import pytest
+
+from covariance import CovarianceAccumulator, accumulate
+
+
+def data(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    # 平均が0から離れた相関のある列（単純な和の公式では桁落ちしやすい）
+    return rng.normal(size=(n, 5)) @ rng.normal(size=(5, 5)) + 1e6
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 128, 1000])
+def test_streamed_covariance_equals_one_shot(chunk_size):
+    X = data()
+    accumulator = accumulate((X[i:i + chunk_size] for i in range(0, len(X), chunk_size)), 5)
+    assert len(accumulator) == len(X)
+    np.testing.assert_allclose(accumulator.mean, X.mean(axis=0), rtol=1e-12)
+    np.testing.assert_allclose(accumulator.covariance(), np.cov(X, rowvar=False, ddof=0), rtol=1e-9)
+    np.testing.assert_allclose(accumulator.covariance(ddof=1), np.cov(X, rowvar=False), rtol=1e-9)
+    np.testing.assert_allclose(accumulator.correlation(), np.corrcoef(X, rowvar=False), atol=1e-12)
+
+
+def test_merge_of_partial_accumulators_equals_one_shot():
+    X = data()
+    parts = [X[:1], X[1:300], X[300:], X[:0]]
+    accumulators = [accumulate([part], 5) for part in parts]
+    merged = CovarianceAccumulator(5)
+    for accumulator in accumulators:
+        merged.merge(accumulator)
+    np.testing.assert_allclose(merged.covariance(), np.cov(X, rowvar=False, ddof=0), rtol=1e-9)
+    np.testing.assert_allclose(merged.mean, X.mean(axis=0), rtol=1e-12)
+
+
+def test_constant_column_has_zero_correlation():
+    X = data(200)
+    X[:, 2] = 3.0
+    accumulator = accumulate([X], 5)
+    assert accumulator.std()[2] == 1.0
+    correlation = accumulator.correlation()
+    assert np.all(correlation[2] == 0) and np.all(correlation[:, 2] == 0)
+
+
+def test_rejects_mismatched_input():
+    accumulator = CovarianceAccumulator(5)
+    with pytest.raises(ValueError, match='5 columns'):
+        accumulator.update(np.zeros((3, 4)))
+    with pytest.raises(ValueError, match='feature count mismatch'):
+        accumulator.merge(CovarianceAccumulator(4))
+    with pytest.raises(ValueError, match='not enough rows'):
+        accumulator.covariance()
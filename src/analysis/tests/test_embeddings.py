@@ -0,0 +1,104 @@
+"""embeddings: 近似重複の検出（LSH・連結成分）とクラスタリング"""
+
+import numpy as np
+import pytest
+
+import embeddings
+import feature_store
+
+
+@pytest.fixture
+def store_dir(tmp_path, monkeypatch):
+    """特徴量ストアを一時ディレクトリに作る（相対パスの既定の保存先をテストごとに分ける）"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(feature_store, '_stores', {})
+    return tmp_path
+
+
+def planted_vectors(n=1500, dim=64, seed=0):
+    """ランダムなベクトルと、その一部に小さな摂動を加えた近似重複"""
+    rng = np.random.default_rng(seed)
+    base = rng.standard_normal((n, dim))
+    duplicates = base[:200] + rng.standard_normal((200, dim)) * 0.1
+    vectors = np.vstack([base, duplicates]).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def as_set(pairs):
+    return {tuple(pair) for pair in np.asarray(pairs).tolist()}
+
+
+def test_lsh_pairs_match_exact_pairs(monkeypatch):
+    vectors = planted_vectors()
+    exact = as_set(embeddings._all_similar_pairs(vectors, 0.9))
+    assert len(exact) >= 200
+    monkeypatch.setattr(embeddings, 'EXACT_PAIR_LIMIT', 100)
+    approximate = as_set(embeddings.similar_pairs(vectors, 0.9))
+    # 候補は類似度で検証するため誤検出はなく、近似重複はすべて見つかる
+    assert approximate <= exact
+    assert len(approximate) >= 0.99 * len(exact)
+
+
+def test_connected_components_match_union_find():
+    rng = np.random.default_rng(1)
+    n = 300
+    pairs = np.sort(rng.integers(0, n, size=(200, 2)), axis=1)
+    pairs = pairs[pairs[:, 0] < pairs[:, 1]]
+
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in pairs.tolist():
+        ra, rb = find(a), find(b)
+        parent[max(ra, rb)] = min(ra, rb)
+    expected = np.array([min(i for i in range(n) if find(i) == find(j)) for j in range(n)])
+    np.testing.assert_array_equal(embeddings.connected_components(n, pairs), expected)
+    np.testing.assert_array_equal(embeddings.connected_components(3, np.empty((0, 2), dtype=np.int64)), [0, 1, 2])
+
+
+def test_cluster_texts_groups_near_duplicates():
+    texts = [
+        'エンジン音がとても静かで高級感がある',
+        '加速が力強くてワクワクする',
+        'エンジン音がとても静かで高級感がある！',
+        'ｴﾝｼﾞﾝ音がとても 静かで高級感がある',
+        '電子音が未来的で先進的',
+        '加速が力強くてワクワクする',
+    ]
+    result = embeddings.cluster_texts(texts, method='char-ngram', store=False)
+    assert result['labels'] == [0, 1, 0, 0, 2, 1]
+    assert result['n_unique_texts'] == 4
+    assert [cluster['size'] for cluster in result['clusters']] == [3, 2, 1]
+    # 代表テキストは正規化後に最も多いテキストの最初の表記
+    assert result['clusters'][0]['representative'] == 'エンジン音がとても静かで高級感がある'
+    assert result['clusters'][1]['texts'] == ['加速が力強くてワクワクする']
+
+
+def test_embeddings_are_reused_from_store(store_dir, monkeypatch):
+    texts = ['静かで快適', '力強い加速', '静かで快適']
+    keys = ['e1', 'e2', 'e3']
+    first, method = embeddings.embed_texts(texts, 'char-ngram', keys=keys)
+    assert method == 'char-ngram' and first.dtype == np.float16
+    np.testing.assert_array_equal(first[0], first[2])
+
+    encoded = []
+    encode = embeddings._encode
+    monkeypatch.setattr(embeddings, '_encode', lambda texts, *args: encoded.append(list(texts)) or encode(texts, *args))
+    again, _ = embeddings.embed_texts(['静かで快適', '力強い加速', '新しい回答'], 'char-ngram', keys=['e1', 'e2', 'e4'])
+    # 保存済みで本文が同じ行は計算しない
+    assert encoded == [['新しい回答']]
+    np.testing.assert_array_equal(again[:2], first[:2])
+
+    changed, _ = embeddings.embed_texts(['全く別の回答'], 'char-ngram', keys=['e1'])
+    assert encoded[-1] == ['全く別の回答']
+    assert not np.array_equal(changed[0], first[0])
+
+
+def test_cluster_from_params_validates_keys():
+    result = embeddings.cluster_from_params({'texts': ['a', 'b'], 'keys': ['e1'], 'method': 'char-ngram'})
+    assert result['error'] == 'keys and texts must have the same length'
@@ -0,0 +1,108 @@
+"""evaluation_db: dev.db からの直接読み込み（JSON展開・絞り込み・逐次読み込み）"""
+
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+
+import evaluation_db
+
+
+def reference_rows(path, where=''):
+    """Python 側で sdScores を展開した (評価ID, 音源ID, 実験群, 登録日時, スコア) の一覧（rowid 順）"""
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute(
+            'SELECT e.id, e.audioSampleId, r.experimentGroup, e.createdAt, e.sdScores '
+            f'FROM Evaluation e JOIN Respondent r ON r.id = e.respondentId {where} ORDER BY e.rowid'
+        ).fetchall()
+    return [
+        (eid, sample, group, created, [float(json.loads(sd).get(key, 0)) for key in evaluation_db.SD_SCALE_KEYS])
+        for eid, sample, group, created, sd in rows
+    ]
+
+
+def test_load_sd_scores_matches_json_parsing(survey_db):
+    expected = np.array([row[4] for row in reference_rows(survey_db)])
+    scores = evaluation_db.load_sd_scores(survey_db, batch_size=7)
+    assert scores.dtype == np.float64
+    np.testing.assert_array_equal(scores, expected)
+    # 欠損した尺度は0として読み込まれる
+    with sqlite3.connect(survey_db) as conn:
+        assert conn.execute(
+            "SELECT COUNT(*) FROM Evaluation WHERE json_extract(sdScores, '$.quiet') IS NULL"
+        ).fetchone()[0] > 0
+
+
+@pytest.mark.parametrize('filters', [
+    {'audio_sample_id': 's2'},
+    {'experiment_group': 'B'},
+    {'audio_sample_id': 's1', 'experiment_group': 'A'},
+    {'date_from': 1_700_002_000_000, 'date_to': '2023-11-14T23:00:00Z'},
+])
+def test_filters_match_python_filtering(survey_db, filters):
+    date_from = filters.get('date_from')
+    date_to = filters.get('date_to')
+    expected = np.array([
+        scores for _, sample, group, created, scores in reference_rows(survey_db)
+        if filters.get('audio_sample_id', sample) == sample
+        and filters.get('experiment_group', group) == group
+        and (date_from is None or created >= evaluation_db.to_timestamp_ms(date_from))
+        and (date_to is None or created <= evaluation_db.to_timestamp_ms(date_to))
+    ]).reshape(-1, len(evaluation_db.SD_SCALE_KEYS))
+    assert 0 < len(expected) < len(reference_rows(survey_db))
+    np.testing.assert_array_equal(evaluation_db.load_sd_scores(survey_db, **filters), expected)
+    chunks = list(evaluation_db.iter_sd_score_chunks(survey_db, batch_size=5, **filters))
+    np.testing.assert_array_equal(np.vstack(chunks), expected)
+
+
+def test_chunks_concatenate_to_full_load(survey_db):
+    chunks = list(evaluation_db.iter_sd_score_chunks(survey_db, batch_size=10))
+    assert [len(chunk) for chunk in chunks] == [10] * 7 + [2]
+    np.testing.assert_array_equal(np.vstack(chunks), evaluation_db.load_sd_scores(survey_db))
+
+
+def test_grouped_chunks_carry_labels(survey_db):
+    rows = reference_rows(survey_db)
+    chunks = list(evaluation_db.iter_grouped_sd_score_chunks(
+        ['audioSampleId', 'experimentGroup'], survey_db, batch_size=16,
+    ))
+    np.testing.assert_array_equal(np.vstack([scores for scores, _ in chunks]), [row[4] for row in rows])
+    assert np.concatenate([labels['audioSampleId'] for _, labels in chunks]).tolist() == [row[1] for row in rows]
+    assert np.concatenate([labels['experimentGroup'] for _, labels in chunks]).tolist() == [row[2] for row in rows]
+
+    with pytest.raises(ValueError, match='Unknown group key'):
+        next(evaluation_db.iter_grouped_sd_score_chunks(['gender'], survey_db))
+
+
+def test_free_text_rows_resume_after_watermark(survey_db):
+    with sqlite3.connect(survey_db) as conn:
+        expected = conn.execute(
+            "SELECT id, freeText, createdAt FROM Evaluation WHERE freeText IS NOT NULL AND freeText != '' "
+            'ORDER BY createdAt, id'
+        ).fetchall()
+    rows = list(evaluation_db.iter_free_text_rows(survey_db, batch_size=4))
+    assert [row[:3] for row in rows] == expected
+
+    middle = len(rows) // 2
+    watermark = (rows[middle][2], rows[middle][0])
+    assert [row[:3] for row in evaluation_db.iter_free_text_rows(survey_db, after=watermark)] == expected[middle + 1:]
+    assert evaluation_db.count_free_texts_until(watermark, survey_db) == middle + 1
+
+    assert evaluation_db.evaluation_watermark(survey_db) == {
+        'evaluations': 72,
+        'free_texts': len(expected),
+        'latest_created_at': max(row[3] for row in reference_rows(survey_db)),
+    }
+
+
+def test_missing_database(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        evaluation_db.load_sd_scores(str(tmp_path / 'missing.db'))
+
+
+def test_filter_args_from_api_params():
+    assert evaluation_db.filter_args(None) == {}
+    assert evaluation_db.filter_args({
+        'audioSampleId': 's1', 'experimentGroup': None, 'dateFrom': '', 'dateTo': '2026-01-01', 'other': 'x',
+    }) == {'audio_sample_id': 's1', 'date_to': '2026-01-01'}
@@ -0,0 +1,189 @@
+"""factor_analysis: 学習済みモデルのキャッシュと追記時の再学習"""
+
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import factor_analysis
+from analysis_cache import AnalysisCache
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'factor_analysis.py')
+
+pytestmark = pytest.mark.skipif(not factor_analysis.SKLEARN_AVAILABLE, reason='scikit-learn is not available')
+
+
+def sd_scores(n, seed=0):
+    """2因子構造を持つ8尺度の回答"""
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(size=(n, 2))
+    loadings = np.array([[0.8, 0.0]] * 4 + [[0.0, 0.7]] * 4)
+    return factors @ loadings.T + rng.normal(scale=0.5, size=(n, 8))
+
+
+@pytest.fixture
+def warm_starts(monkeypatch):
+    """再学習の初期値に前回のモデル状態が使われたかを記録する"""
+    monkeypatch.setattr(factor_analysis, 'model_cache', AnalysisCache('factor_model_test', 'test', max_entries=32))
+    fit_scaler = factor_analysis._fit_scaler
+    calls = []
+
+    def recording_fit_scaler(X, previous):
+        calls.append(previous is not None)
+        return fit_scaler(X, previous)
+
+    monkeypatch.setattr(factor_analysis, '_fit_scaler', recording_fit_scaler)
+    return calls
+
+
+def loadings(result):
+    return np.array([[item['loading'] for item in factor['loadings']] for factor in result['factors']]).T
+
+
+def test_appended_rows_warm_start_from_same_source(warm_starts):
+    X = sd_scores(600)
+    source = factor_analysis.data_source({'db': 'survey.db', 'filters': {'experimentGroup': 'A'}})
+    factor_analysis.perform_factor_analysis(X[:500], n_factors=2, source=source)
+    warm = factor_analysis.perform_factor_analysis(X, n_factors=2, source=source)
+    assert warm_starts == [False, True]
+
+    # 追記の経緯に依存するが、最初から学習した結果とは許容誤差の範囲で一致する
+    cold = factor_analysis.perform_factor_analysis(X, n_factors=2, use_cache=False)
+    np.testing.assert_allclose(np.abs(loadings(warm)), np.abs(loadings(cold)), atol=0.02)
+
+
+@pytest.mark.parametrize('second_source, second_factors', [
+    ({'db': 'survey.db', 'filters': {'experimentGroup': 'B'}}, 2),
+    ({'db': 'other.db', 'filters': {'experimentGroup': 'A'}}, 2),
+    ({}, 2),
+    ({'db': 'survey.db', 'filters': {'experimentGroup': 'A'}}, 3),
+])
+def test_state_is_not_shared_across_sources(warm_starts, second_source, second_factors):
+    X = sd_scores(600)
+    first = factor_analysis.data_source({'db': 'survey.db', 'filters': {'experimentGroup': 'A'}})
+    factor_analysis.perform_factor_analysis(X[:500], n_factors=2, source=first)
+    factor_analysis.perform_factor_analysis(
+        X, n_factors=second_factors, source=factor_analysis.data_source(second_source),
+    )
+    assert warm_starts == [False, False]
+
+
+def test_only_strict_supersets_warm_start(warm_starts):
+    X = sd_scores(600)
+    factor_analysis.perform_factor_analysis(X[:500], n_factors=2)
+    # 既存の行が変わった入力・列が減った入力・同じ行数の入力
+    changed = X.copy()
+    changed[0, 0] += 1.0
+    factor_analysis.perform_factor_analysis(changed, n_factors=2)
+    factor_analysis.perform_factor_analysis(X[:, :7], n_factors=2)
+    factor_analysis.perform_factor_analysis(X[:500] * 2, n_factors=2)
+    assert warm_starts == [False, False, False, False]
+
+
+def test_identical_input_is_served_from_cache(warm_starts):
+    X = sd_scores(300)
+    first = factor_analysis.perform_factor_analysis(X, n_factors=2)
+    assert factor_analysis.perform_factor_analysis(X, n_factors=2) == first
+    assert warm_starts == [False]
+
+
+def test_streaming_matches_in_memory_fit():
+    X = sd_scores(2000, seed=1)
+    streamed = factor_analysis.perform_streaming_factor_analysis(
+        (X[i:i + 128] for i in range(0, len(X), 128)), n_factors=2,
+    )
+    one_chunk = factor_analysis.perform_streaming_factor_analysis([X], n_factors=2)
+    np.testing.assert_allclose(loadings(streamed), loadings(one_chunk), atol=1e-10)
+
+    in_memory = factor_analysis.perform_factor_analysis(X, n_factors=2, use_cache=False)
+    np.testing.assert_allclose(np.abs(loadings(streamed)), np.abs(loadings(in_memory)), atol=0.02)
+    np.testing.assert_allclose(
+        np.abs(streamed['factor_scores']), np.abs(in_memory['factor_scores']), atol=0.05,
+    )
+    assert len(streamed['factor_scores']) == factor_analysis.N_FACTOR_SCORES
+
+
+def test_batch_reports_unidentified_factor_counts():
+    result = factor_analysis.perform_batch_from_params({
+        'sd_scores': sd_scores(300).tolist(),
+        'batch': {'n_factors': [0, 2, 4, 5, 8], 'rotations': ['varimax'], 'workers': 1},
+    })
+    assert sorted({solution['n_factors'] for solution in result['solutions']}) == [2, 4]
+    assert all(solution['degrees_of_freedom'] >= 0 for solution in result['solutions'])
+    rejected = {item['n_factors']: item['reason'] for item in result['rejected_n_factors']}
+    assert set(rejected) == {0, 5, 8}
+    assert 'negative degrees of freedom' in rejected[5]
+    assert 'between 1 and 7' in rejected[0] and 'between 1 and 7' in rejected[8]
+
+    # 既定の因子数は全て識別できる
+    default = factor_analysis.perform_batch_from_params({'sd_scores': sd_scores(300).tolist(), 'batch': {}})
+    assert default['rejected_n_factors'] == []
+
+
+@pytest.mark.parametrize('options', [[], ['--streaming']])
+def test_cli_reads_n_factors_from_json(tmp_path, options):
+    path = tmp_path / 'input.json'
+    path.write_text(json.dumps({'sd_scores': sd_scores(200).tolist(), 'n_factors': 2}))
+    completed = subprocess.run(
+        [sys.executable, SCRIPT, '--input', str(path), *options],
+        stdin=subprocess.DEVNULL, capture_output=True, text=True, check=True,
+    )
+    assert len(json.loads(completed.stdout)['factors']) == 2
+
+
+def run_cli(tmp_path, params, *options):
+    path = tmp_path / 'input.json'
+    path.write_text(json.dumps({'sd_scores': sd_scores(200).tolist(), **params}))
+    completed = subprocess.run(
+        [sys.executable, SCRIPT, '--input', str(path), *options],
+        stdin=subprocess.DEVNULL, capture_output=True, text=True,
+    )
+    return completed.returncode, json.loads(completed.stdout)
+
+
+@pytest.mark.parametrize('params, options, expected', [
+    ({'bootstrap': 20, 'confidence': 0.8}, [], 0.8),
+    ({'bootstrap': 20, 'confidence': 0.8}, ['--confidence', '0.9'], 0.9),
+    ({'bootstrap': 20}, [], 0.95),
+])
+def test_cli_confidence_from_json_and_flag(tmp_path, params, options, expected):
+    returncode, result = run_cli(tmp_path, params, *options)
+    assert returncode == 0
+    assert result['bootstrap']['confidence'] == expected
+
+
+@pytest.mark.parametrize('params, options', [
+    ({'bootstrap': 20, 'confidence': 1.5}, []),
+    ({'bootstrap': 20, 'confidence': 0.8}, ['--confidence', '0']),
+])
+def test_cli_rejects_confidence_outside_unit_interval(tmp_path, params, options):
+    returncode, result = run_cli(tmp_path, params, *options)
+    assert returncode == 1
+    assert 'confidence must be between 0 and 1' in result['error']
+
+
+@pytest.mark.parametrize('params, options', [
+    ({'confidence': 1.5}, []),
+    ({}, ['--confidence', '0']),
+])
+def test_cli_ignores_confidence_without_bootstrap(tmp_path, params, options):
+    returncode, result = run_cli(tmp_path, params, *options)
+    assert returncode == 0
+    assert 'error' not in result and 'bootstrap' not in result
+    assert len(result['factors']) == 3
+
+
+def test_bootstrap_intervals_cover_estimate():
+    X = sd_scores(400)
+    wide = factor_analysis.perform_factor_analysis(X, n_factors=2, n_bootstrap=100, confidence=0.95, use_cache=False)
+    narrow = factor_analysis.perform_factor_analysis(X, n_factors=2, n_bootstrap=100, confidence=0.5, use_cache=False)
+    for wide_factor, narrow_factor in zip(wide['factors'], narrow['factors']):
+        for w, n in zip(wide_factor['loadings'], narrow_factor['loadings']):
+            assert w['ci_lower'] <= n['ci_lower'] <= n['ci_upper'] <= w['ci_upper']
+            assert w['ci_lower'] - 1e-9 <= w['loading'] <= w['ci_upper'] + 1e-9
+
+    invalid = factor_analysis.perform_factor_analysis(X, n_factors=2, n_bootstrap=10, confidence=1.0)
+    assert 'confidence must be between 0 and 1' in invalid['error']
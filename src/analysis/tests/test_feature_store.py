@@ -0,0 +1,135 @@
+"""
+特徴量ストア（feature_store.py）のテスト
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import feature_store
+from feature_store import FeatureStore
+
+
+def _rows(n: int, offset: int = 0) -> np.ndarray:
+    return (np.arange(n * 4, dtype=np.float16).reshape(n, 4) + offset)
+
+
+def _segment_files(store: FeatureStore):
+    return sorted(name for name in os.listdir(store.path) if name.startswith(feature_store.SEGMENT_PREFIX))
+
+
+def test_append_reopen_round_trip(tmp_path):
+    store = FeatureStore('vectors', 'v1', str(tmp_path))
+    assert store.append(['a', 'b', 'c'], _rows(3), ['ta', 'tb', 'tc']) == 3
+    assert store.append(['d'], _rows(1, 100)) == 1
+
+    reopened = FeatureStore('vectors', 'v1', str(tmp_path))
+    assert reopened.keys() == ['a', 'b', 'c', 'd']
+    assert reopened.shape == (4,)
+    np.testing.assert_array_equal(reopened.get(['d', 'a']), np.vstack([_rows(1, 100), _rows(3)[:1]]))
+    assert reopened.get(['a']).dtype == np.float16
+    assert reopened.missing(['a', 'b', 'e'], ['ta', 'changed', None]) == [1, 2]
+    assert reopened.stats()['segments'] == 2
+
+
+def test_append_skips_unchanged_and_replaces_changed_tags(tmp_path):
+    store = FeatureStore('vectors', 'v1', str(tmp_path))
+    store.append(['a', 'b'], _rows(2), ['ta', 'tb'])
+
+    assert store.append(['a', 'b'], _rows(2), ['ta', 'tb']) == 0
+    # 同じ呼び出し内で重複するキーは最後の行だけを追記する
+    assert store.append(['b', 'b'], _rows(2, 50), ['tb2', 'tb2']) == 1
+    np.testing.assert_array_equal(store.get(['b']), _rows(2, 50)[1:])
+    assert len(store) == 2
+    assert store.stats()['rows'] == 3
+
+
+def test_other_instance_sees_appends(tmp_path):
+    writer = FeatureStore('vectors', 'v1', str(tmp_path))
+    reader = FeatureStore('vectors', 'v1', str(tmp_path))
+    writer.append(['a'], _rows(1))
+
+    assert 'a' not in reader
+    reader.refresh()
+    np.testing.assert_array_equal(reader.get(['a']), _rows(1))
+
+
+def test_version_change_starts_empty_and_removes_old_segments(tmp_path):
+    FeatureStore('vectors', 'v1', str(tmp_path)).append(['a', 'b'], _rows(2))
+
+    store = FeatureStore('vectors', 'v2', str(tmp_path))
+    assert len(store) == 0
+    store.append(['c'], _rows(1))
+    assert store.keys() == ['c']
+    assert _segment_files(store) == ['segment-000001.keys.json', 'segment-000001.npy']
+    assert len(FeatureStore('vectors', 'v1', str(tmp_path))) == 0
+
+
+def test_append_rejects_mismatched_rows(tmp_path):
+    store = FeatureStore('vectors', 'v1', str(tmp_path))
+    store.append(['a'], _rows(1))
+
+    with pytest.raises(ValueError):
+        store.append(['b'], np.zeros((1, 3), dtype=np.float16))
+    with pytest.raises(ValueError):
+        store.append(['b'], np.zeros((1, 4), dtype=np.float32))
+    with pytest.raises(ValueError):
+        store.append(['b', 'c'], _rows(1))
+
+
+def test_compact_keeps_live_rows_in_one_segment(tmp_path):
+    store = FeatureStore('vectors', 'v1', str(tmp_path))
+    reader = FeatureStore('vectors', 'v1', str(tmp_path))
+    store.append(['a', 'b'], _rows(2), ['ta', 'tb'])
+    store.append(['b', 'c'], _rows(2, 10), ['tb2', None])
+    store.append(['d'], _rows(1, 20))
+    reader.refresh()
+    expected = store.get(['a', 'b', 'c', 'd'])
+
+    assert store.compact() == 1
+    assert store.stats()['segments'] == 1
+    assert store.stats()['rows'] == 4
+    assert _segment_files(store) == ['segment-000004.keys.json', 'segment-000004.npy']
+    np.testing.assert_array_equal(store.get(['a', 'b', 'c', 'd']), expected)
+    assert store.missing(['a', 'b', 'c'], ['ta', 'tb2', None]) == []
+    # 置き換え前のセグメントを読み込んでいたインスタンスも読み込み直す
+    reader.refresh()
+    np.testing.assert_array_equal(reader.get(['a', 'b', 'c', 'd']), expected)
+    assert reader.stats()['segments'] == 1
+
+    assert store.compact() == 0
+    store.append(['e'], _rows(1, 30))
+    assert FeatureStore('vectors', 'v1', str(tmp_path)).keys() == ['a', 'b', 'c', 'd', 'e']
+
+
+def test_append_compacts_past_segment_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(feature_store, 'COMPACT_SEGMENTS', 3)
+    store = FeatureStore('vectors', 'v1', str(tmp_path))
+    for i in range(3):
+        store.append([f'k{i}'], _rows(1, i))
+    assert store.stats()['segments'] == 3
+
+    store.append(['k3'], _rows(1, 3))
+    assert store.stats()['segments'] == 1
+    reopened = FeatureStore('vectors', 'v1', str(tmp_path))
+    np.testing.assert_array_equal(reopened.get(['k3', 'k0']), np.vstack([_rows(1, 3), _rows(1, 0)]))
+
+
+def test_cli_compacts_all_stores(tmp_path):
+    for name in ('first', 'second'):
+        store = FeatureStore(name, 'v1', str(tmp_path))
+        store.append(['a'], _rows(1))
+        store.append(['a', 'b'], _rows(2, 5), ['changed', None])
+
+    script = os.path.join(os.path.dirname(feature_store.__file__), 'feature_store.py')
+    result = subprocess.run(
+        [sys.executable, script, str(tmp_path), '--compact'], capture_output=True, text=True, check=True,
+    )
+    summaries = json.loads(result.stdout)
+    assert [summary['name'] for summary in summaries] == ['first', 'second']
+    assert all(summary['segments'] == 1 and summary['removed_rows'] == 1 for summary in summaries)
+    assert FeatureStore('first', 'v1', str(tmp_path)).keys() == ['a', 'b']
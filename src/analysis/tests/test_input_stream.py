@@ -0,0 +1,68 @@
+"""分析スクリプト共通の入力処理のテスト"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from input_stream import build_parser, chunked, has_input, iter_ndjson, load_json_input, record_text
+
+ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PIPED = json.dumps({'free_texts': ['静か']}).encode('utf-8')
+
+# 標準入力の状態ごとに has_input と読み込んだ入力を出力するスクリプト
+PROBE = '''
+import json, sys
+from input_stream import build_parser, has_input, load_json_input
+args = build_parser('probe').parse_args(sys.argv[1:])
+present = has_input(args)
+print(json.dumps({'has_input': present, 'data': load_json_input(args) if present else None}))
+'''
+
+
+def probe(argv, stdin):
+    """stdin に subprocess.DEVNULL（空の入力）または送り込むJSONのバイト列を渡す"""
+    options = {'input': stdin} if isinstance(stdin, bytes) else {'stdin': stdin}
+    completed = subprocess.run(
+        [sys.executable, '-c', PROBE, *argv],
+        cwd=ANALYSIS_DIR, capture_output=True, timeout=30, **options,
+    )
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout)
+
+
+def test_empty_stdin_is_no_input():
+    # Node の spawn・cron と同じく、端末でも空でもない入力として /dev/null を渡す
+    assert probe([], subprocess.DEVNULL) == {'has_input': False, 'data': None}
+
+
+def test_piped_json_is_read_after_peeking():
+    assert probe([], PIPED) == {'has_input': True, 'data': {'free_texts': ['静か']}}
+
+
+def test_explicit_arguments_take_priority():
+    assert probe(['{"a": 1}'], subprocess.DEVNULL) == {'has_input': True, 'data': {'a': 1}}
+    assert probe(['--input', '-'], PIPED)['has_input'] is True
+
+
+def test_input_file(tmp_path):
+    path = tmp_path / 'input.json'
+    path.write_text('{"sd_scores": [[1, 2]]}', encoding='utf-8')
+    args = build_parser('test').parse_args(['--input', str(path)])
+    assert has_input(args)
+    assert load_json_input(args) == {'sd_scores': [[1, 2]]}
+
+
+def test_ndjson_and_records():
+    lines = ['"静か"', '', '{"text": "快適"}', '{"freeText": "高級"}', '{"id": 1}']
+    records = list(iter_ndjson(iter(line + '\n' for line in lines)))
+    assert [record_text(record) for record in records] == ['静か', '快適', '高級', None]
+
+
+@pytest.mark.parametrize('size', [1, 2, 5])
+def test_chunked(size):
+    chunks = list(chunked(range(5), size))
+    assert [item for chunk in chunks for item in chunk] == list(range(5))
+    assert all(len(chunk) == size for chunk in chunks[:-1])
@@ -0,0 +1,70 @@
+"""keywords: 配列による文書別上位語の抽出と頻度の集計"""
+
+import random
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from corpus import Vocabulary, tokenize_corpus
+from keywords import KeywordCounter, top_document_keywords
+
+WORDS = [f'w{i}' for i in range(40)]
+
+
+def random_texts(n, seed=0):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 30))) for _ in range(n)]
+
+
+def baseline_totals(texts: List[str], top_n: int = 10) -> List[Tuple[str, int]]:
+    """変更前の実装（文書ごとに辞書で数えて安定ソートし、上位語の頻度を辞書に加算）"""
+    totals: Dict[str, int] = {}
+    for text in texts:
+        freq: Dict[str, int] = {}
+        for token in text.split():
+            freq[token] = freq.get(token, 0) + 1
+        for word, count in sorted(freq.items(), key=lambda x: x[1], reverse=True)[:top_n]:
+            totals[word] = totals.get(word, 0) + count
+    return sorted(totals.items(), key=lambda x: x[1], reverse=True)
+
+
+def test_top_document_keywords_matches_per_document_sort():
+    texts = random_texts(50)
+    corpus = tokenize_corpus(texts, str.split)
+    ids, counts = top_document_keywords(
+        np.frombuffer(corpus.tokens, dtype=np.uint32), np.frombuffer(corpus.offsets, dtype=np.uint64), top_n=5,
+    )
+    expected = [pair for text in texts for pair in baseline_totals([text], top_n=5)]
+    assert [(corpus.vocabulary.token(int(i)), int(c)) for i, c in zip(ids, counts)] == expected
+
+
+def test_counter_top_matches_dictionary_totals():
+    texts = random_texts(200, seed=1)
+    # 語彙が増えるたびに配列を拡張する
+    counter = KeywordCounter(Vocabulary(), capacity=4)
+    counter.add_documents(tokenize_corpus(texts, str.split, counter.vocabulary))
+    assert counter.top(len(WORDS)) == baseline_totals(texts)
+    assert counter.top(7) == baseline_totals(texts)[:7]
+    assert len(counter) == len(baseline_totals(texts))
+
+
+def test_merge_of_split_corpus_equals_single_pass():
+    texts = random_texts(120, seed=2)
+    single = KeywordCounter(Vocabulary())
+    single.add_documents(tokenize_corpus(texts, str.split, single.vocabulary))
+
+    merged = KeywordCounter(Vocabulary())
+    for start in range(0, len(texts), 25):
+        # 別プロセスの集計と同じく、語彙を共有しない部分集計を統合する
+        part = KeywordCounter(Vocabulary(), capacity=1)
+        part.add_documents(tokenize_corpus(texts[start:start + 25], str.split, part.vocabulary))
+        merged.merge(part)
+    assert merged.top(len(WORDS)) == single.top(len(WORDS))
+
+
+def test_empty_input():
+    counter = KeywordCounter(Vocabulary())
+    counter.add_documents(tokenize_corpus(['', ''], str.split, counter.vocabulary))
+    assert counter.top() == [] and len(counter) == 0
+    ids, counts = top_document_keywords(np.zeros(0), np.zeros(1))
+    assert len(ids) == 0 and len(counts) == 0
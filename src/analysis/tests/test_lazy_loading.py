@@ -0,0 +1,35 @@
+"""improved_nlp の遅延読み込みのテスト（別プロセスでインポート直後の状態を確認）"""
+
+import json
+import os
+import subprocess
+import sys
+
+ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import json, sys
+import improved_nlp
+imported = {name: name in sys.modules for name in ('MeCab', 'torch', 'transformers', 'scipy.sparse')}
+result = improved_nlp.analyze_free_texts_improved(['静かで快適', '力強い'], analyses=('keywords', 'cooccurrences'))
+print(json.dumps({
+    'imported': imported,
+    'bert_loaded': improved_nlp._bert_loaded,
+    'after': 'torch' in sys.modules,
+    'keys': sorted(result),
+}))
+'''
+
+
+def test_import_and_keyword_analysis_do_not_load_models():
+    completed = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=ANALYSIS_DIR, capture_output=True, timeout=60,
+        stdin=subprocess.DEVNULL, env={**os.environ, 'ANALYSIS_CACHE_PATH': ''},
+    )
+    assert completed.returncode == 0, completed.stderr
+    state = json.loads(completed.stdout)
+    assert not any(state['imported'].values())
+    # 感情分析を含まない場合はBERTを読み込まない
+    assert state['bert_loaded'] is False
+    assert state['after'] is False
+    assert state['keys'] == ['analysis_method', 'analyzed_texts', 'cooccurrences', 'keywords', 'total_texts']
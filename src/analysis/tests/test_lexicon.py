@@ -0,0 +1,62 @@
+"""感情極性辞書マッチャーのテスト（部分文字列の走査との一致）"""
+
+import random
+
+import pytest
+
+from lexicon import DEFAULT_LEXICON, LexiconMatcher, build_default_matcher, load_lexicon
+
+
+def substring_score(lexicon, text):
+    """変更前の実装（辞書の語ごとに部分文字列として含まれるかを調べる）"""
+    score = 0.0
+    for word, weight in lexicon.items():
+        if word in text:
+            score += weight
+    return max(-1.0, min(1.0, score))
+
+
+def test_default_lexicon_matches_substring_scan():
+    texts = [
+        '静かで心地よい', 'うるさいし不快', '気に入らないが快適', '良い良い良い', '',
+        '素晴らしいけどうっとうしい', 'いい音で満足、好き', '悪くない', '気に入った',
+    ]
+    matcher = LexiconMatcher(DEFAULT_LEXICON)
+    for text in texts:
+        assert matcher.score(text) == pytest.approx(substring_score(DEFAULT_LEXICON, text))
+    assert matcher.score_batch(texts) == [matcher.score(text) for text in texts]
+
+
+def test_overlapping_words_match_like_substring_search():
+    # 接頭辞・接尾辞・内部で重なる語を含む小さなアルファベットの辞書
+    rng = random.Random(0)
+    alphabet = 'あいうえ'
+    for _ in range(50):
+        words = {''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(12)}
+        lexicon = {word: rng.choice([-0.3, -0.1, 0.1, 0.2]) for word in words}
+        matcher = LexiconMatcher(lexicon)
+        for _ in range(30):
+            text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+            found = {matcher.words[word_id] for word_id in matcher.matches(text)}
+            assert found == {word for word in lexicon if word in text}
+            assert matcher.score(text) == pytest.approx(substring_score(lexicon, text))
+
+
+def test_empty_word_is_ignored():
+    matcher = LexiconMatcher({'': 1.0, '良い': 0.2})
+    assert matcher.words == ['良い']
+    assert matcher.score('') == 0.0
+
+
+def test_load_lexicon_tsv_and_json(tmp_path):
+    tsv = tmp_path / 'lexicon.tsv'
+    tsv.write_text('# コメント\n静か\t0.5\n騒音\t-0.4\n快適\n', encoding='utf-8')
+    assert load_lexicon(str(tsv)) == {'静か': 0.5, '騒音': -0.4, '快適': 0.2}
+    data = tmp_path / 'lexicon.json'
+    data.write_text('{"静か": 1}', encoding='utf-8')
+    assert load_lexicon(str(data)) == {'静か': 1.0}
+
+
+def test_missing_lexicon_file_falls_back_to_default(tmp_path):
+    matcher = build_default_matcher(str(tmp_path / 'missing.tsv'))
+    assert set(matcher.words) == set(DEFAULT_LEXICON)
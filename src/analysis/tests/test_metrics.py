@@ -0,0 +1,97 @@
+"""metrics: 処理段階の計測・無効時の差し替え・NDJSONトレース"""
+
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import metrics
+
+FACTOR_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'factor_analysis.py')
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    yield
+    metrics.begin(enabled=False)
+
+
+def test_recorder_collects_stages_counts_and_values():
+    metrics.begin(enabled=True)
+    assert metrics.is_enabled()
+    for _ in range(2):
+        with metrics.stage('tokenize'):
+            pass
+    metrics.count('texts', 3)
+    metrics.count('texts')
+    metrics.record('cache', {'hits': 1})
+
+    snapshot = metrics.attach({})['metrics']
+    assert snapshot['stages']['tokenize']['calls'] == 2
+    assert snapshot['stages']['tokenize']['seconds'] >= 0
+    assert snapshot['counts'] == {'texts': 4}
+    assert snapshot['cache'] == {'hits': 1}
+    assert snapshot['wall_seconds'] >= 0 and snapshot['peak_rss_mb'] > 0
+
+
+def test_attach_returns_new_dict_without_mutating_cached_result():
+    cached = {'keywords': []}
+    metrics.begin(enabled=True)
+    result = metrics.attach(cached)
+    assert result is not cached
+    assert 'metrics' in result
+    assert cached == {'keywords': []}
+
+
+def test_disabled_metrics_add_no_keys(monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_ENABLED', False)
+    monkeypatch.setattr(metrics, 'TRACE_PATH', None)
+    metrics.begin()
+    assert not metrics.is_enabled()
+    with metrics.stage('tokenize'):
+        metrics.count('texts', 3)
+        metrics.record('cache', {'hits': 1})
+    result = {'keywords': []}
+    assert metrics.attach(result) is result
+    assert result == {'keywords': []}
+
+
+def test_trace_writes_one_json_line_per_event(tmp_path):
+    path = tmp_path / 'trace.ndjson'
+    path.write_text('{"event": "earlier"}\n')
+    # トレース出力のみの指定でも計測は有効になる
+    metrics.begin(trace_path=str(path))
+    with metrics.stage('load'):
+        pass
+    with metrics.stage('fit'):
+        pass
+    metrics.attach({})
+    metrics.begin(enabled=False)
+
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [event['event'] for event in events] == ['earlier', 'stage', 'stage', 'summary']
+    assert [event.get('name') for event in events[1:3]] == ['load', 'fit']
+    assert all({'ts', 'pid', 'script'} <= set(event) for event in events[1:])
+    assert events[3]['stages']['fit']['calls'] == 1
+
+
+def test_cli_trace_appends_ndjson(tmp_path):
+    pytest.importorskip('sklearn')
+    rng = np.random.default_rng(0)
+    data = tmp_path / 'input.json'
+    data.write_text(json.dumps({'sd_scores': rng.integers(-3, 4, size=(60, 8)).tolist(), 'n_factors': 2}))
+    trace = tmp_path / 'trace.ndjson'
+    for _ in range(2):
+        completed = subprocess.run(
+            [sys.executable, FACTOR_SCRIPT, '--input', str(data), '--trace', str(trace)],
+            stdin=subprocess.DEVNULL, capture_output=True, text=True, check=True,
+        )
+        assert 'metrics' in json.loads(completed.stdout)
+
+    events = [json.loads(line) for line in trace.read_text().splitlines()]
+    assert [event['event'] for event in events].count('summary') == 2
+    assert {event['script'] for event in events} == {'factor_analysis.py'}
+    assert {'standardize', 'fit'} <= {event['name'] for event in events if event['event'] == 'stage'}
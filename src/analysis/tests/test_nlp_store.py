@@ -0,0 +1,134 @@
+"""差分更新版NLP分析（結果ストア・評価データベースの基準点）のテスト"""
+
+import sqlite3
+from typing import Dict, List
+
+import pytest
+
+import improved_nlp
+
+TEXTS = [
+    '静かで高級感がある',
+    'エンジン音が力強い',
+    '静かで快適な音',
+    '高級感のある低音',
+    '力強い加速と静か',
+    '快適な静か',
+]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Evaluation テーブルのうち自由記述の解析に使う列だけを持つデータベース"""
+    path = str(tmp_path / 'dev.db')
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE Evaluation (id TEXT PRIMARY KEY, freeText TEXT, createdAt INTEGER NOT NULL)')
+        # 登録日時の順と rowid の順をずらす（全件解析は rowid 順）
+        for i, text in enumerate(TEXTS):
+            conn.execute('INSERT INTO Evaluation VALUES (?, ?, ?)', (f'e{i}', text, 1000 - i))
+        conn.execute("INSERT INTO Evaluation VALUES ('blank', '', 5000)")
+    return path
+
+
+def db_texts(path: str) -> List[str]:
+    with sqlite3.connect(path) as conn:
+        return [text for (text,) in conn.execute(
+            "SELECT freeText FROM Evaluation WHERE freeText IS NOT NULL AND freeText != '' ORDER BY rowid"
+        )]
+
+
+def full_analysis(texts: List[str]) -> Dict:
+    return improved_nlp.analyze_free_texts_improved(texts, analyses=('keywords', 'cooccurrences'), workers=1)
+
+
+def baseline_keyword_order(texts: List[str]) -> List[Dict]:
+    """変更前の実装と同じ集計（辞書の挿入順＝初出順で同頻度を並べる）"""
+    totals: Dict[str, int] = {}
+    for text in texts:
+        for word, freq in improved_nlp.extract_keywords_improved(text, top_n=10):
+            totals[word] = totals.get(word, 0) + freq
+    ranked = sorted(totals.items(), key=lambda x: x[1], reverse=True)[:20]
+    return [{'word': word, 'frequency': freq} for word, freq in ranked]
+
+
+def assert_matches_full(result: Dict, texts: List[str]) -> None:
+    full = full_analysis(texts)
+    assert result['keywords'] == full['keywords'] == baseline_keyword_order(texts)
+    assert result['cooccurrences'] == full['cooccurrences']
+    assert result['analyzed_texts'] == len(texts)
+
+
+def test_db_mode_matches_full_analysis_and_reads_only_new_rows(db_path, tmp_path):
+    store = str(tmp_path / 'nlp.db')
+    first = improved_nlp.analyze_free_texts_from_db(db_path, store)
+    assert first['incremental'] is False
+    assert first['new_texts'] == len(TEXTS)
+    assert_matches_full(first, db_texts(db_path))
+
+    second = improved_nlp.analyze_free_texts_from_db(db_path, store)
+    assert second['incremental'] is True
+    assert second['new_texts'] == 0
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO Evaluation VALUES ('new', '静かで力強い低音', 2000)")
+    third = improved_nlp.analyze_free_texts_from_db(db_path, store)
+    assert third['incremental'] is True
+    assert third['new_texts'] == 1
+    assert_matches_full(third, db_texts(db_path))
+
+
+def test_db_mode_rescans_after_delete_or_backdated_insert(db_path, tmp_path):
+    store = str(tmp_path / 'nlp.db')
+    improved_nlp.analyze_free_texts_from_db(db_path, store)
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM Evaluation WHERE id = 'e0'")
+    deleted = improved_nlp.analyze_free_texts_from_db(db_path, store)
+    assert deleted['incremental'] is False
+    assert deleted['removed_texts'] == 1
+    assert_matches_full(deleted, db_texts(db_path))
+
+    # 基準点より前の登録日時で追加された回答も件数の変化で検出する
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO Evaluation VALUES ('old', '昔の静かな音', 1)")
+    backdated = improved_nlp.analyze_free_texts_from_db(db_path, store)
+    assert backdated['incremental'] is False
+    assert backdated['new_texts'] == 1
+    assert_matches_full(backdated, db_texts(db_path))
+
+
+def test_records_mode_keeps_first_occurrence_tie_order(tmp_path):
+    store = str(tmp_path / 'nlp.db')
+    records = [{'id': f'r{i}', 'text': text} for i, text in enumerate(TEXTS)]
+    assert_matches_full(improved_nlp.analyze_free_texts_incremental(records, store), TEXTS)
+
+    # 並び順だけが変わった場合も初出順を作り直す
+    reordered = list(reversed(records))
+    result = improved_nlp.analyze_free_texts_incremental(reordered, store)
+    assert result['new_texts'] == 0
+    assert_matches_full(result, [record['text'] for record in reordered])
+
+    changed = reordered[:-1] + [{'id': 'r0', 'text': '全く別の回答'}]
+    result = improved_nlp.analyze_free_texts_incremental(changed, store)
+    assert result['new_texts'] == 1
+    assert_matches_full(result, [record['text'] for record in changed])
+
+
+def test_store_is_rebuilt_when_tokenizer_or_sentiment_version_changes(tmp_path, monkeypatch):
+    store = str(tmp_path / 'nlp.db')
+    records = [{'id': f'r{i}', 'text': text} for i, text in enumerate(TEXTS)]
+    assert improved_nlp.analyze_free_texts_incremental(records, store)['new_texts'] == len(TEXTS)
+    assert improved_nlp.analyze_free_texts_incremental(records, store)['new_texts'] == 0
+
+    # 辞書・モデルが変わった場合は全件を解析し直し、累積値に古い結果を残さない
+    monkeypatch.setattr(improved_nlp.token_cache, 'version', 'other-dictionary')
+    result = improved_nlp.analyze_free_texts_incremental(records, store)
+    assert result['new_texts'] == len(TEXTS)
+    assert_matches_full(result, TEXTS)
+
+    monkeypatch.setattr(improved_nlp, '_result_versions', lambda: {
+        'analysis_method': 'simple', 'token_version': 'other-dictionary', 'sentiment_version': 'int8',
+    })
+    result = improved_nlp.analyze_free_texts_incremental(records, store)
+    assert result['new_texts'] == len(TEXTS)
+    assert result['analyzed_texts'] == len(TEXTS)
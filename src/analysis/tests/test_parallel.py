@@ -0,0 +1,36 @@
+"""並列処理ユーティリティと並列版NLP分析のテスト"""
+
+import os
+import time
+
+import improved_nlp
+from parallel import ordered_parallel_map, resolve_workers
+
+
+def slow_square(value: int) -> int:
+    # 後から投入したタスクが先に終わるようにする
+    time.sleep(0.01 * (5 - value % 5))
+    return value * value
+
+
+def test_ordered_parallel_map_keeps_input_order():
+    results = list(ordered_parallel_map(slow_square, iter(range(20)), workers=3))
+    assert results == [(value, value * value) for value in range(20)]
+
+
+def test_resolve_workers():
+    assert resolve_workers(3) == 3
+    assert resolve_workers(0) == (os.cpu_count() or 1)
+
+
+def test_parallel_analysis_matches_sequential(monkeypatch):
+    monkeypatch.setattr(improved_nlp, 'STREAM_CHUNK_SIZE', 3)
+    texts = [
+        '静かで高級感がある', 'エンジン音が力強い', '', '静かで快適な音', '高級感のある低音',
+        '力強い加速と静か', '快適な静か', '不快な高音', 'うるさいが力強い', '静か',
+    ]
+    options = {'analyses': ('keywords', 'cooccurrences', 'sentiment'), 'cooccurrence_scoring': 'npmi'}
+    sequential = improved_nlp.analyze_free_texts_improved(texts, workers=1, **options)
+    parallel = improved_nlp.analyze_free_texts_improved(texts, workers=2, **options)
+    assert parallel == sequential
+    assert sequential['total_texts'] == 10 and sequential['analyzed_texts'] == 9
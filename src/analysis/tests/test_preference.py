@@ -0,0 +1,115 @@
+"""preference: Bradley–Terry モデルの推定"""
+
+import sqlite3
+
+import numpy as np
+import pytest
+
+import preference
+from analysis_cache import AnalysisCache
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    """前回の推定値をテストごとに空にする"""
+    monkeypatch.setattr(preference, 'state_cache', AnalysisCache('preference_test', 'test', max_entries=256))
+
+
+def test_two_items_closed_form():
+    # a が b に3勝1敗なら、最尤推定の強度比は 3:1
+    wins = np.array([[0.0, 3.0], [1.0, 0.0]])
+    model = preference.fit_bradley_terry(wins, prior=0)
+    assert model['converged']
+    assert model['utility'][0] - model['utility'][1] == pytest.approx(np.log(3.0))
+    np.testing.assert_allclose(model['share'], [0.75, 0.25])
+    assert model['win_probability'][0, 1] == pytest.approx(0.75)
+    assert model['log_likelihood'] == pytest.approx(3 * np.log(0.75) + np.log(0.25))
+
+
+def test_fixed_comparisons_satisfy_likelihood_equations():
+    # 4音源の固定の勝敗数（wins[i, j] = i が j に勝った回数）
+    wins = np.array([
+        [0, 7, 9, 12],
+        [5, 0, 6, 10],
+        [3, 6, 0, 8],
+        [1, 2, 4, 0],
+    ], dtype=np.float64)
+    model = preference.fit_bradley_terry(wins, prior=0)
+    strength = np.exp(model['utility'])
+    totals = wins + wins.T
+    expected_wins = (totals * strength[:, None] / (strength[:, None] + strength[None, :])).sum(axis=1)
+    # 最尤推定では各音源の勝ち数の期待値が観測値に一致する
+    np.testing.assert_allclose(expected_wins, wins.sum(axis=1), rtol=1e-6)
+    assert model['utility'].mean() == pytest.approx(0.0, abs=1e-12)
+    assert list(np.argsort(-model['utility'])) == [0, 1, 2, 3]
+    assert np.all(model['standard_error'] > 0)
+
+
+def test_recovers_simulated_utilities():
+    rng = np.random.default_rng(0)
+    utility = np.array([1.0, 0.5, 0.0, -0.5, -1.0])
+    n = len(utility)
+    wins = np.zeros((n, n))
+    for _ in range(20000):
+        i, j = rng.choice(n, size=2, replace=False)
+        p = 1.0 / (1.0 + np.exp(utility[j] - utility[i]))
+        if rng.random() < p:
+            wins[i, j] += 1
+        else:
+            wins[j, i] += 1
+    model = preference.fit_bradley_terry(wins)
+    np.testing.assert_allclose(model['utility'], utility - utility.mean(), atol=3 * model['standard_error'].max())
+
+
+def test_prior_keeps_undefeated_items_finite():
+    wins = np.array([[0, 5, 5], [0, 0, 2], [0, 1, 0]], dtype=np.float64)
+    model = preference.fit_bradley_terry(wins)
+    assert np.all(np.isfinite(model['utility']))
+    assert model['utility'][0] == model['utility'].max()
+
+
+def test_warm_start_reaches_same_estimate_faster():
+    wins = np.array([[0, 7, 9], [5, 0, 6], [3, 6, 0]], dtype=np.float64)
+    cold = preference.fit_bradley_terry(wins)
+    warm = preference.fit_bradley_terry(wins + np.eye(3)[[1, 2, 0]], initial=cold['utility'])
+    reference = preference.fit_bradley_terry(wins + np.eye(3)[[1, 2, 0]])
+    np.testing.assert_allclose(warm['utility'], reference['utility'], atol=1e-7)
+    assert warm['n_iter'] < reference['n_iter']
+
+
+def test_database_segments_and_warm_start(survey_db):
+    with sqlite3.connect(survey_db) as conn:
+        expected = dict(conn.execute(
+            'SELECT bestAudioId, COUNT(*) FROM BestWorstComparison GROUP BY 1'
+        ).fetchall())
+
+    params = {'db': survey_db, 'segment_by': ['gender'], 'workers': 1}
+    first = preference.perform_preference_from_params(params)
+    assert first['n_comparisons'] == 24
+    assert {item['id']: item['wins'] for item in first['items']} == {
+        sample: expected.get(sample, 0) for sample in ('s1', 's2', 's3')
+    }
+    assert [segment['segment'] for segment in first['segments']] == ['m', 'f']
+    assert sum(segment['n_comparisons'] for segment in first['segments']) == 24
+    assert first['model']['warm_start'] is False
+
+    second = preference.perform_preference_from_params(params)
+    assert second['model']['warm_start'] is True
+    for a, b in zip(first['items'], second['items']):
+        assert a['id'] == b['id']
+        assert a['utility'] == pytest.approx(b['utility'], abs=1e-7)
+
+
+def test_records_input_and_unknown_segment():
+    records = [
+        {'bestAudioId': 'a', 'worstAudioId': 'b', 'ageGroup': '20-29'},
+        {'bestAudioId': 'a', 'worstAudioId': 'c', 'ageGroup': '30-39'},
+        {'bestAudioId': 'b', 'worstAudioId': 'c', 'ageGroup': '20-29'},
+        {'bestAudioId': 'c', 'worstAudioId': 'c', 'ageGroup': '20-29'},
+    ]
+    result = preference.perform_preference_from_params({'comparisons': records, 'segment_by': ['ageGroup']})
+    assert [item['id'] for item in result['items']] == ['a', 'b', 'c']
+    assert result['n_comparisons'] == 3
+
+    error = preference.perform_preference_from_params({'comparisons': records, 'segment_by': ['income']})
+    assert 'Unknown segment' in error['error']
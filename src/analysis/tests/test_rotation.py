@@ -0,0 +1,90 @@
+"""rotation: バリマックス・プロマックス回転による単純構造の復元"""
+
+import numpy as np
+import pytest
+
+from rotation import promax, rotate, varimax
+
+# 単純構造の因子負荷量（尺度 × 因子）
+SIMPLE = np.array([
+    [0.8, 0.0], [0.7, 0.0], [0.75, 0.0], [0.6, 0.0],
+    [0.0, 0.8], [0.0, 0.7], [0.0, 0.65], [0.0, 0.75],
+])
+# 小さな交差負荷を持つ構造（交差負荷が厳密に0だと、正規化後の行が2方向に縮退してバリマックスが振動する）
+CROSS = np.array([
+    [0.8, 0.05], [0.7, -0.05], [0.75, 0.1], [0.6, 0.0],
+    [0.05, 0.8], [-0.1, 0.7], [0.0, 0.65], [0.1, 0.75],
+])
+
+
+def rotation_matrix(theta):
+    return np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+
+
+def align(reference, loadings):
+    """因子の順序と符号を reference に揃える（2因子）"""
+    if np.abs(reference.T @ loadings[:, ::-1]).trace() > np.abs(reference.T @ loadings).trace():
+        loadings = loadings[:, ::-1]
+    return loadings * np.sign(np.sum(reference * loadings, axis=0))
+
+
+@pytest.mark.parametrize('theta', [0.3, 0.7, -1.1])
+def test_varimax_recovers_orthogonal_rotation(theta):
+    result = varimax(SIMPLE @ rotation_matrix(theta))
+    np.testing.assert_allclose(align(SIMPLE, result['loadings']), SIMPLE, atol=0.005)
+    np.testing.assert_allclose(result['rotation'] @ result['rotation'].T, np.eye(2), atol=1e-12)
+    np.testing.assert_allclose(SIMPLE @ rotation_matrix(theta) @ result['rotation'], result['loadings'])
+
+
+def test_varimax_matches_sklearn():
+    decomposition = pytest.importorskip('sklearn.decomposition')
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 3)) @ rng.normal(size=(3, 8)) + rng.normal(size=(500, 8))
+    unrotated = decomposition.FactorAnalysis(3, random_state=0).fit(X).components_.T
+    rotated = decomposition.FactorAnalysis(3, random_state=0, rotation='varimax').fit(X).components_.T
+    np.testing.assert_allclose(varimax(unrotated)['loadings'], rotated, atol=1e-12)
+
+
+def test_kaiser_normalized_varimax_does_not_depend_on_communalities():
+    rng = np.random.default_rng(1)
+    loadings = rng.normal(size=(8, 3))
+    scales = rng.uniform(0.2, 2.0, size=(8, 1))
+    options = {'tol': 1e-12, 'max_iter': 1000}
+    normalized = varimax(loadings, normalize=True, **options)
+    # 尺度ごとに負荷量の大きさを変えても回転は変わらない（正規化なしでは変わる）
+    np.testing.assert_allclose(
+        varimax(loadings * scales, normalize=True, **options)['rotation'], normalized['rotation'], atol=1e-8
+    )
+    np.testing.assert_allclose(normalized['loadings'], loadings @ normalized['rotation'])
+    assert not np.allclose(
+        varimax(loadings * scales, **options)['rotation'], varimax(loadings, **options)['rotation'], atol=1e-3
+    )
+    # 共通性が0の尺度があっても回転できる
+    with_zero = varimax(np.vstack([loadings, np.zeros((1, 3))]), normalize=True, **options)['loadings']
+    assert np.isfinite(with_zero).all()
+    np.testing.assert_array_equal(with_zero[-1], 0.0)
+
+
+@pytest.mark.parametrize('theta', [0.0, 0.3, 0.7, -1.1])
+def test_promax_recovers_correlated_factors(theta):
+    factor_correlation = np.array([[1.0, 0.4], [0.4, 1.0]])
+    # パターン行列が CROSS・因子間相関 0.4 となる直交解を任意に回転したもの
+    unrotated = CROSS @ np.linalg.cholesky(factor_correlation) @ rotation_matrix(theta)
+    result = promax(unrotated)
+    loadings = align(CROSS, result['loadings'])
+    np.testing.assert_allclose(loadings, CROSS, atol=0.02)
+    np.testing.assert_allclose(np.abs(result['factor_correlation']), np.abs(factor_correlation), atol=0.02)
+    # パターン行列と因子間相関から元の共通性の構造が再現される
+    np.testing.assert_allclose(
+        result['loadings'] @ result['factor_correlation'] @ result['loadings'].T,
+        unrotated @ unrotated.T,
+        atol=1e-10,
+    )
+
+
+def test_rotate_dispatch():
+    assert rotate(SIMPLE, None)['loadings'] is SIMPLE
+    np.testing.assert_array_equal(rotate(SIMPLE, 'none')['rotation'], np.eye(2))
+    assert set(rotate(SIMPLE, 'promax')) == {'loadings', 'rotation', 'factor_correlation'}
+    with pytest.raises(ValueError, match='Unknown rotation'):
+        rotate(SIMPLE, 'oblimin')
@@ -0,0 +1,97 @@
+"""scheduler: スナップショットのバージョン管理と失敗した分析の扱い"""
+
+import json
+import os
+
+import pytest
+
+import improved_nlp
+import scheduler
+
+
+def write_file(directory, name, data):
+    with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+def test_next_version_uses_highest_saved_file(tmp_path):
+    directory = str(tmp_path)
+    assert scheduler.next_version(directory) == 1
+    write_file(directory, 'analysis-000007-20260101T000000Z.json', {})
+    write_file(directory, 'analysis-000012-20260102T000000Z.json', {})
+    write_file(directory, 'analysis-notes.json', {})
+    # latest.json が前のバージョンを指していても既存のファイルを上書きしない
+    assert scheduler.next_version(directory, {'version': 3}) == 13
+    assert scheduler.next_version(directory, {'version': 20}) == 21
+
+
+def test_prune_by_version_number(tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler, 'KEEP_SNAPSHOTS', 2)
+    directory = str(tmp_path)
+    for version in (999998, 999999):
+        write_file(directory, f'analysis-{version:06d}-20260101T000000Z.json', {})
+    scheduler.write_snapshot({'version': 1000000, 'generated_at_ms': 0}, directory)
+    assert [version for version, _ in scheduler.snapshot_history(directory)] == [999999, 1000000]
+    with open(os.path.join(directory, scheduler.LATEST_NAME), encoding='utf-8') as f:
+        assert json.load(f)['version'] == 1000000
+
+
+def test_refresh_keeps_previous_good_section(survey_db, tmp_path, monkeypatch):
+    directory = str(tmp_path / 'snapshots')
+    first = scheduler.refresh(survey_db, directory)
+    assert first['refreshed'] and first['version'] == 1 and 'errors' not in first
+    good = scheduler.latest_snapshot(directory)
+    assert good['section_versions'] == {'nlp': 1, 'factor_analysis': 1}
+
+    def failing_analysis(texts):
+        raise RuntimeError('model crashed')
+
+    monkeypatch.setattr(improved_nlp, 'analyze_free_texts_improved', failing_analysis)
+    second = scheduler.refresh(survey_db, directory, force=True)
+    assert second['version'] == 2
+    assert second['errors'] == {'nlp': 'model crashed'}
+
+    latest = scheduler.latest_snapshot(directory)
+    assert latest['nlp'] == good['nlp']
+    assert latest['section_versions'] == {'nlp': 1, 'factor_analysis': 2}
+    assert latest['watermark'] == good['watermark']
+
+    # 続けて失敗しても、結果を計算したバージョンは最初のまま
+    scheduler.refresh(survey_db, directory, force=True)
+    assert scheduler.latest_snapshot(directory)['section_versions']['nlp'] == 1
+
+
+def test_initial_failure_is_kept_as_error(survey_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        scheduler.factor_analysis, 'perform_factor_analysis', lambda *args, **kwargs: {'error': 'singular'}
+    )
+    summary = scheduler.refresh(survey_db, str(tmp_path))
+    assert 'errors' not in summary
+    assert scheduler.latest_snapshot(str(tmp_path))['factor_analysis'] == {'error': 'singular'}
+
+
+def test_watermark_unchanged_skips_refresh(survey_db, tmp_path):
+    directory = str(tmp_path)
+    scheduler.refresh(survey_db, directory)
+    summary = scheduler.refresh(survey_db, directory)
+    assert summary == {
+        'refreshed': False,
+        'version': 1,
+        'generated_at': scheduler.latest_snapshot(directory)['generated_at'],
+    }
+
+
+@pytest.mark.parametrize('previous, current, elapsed, expected', [
+    (None, 10, 0, 'initial'),
+    (10, 10, 10_000, None),
+    (10, 60, 0, 'threshold'),
+    (10, 11, 10_000, 'interval'),
+    (10, 11, 10, None),
+])
+def test_refresh_reason(previous, current, elapsed, expected):
+    watermark = {'evaluations': current, 'free_texts': 0, 'latest_created_at': current}
+    snapshot = None if previous is None else {
+        'watermark': {'evaluations': previous, 'free_texts': 0, 'latest_created_at': previous},
+        'generated_at_ms': 0,
+    }
+    assert scheduler.refresh_reason(snapshot, watermark, elapsed, interval=3600, threshold=50) == expected
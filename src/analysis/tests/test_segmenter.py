@@ -0,0 +1,61 @@
+"""segmenter: 文字種による簡易分かち書き"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from segmenter import SEGMENTER_VERSION, STOPWORDS, segment, segmenter_version
+
+ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('エンジン音がとても静かで高級感がある', ['エンジン', 'とても', '静か', '高級感', 'ある']),
+    ('EVの加速が力強い', ['EV', '加速', '力強い']),
+    ('静かな音が心地よい', ['静かな', '心地よい']),
+    ('ロードノイズは少ない。', ['ロードノイズ', '少ない']),
+    ('', []),
+])
+def test_segment_splits_at_script_boundaries(text, expected):
+    assert segment(text, bigrams=False) == expected
+
+
+def test_bigrams_split_long_kanji_runs():
+    assert segment('電気自動車走行音', bigrams=False) == ['電気自動車走行音']
+    assert segment('電気自動車走行音', bigrams=True) == ['電気', '気自', '自動', '動車', '車走', '走行', '行音']
+    # 2文字以下の漢字語と他の文字種はそのまま
+    assert segment('加速が力強いEV', bigrams=True) == ['加速', '力強い', 'EV']
+
+
+def test_no_single_characters_or_stopwords():
+    text = 'この音は車の中でも外でもよく聞こえるため、静かなことが重要など'
+    tokens = segment(text, bigrams=False)
+    assert tokens
+    assert all(len(token) > 1 and token not in STOPWORDS for token in tokens)
+    # 元の文字列を超えて語を作らない
+    assert all(token in text for token in tokens)
+
+
+def test_token_cache_version_follows_segmenter_and_bigram_setting(tmp_path):
+    assert segmenter_version(bigrams=True) != segmenter_version(bigrams=False)
+    assert segmenter_version(bigrams=False).startswith(f'segmenter-{SEGMENTER_VERSION}:')
+
+    # MeCabがない環境のトークンキャッシュは、バイグラム分割の設定ごとに別のキーを使う
+    code = (
+        'import improved_nlp\n'
+        'improved_nlp.get_mecab()\n'
+        'print(improved_nlp.MECAB_AVAILABLE, improved_nlp.token_cache.version)\n'
+    )
+    versions = {}
+    for bigrams in ('0', '1'):
+        env = {**os.environ, 'SEGMENTER_BIGRAMS': bigrams, 'PYTHONPATH': ANALYSIS_DIR}
+        completed = subprocess.run(
+            [sys.executable, '-c', code], env=env, cwd=tmp_path, capture_output=True, text=True, check=True,
+        )
+        mecab_available, version = completed.stdout.split()
+        if mecab_available == 'True':
+            pytest.skip('MeCab is installed')
+        versions[bigrams] = version
+    assert versions == {'0': segmenter_version(bigrams=False), '1': segmenter_version(bigrams=True)}
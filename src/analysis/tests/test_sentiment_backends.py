@@ -0,0 +1,140 @@
+"""sentiment_backends: 推論バックエンドの一致度とCPUコアの固定範囲、improved_nlp のバッチ推論"""
+
+import os
+
+import numpy as np
+import pytest
+
+import benchmark
+import improved_nlp
+import sentiment_backends
+from analysis_cache import AnalysisCache
+from sentiment_backends import create_backend, parse_cores, thread_settings
+
+SETTINGS = {'intra_op': None, 'inter_op': None, 'cores': [0]}
+WORDS = ['quiet', 'loud', 'engine', 'smooth', 'harsh', 'premium', 'cheap', 'bad']
+
+
+@pytest.fixture
+def affinity_calls(monkeypatch):
+    """sched_setaffinity の呼び出しを記録する（実際には固定しない）"""
+    calls = []
+    monkeypatch.setattr(os, 'sched_setaffinity', lambda pid, cores: calls.append((pid, list(cores))), raising=False)
+    return calls
+
+
+@pytest.fixture
+def tiny_model():
+    """乱数で初期化した小さなBERT分類モデル（ダウンロード不要、int8 バックエンドが置き換えるためテストごとに作る）"""
+    torch = pytest.importorskip('torch')
+    transformers = pytest.importorskip('transformers')
+    torch.manual_seed(0)
+    config = transformers.BertConfig(
+        vocab_size=200, hidden_size=64, num_hidden_layers=2, num_attention_heads=4,
+        intermediate_size=128, num_labels=2,
+    )
+    model = transformers.BertForSequenceClassification(config).eval()
+    ids = torch.randint(0, 200, (8, 16), generator=torch.Generator().manual_seed(1))
+    return torch, model, {'input_ids': ids, 'attention_mask': torch.ones_like(ids)}
+
+
+def test_parse_cores_and_thread_defaults(monkeypatch):
+    assert parse_cores('0-3,6, 2') == [0, 1, 2, 3, 6]
+    assert parse_cores(None) == []
+    monkeypatch.setattr(sentiment_backends, 'CPU_CORES', '2-3')
+    assert thread_settings() == {'intra_op': 2, 'inter_op': None, 'cores': [2, 3]}
+
+
+def test_int8_agrees_with_eager_without_pinning(tiny_model, affinity_calls):
+    torch, model, inputs = tiny_model
+    eager = create_backend('eager', model, torch, None, 'tiny', SETTINGS).logits(inputs)
+    quantized = create_backend('int8', model, torch, None, 'tiny', SETTINGS)
+    assert quantized.name == 'int8'
+    logits = quantized.logits(inputs)
+    np.testing.assert_allclose(logits, eager, atol=0.05)
+    np.testing.assert_array_equal(logits.argmax(axis=1), eager.argmax(axis=1))
+    # 同じプロセスの他の処理に影響しないよう、コアは固定しない
+    assert affinity_calls == []
+
+
+def test_unknown_backend(tiny_model):
+    torch, model, _ = tiny_model
+    with pytest.raises(ValueError, match='Unknown sentiment backend'):
+        create_backend('fp16', model, torch, None, 'tiny', SETTINGS)
+
+
+def test_benchmark_process_pins_cores(monkeypatch, affinity_calls):
+    monkeypatch.setattr(sentiment_backends, 'CPU_CORES', '0')
+    monkeypatch.setattr(improved_nlp, 'load_bert', lambda: False)
+    with pytest.raises(RuntimeError, match='BERT is not available'):
+        benchmark.run_sentiment_backend(10, 0, 4)
+    assert affinity_calls == [(0, [0])]
+
+
+@pytest.fixture
+def tiny_bert(tiny_model, tmp_path, monkeypatch):
+    """improved_nlp のBERTを小さなモデルと単語単位の語彙に差し替え、推論した行数を記録する"""
+    torch, model, _ = tiny_model
+    transformers = pytest.importorskip('transformers')
+    vocab = tmp_path / 'vocab.txt'
+    vocab.write_text('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]', *WORDS]) + '\n')
+    tokenizer = transformers.BertTokenizer(str(vocab))
+    backend = create_backend('eager', model, torch, tokenizer, 'tiny', SETTINGS)
+    bad_id = tokenizer.convert_tokens_to_ids('bad')
+    batches = []
+    infer = backend.logits
+
+    def logits(inputs):
+        ids = inputs['input_ids']
+        batches.append(len(ids))
+        if (ids == bad_id).any():
+            raise RuntimeError('inference failed')
+        return infer(inputs)
+
+    monkeypatch.setattr(backend, 'logits', logits)
+    monkeypatch.setattr(improved_nlp, 'tokenizer', tokenizer)
+    monkeypatch.setattr(improved_nlp, 'model', model)
+    monkeypatch.setattr(improved_nlp, 'sentiment_backend', backend)
+    monkeypatch.setattr(improved_nlp, '_bert_loaded', True)
+    monkeypatch.setattr(improved_nlp, 'sentiment_cache', AnalysisCache('sentiment_test', 'tiny', path=None))
+    return batches
+
+
+def _single_scores(texts):
+    return [improved_nlp._infer_sentiment(text) for text in texts]
+
+
+def test_batch_scores_keep_input_order_across_buckets(tiny_bert):
+    # 長さの異なる回答を交互に並べ、複数のバケットに分かれるようにする
+    texts = [' '.join(WORDS[:7][i % 3:i % 3 + 1 + i % 5]) for i in range(12)]
+    assert len({len(text.split()) for text in texts}) > 2
+    expected = _single_scores(texts)
+    tiny_bert.clear()
+
+    # 長さの違う回答はスコアも異なるため、順序を取り違えると一致しない
+    assert len(set(expected)) > 2
+    scores = improved_nlp.analyze_sentiment_bert_batch(texts, batch_size=3)
+    np.testing.assert_allclose(scores, expected, rtol=0, atol=1e-7)
+    assert not np.allclose(sorted(scores), scores, rtol=0, atol=1e-7)
+    assert tiny_bert == [3, 3, 3, 3]
+
+
+def test_batch_infers_duplicate_texts_once(tiny_bert):
+    texts = ['quiet engine', 'loud', ' quiet engine ', 'loud', 'smooth premium']
+    scores = improved_nlp.analyze_sentiment_bert_batch(texts, batch_size=8)
+    assert sum(tiny_bert) == 3
+    assert scores[0] == scores[2] and scores[1] == scores[3]
+
+    # 2回目はキャッシュから返し、推論しない
+    tiny_bert.clear()
+    assert improved_nlp.analyze_sentiment_bert_batch(texts, batch_size=8) == scores
+    assert tiny_bert == []
+
+
+def test_failed_item_falls_back_without_voiding_batch(tiny_bert):
+    texts = ['quiet engine', 'bad engine', 'smooth premium']
+    expected = _single_scores(['quiet engine', 'smooth premium'])
+
+    scores = improved_nlp.analyze_sentiment_bert_batch(texts, batch_size=8)
+    np.testing.assert_allclose([scores[0], scores[2]], expected, rtol=0, atol=1e-7)
+    assert scores[1] == improved_nlp.analyze_sentiment_simple('bad engine')
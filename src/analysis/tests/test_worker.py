@@ -0,0 +1,67 @@
+"""worker: 1行1JSONのリクエスト処理"""
+
+import io
+import json
+
+import pytest
+
+import metrics
+import worker
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    yield
+    metrics.begin(enabled=False)
+
+
+def test_unknown_task_returns_error():
+    assert worker.handle_request({'id': 7, 'task': 'missing'}) == {'id': 7, 'error': 'Unknown task: missing'}
+
+
+def test_invalid_json_returns_error_without_id():
+    response = json.loads(worker.handle_line('{"id": 1, "task":'))
+    assert response['id'] is None
+    assert response['error'].startswith('Invalid JSON')
+
+
+def test_blank_line_returns_none():
+    assert worker.handle_line('') is None
+    assert worker.handle_line('   \n') is None
+
+
+def test_handler_exception_becomes_error_response(monkeypatch):
+    def fail(params):
+        raise ValueError('broken input')
+
+    monkeypatch.setitem(worker.TASKS, 'fail', fail)
+    response = json.loads(worker.handle_line(json.dumps({'id': 'a', 'task': 'fail', 'params': None})))
+    assert response == {'id': 'a', 'error': 'broken input'}
+
+
+def test_metrics_attached_only_to_dict_results(monkeypatch):
+    cached = {'value': 1}
+    monkeypatch.setitem(worker.TASKS, 'dict', lambda params: cached)
+    monkeypatch.setitem(worker.TASKS, 'list', lambda params: [1, 2])
+
+    response = worker.handle_request({'id': 1, 'task': 'dict', 'params': {'metrics': True}})
+    assert response['result']['metrics']['task'] == 'dict'
+    assert cached == {'value': 1}
+    assert worker.handle_request({'id': 2, 'task': 'list', 'params': {'metrics': True}}) == {
+        'id': 2, 'result': [1, 2],
+    }
+    assert worker.handle_request({'id': 3, 'task': 'dict', 'params': {}}) == {'id': 3, 'result': cached}
+
+
+def test_serve_stream_answers_each_request_in_order(monkeypatch):
+    monkeypatch.setitem(worker.TASKS, 'echo', lambda params: params)
+    reader = io.StringIO(
+        '{"id": 1, "task": "echo", "params": {"x": 1}}\n\n{"id": 2, "task": "unknown"}\nnot json\n'
+    )
+    writer = io.StringIO()
+    worker.serve_stream(reader, writer)
+
+    responses = [json.loads(line) for line in writer.getvalue().splitlines()]
+    assert [response['id'] for response in responses] == [1, 2, None]
+    assert responses[0]['result'] == {'x': 1}
+    assert 'error' in responses[1] and 'error' in responses[2]
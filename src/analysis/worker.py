@@ -0,0 +1,186 @@
+"""
+常駐分析ワーカー
+MeCab・BERT・scikit-learnを一度だけ読み込み、標準入出力またはUnixソケット経由で分析を実行
+
+プロトコル（1行1JSON）:
+  リクエスト: {"id": 1, "task": "nlp", "params": {"free_texts": [...]}}
+  レスポンス: {"id": 1, "result": {...}} または {"id": 1, "error": "..."}
+"""
+
+import argparse
+import json
+import os
+import socketserver
+import sys
+from typing import Any, Callable, Dict, Optional, TextIO
+
+# ライブラリの読み込みは起動時に一度だけ行う（モデルは main で事前読み込み）
+import improved_nlp
+import factor_analysis
+import aggregation
+import embeddings
+import metrics
+import preference
+
+def handle_nlp(params: Dict[str, Any]) -> Dict[str, Any]:
+    """自由記述テキスト分析"""
+    batch_size = params.get('batch_size')
+    if params.get('db') and params.get('store'):
+        # 差分更新モード（評価データベースを直接読み、前回以降の回答のみ解析）
+        return improved_nlp.analyze_free_texts_from_db(
+            params['db'], params['store'], batch_size=batch_size, rescan=bool(params.get('rescan'))
+        )
+    if 'records' in params and params.get('store'):
+        # 差分更新モード
+        return improved_nlp.analyze_free_texts_incremental(
+            params['records'], params['store'], batch_size=batch_size
+        )
+    free_texts = params.get('free_texts', [])
+    return improved_nlp.analyze_free_texts_improved(
+        free_texts,
+        batch_size=batch_size,
+        cooccurrence_scoring=params.get('cooccurrence_scoring', 'count'),
+        workers=params.get('workers'),
+        analyses=params.get('analyses', improved_nlp.ANALYSES),
+    )
+
+def handle_factor_analysis(params: Dict[str, Any]) -> Dict[str, Any]:
+    """因子分析"""
+    n_factors = int(params.get('n_factors', 3))
+    if params.get('batch'):
+        # 因子数・回転・グループの組み合わせを一括推定
+        return factor_analysis.perform_batch_from_params(params)
+    if params.get('streaming'):
+        # 共分散の逐次集計（回答数によらず一定メモリ）
+        chunks = factor_analysis.iter_sd_score_chunks_from_params(params)
+        return factor_analysis.perform_streaming_factor_analysis(chunks, n_factors=n_factors)
+    sd_scores = factor_analysis.load_sd_scores_from_params(params)
+    if len(sd_scores) == 0:
+        return {
+            'factors': [],
+            'loadings': [],
+            'explained_variance': [],
+        }
+    return factor_analysis.perform_factor_analysis(
+        sd_scores,
+        n_factors=n_factors,
+        n_bootstrap=int(params.get('bootstrap', 0)),
+        confidence=float(params.get('confidence', 0.95)),
+        workers=params.get('workers'),
+        source=factor_analysis.data_source(params),
+    )
+
+def handle_preference(params: Dict[str, Any]) -> Dict[str, Any]:
+    """音源の選好度推定（Bradley–Terry、前回の推定値から再推定）"""
+    return preference.perform_preference_from_params(params)
+
+def handle_text_clusters(params: Dict[str, Any]) -> Dict[str, Any]:
+    """文埋め込みによる類似テキストのクラスタリング（BERTはNLP分析と共有）"""
+    return embeddings.cluster_from_params(params)
+
+def handle_aggregate(params: Dict[str, Any]) -> Any:
+    """評価データの集計（データベースが変わらない間は読み込んだ列を再利用）"""
+    return aggregation.aggregate_from_params(params)
+
+def handle_ping(params: Dict[str, Any]) -> Dict[str, Any]:
+    """死活確認"""
+    return {
+        'status': 'ok',
+        'pid': os.getpid(),
+        'mecab_available': improved_nlp.MECAB_AVAILABLE,
+        'bert_available': improved_nlp.BERT_AVAILABLE,
+        'sklearn_available': factor_analysis.SKLEARN_AVAILABLE,
+        'cache': {**improved_nlp.cache_stats(), 'factor_model': factor_analysis.cache_stats()},
+        'load_timings': improved_nlp.LOAD_TIMINGS,
+    }
+
+TASKS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    'nlp': handle_nlp,
+    'factor_analysis': handle_factor_analysis,
+    'preference': handle_preference,
+    'text_clusters': handle_text_clusters,
+    'aggregate': handle_aggregate,
+    'ping': handle_ping,
+}
+
+def handle_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    """1件のリクエストを処理してレスポンスを返す"""
+    request_id = request.get('id')
+    task = request.get('task')
+    handler = TASKS.get(task)
+    if handler is None:
+        return {'id': request_id, 'error': f'Unknown task: {task}'}
+
+    params = request.get('params') or {}
+    try:
+        # 'metrics': true のリクエストは計測結果を付加（省略時は環境変数の設定に従う）
+        metrics.begin(enabled=True if params.get('metrics') else None)
+        metrics.record('task', task)
+        result = handler(params)
+        if isinstance(result, dict):
+            result = metrics.attach(result)
+        return {'id': request_id, 'result': result}
+    except Exception as e:
+        return {'id': request_id, 'error': str(e)}
+
+def handle_line(line: str) -> Optional[str]:
+    """1行のリクエストを処理してレスポンス行を返す（空行はNone）"""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        return json.dumps({'id': None, 'error': f'Invalid JSON: {e}'})
+    return json.dumps(handle_request(request), ensure_ascii=False)
+
+def serve_stream(reader: TextIO, writer: TextIO) -> None:
+    """ストリームからリクエストを読み、1行ずつレスポンスを書き出す"""
+    for line in reader:
+        response = handle_line(line)
+        if response is None:
+            continue
+        writer.write(response + '\n')
+        writer.flush()
+
+class _SocketHandler(socketserver.StreamRequestHandler):
+    """Unixソケット接続ごとのハンドラ"""
+
+    def handle(self) -> None:
+        for raw in self.rfile:
+            response = handle_line(raw.decode('utf-8'))
+            if response is None:
+                continue
+            self.wfile.write((response + '\n').encode('utf-8'))
+            self.wfile.flush()
+
+def serve_socket(path: str) -> None:
+    """Unixソケットで待ち受け（モデルを共有するためリクエストは逐次処理）"""
+    if os.path.exists(path):
+        os.remove(path)
+    with socketserver.UnixStreamServer(path, _SocketHandler) as server:
+        print(f'Analysis worker listening on {path}', file=sys.stderr)
+        try:
+            server.serve_forever()
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='常駐分析ワーカー')
+    parser.add_argument('--socket', help='Unixソケットのパス（省略時は標準入出力）')
+    args = parser.parse_args()
+
+    # MeCab・BERTは初回リクエストを待たずに起動時に読み込む
+    timings = improved_nlp.warmup()
+    print(f'Models loaded: {json.dumps(timings)}', file=sys.stderr)
+
+    if args.socket:
+        serve_socket(args.socket)
+    else:
+        print('Analysis worker ready', file=sys.stderr)
+        serve_stream(sys.stdin, sys.stdout)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+/**
+ * @jest-environment node
+ */
+import { EventEmitter } from 'events';
+import { PassThrough, Writable } from 'stream';
+import { spawn } from 'child_process';
+import { runAnalysisTask } from '@/lib/analysisWorker';
+
+jest.mock('child_process', () => ({ spawn: jest.fn() }));
+
+const spawnMock = spawn as jest.MockedFunction<typeof spawn>;
+
+// analysis/worker.py の代わりに、1行1JSONの要求に応答する子プロセス
+class FakeWorker extends EventEmitter {
+  stdout = new PassThrough();
+  stderr = new PassThrough();
+  dead = false;
+  stdin: Writable;
+
+  constructor() {
+    super();
+    this.stdin = new Writable({
+      write: (chunk: Buffer, _encoding, callback) => {
+        if (this.dead) {
+          // 終了済みのプロセスのパイプへの書き込み
+          callback(Object.assign(new Error('write EPIPE'), { code: 'EPIPE' }));
+          return;
+        }
+        const { id } = JSON.parse(chunk.toString());
+        this.stdout.write(JSON.stringify({ id, result: { ok: true } }) + '\n');
+        callback();
+      },
+    });
+  }
+
+  // 'exit' が届く前に SIGKILL された状態
+  kill() {
+    this.dead = true;
+    return true;
+  }
+}
+
+describe('runAnalysisTask', () => {
+  let workers: FakeWorker[];
+
+  beforeEach(() => {
+    workers = [];
+    delete (globalThis as { analysisWorker?: unknown }).analysisWorker;
+    spawnMock.mockImplementation(() => {
+      const worker = new FakeWorker();
+      workers.push(worker);
+      return worker as unknown as ReturnType<typeof spawn>;
+    });
+  });
+
+  it('rejects pending requests and respawns when the worker dies between requests', async () => {
+    await expect(runAnalysisTask('ping', {})).resolves.toEqual({ ok: true });
+    expect(workers).toHaveLength(1);
+
+    workers[0].kill();
+    await expect(runAnalysisTask('ping', {})).rejects.toThrow('EPIPE');
+
+    await expect(runAnalysisTask('ping', {})).resolves.toEqual({ ok: true });
+    expect(workers).toHaveLength(2);
+  });
+
+  it('rejects pending requests when the worker exits', async () => {
+    await runAnalysisTask('ping', {});
+    const stalled = new Promise<unknown>((resolve, reject) => {
+      workers[0].stdin.write = () => true;
+      runAnalysisTask('ping', {}).then(resolve, reject);
+    });
+
+    workers[0].emit('exit', 137);
+    await expect(stalled).rejects.toThrow('code: 137');
+  });
+});
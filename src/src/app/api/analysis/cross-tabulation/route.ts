@@ -1,42 +1,32 @@
 import { NextResponse } from 'next/server';
-import { prisma } from '@/lib/prisma';
+import { runEvaluationAggregate } from '@/lib/evaluationAggregates';
+
+// カンマ区切りのクエリパラメータを配列に変換
+function splitParam(value: string | null): string[] {
+  return value
+    ? value
+        .split(',')
+        .map((item) => item.trim())
+        .filter((item) => item.length > 0)
+    : [];
+}
 
-export async function GET() {
+export async function GET(request: Request) {
   try {
-    const respondents = await prisma.respondent.findMany({
-      include: {
-        evaluations: {
-          include: {
-            audioSample: true,
-          },
-        },
-      },
-    });
-
-    // 年齢グループ × 購買意欲のクロス集計
-    const ageGroups = ['20-29', '30-39', '40-49', '50-59', '60-70'];
-    const purchaseLevels = ['低 (1-3)', '中 (4-5)', '高 (6-7)'];
-
-    const crossTab: Array<{ row: string; columns: Record<string, number> }> = [];
+    const url = new URL(request.url);
 
-    ageGroups.forEach((ageGroup) => {
-      const columns: Record<string, number> = {};
-      
-      purchaseLevels.forEach((level) => {
-        const [min, max] = level.includes('低') ? [1, 3] : level.includes('中') ? [4, 5] : [6, 7];
-        
-        const count = respondents
-          .filter((r) => r.ageGroup === ageGroup)
-          .flatMap((r) => r.evaluations)
-          .filter((e) => e.purchaseIntent >= min && e.purchaseIntent <= max).length;
+    // 任意の列の組み合わせ（例: ?dimensions=experimentGroup,gender,purchaseBand）
+    // はN元クロス集計とカイ二乗検定の結果を返す
+    const dimensions = splitParam(url.searchParams.get('dimensions'));
+    if (dimensions.length > 0) {
+      const result = await runEvaluationAggregate('cross_tabulation', { dimensions });
+      return NextResponse.json({ data: result });
+    }
 
-        columns[level] = count;
-      });
-
-      crossTab.push({ row: ageGroup, columns });
-    });
+    // 年齢グループ × 購買意欲のクロス集計
+    const result = await runEvaluationAggregate('cross_tabulation');
 
-    return NextResponse.json({ data: crossTab });
+    return NextResponse.json({ data: result });
   } catch (error) {
     console.error('Error fetching cross tabulation:', error);
     return NextResponse.json(
@@ -45,4 +35,3 @@ export async function GET() {
     );
   }
 }
-
@@ -1,50 +1,73 @@
 import { NextResponse } from 'next/server';
-import { prisma } from '@/lib/prisma';
-import { exec } from 'child_process';
-import { promisify } from 'util';
+import { runAnalysisScript, runAnalysisTask } from '@/lib/analysisWorker';
+import { readAnalysisSnapshot } from '@/lib/analysisSnapshot';
 
-const execAsync = promisify(exec);
+// SD法スコアを直接読み込むSQLiteデータベース（prisma/schema.prisma の datasource と同じファイル）
+const DB_PATH = 'prisma/dev.db';
 
-export async function GET() {
+// カンマ区切りのクエリパラメータを配列に変換
+function splitParam(value: string | null): string[] {
+  return value
+    ? value
+        .split(',')
+        .map((item) => item.trim())
+        .filter((item) => item.length > 0)
+    : [];
+}
+
+export async function GET(request: Request) {
   try {
-    const evaluations = await prisma.evaluation.findMany({
-      include: {
-        audioSample: true,
+    // 条件指定のない要求には定期更新されたスナップショットを返す（?live=1 で都度計算）
+    const url = new URL(request.url);
+    if (!url.search) {
+      const snapshot = await readAnalysisSnapshot('factor_analysis');
+      if (snapshot) {
+        return NextResponse.json(snapshot);
+      }
+    }
+
+    // 絞り込み条件はSQLに渡してPython側で評価データを直接読み込む
+    const params: Record<string, unknown> = {
+      db: DB_PATH,
+      filters: {
+        audioSampleId: url.searchParams.get('audioSampleId'),
+        experimentGroup: url.searchParams.get('experimentGroup'),
+        dateFrom: url.searchParams.get('dateFrom'),
+        dateTo: url.searchParams.get('dateTo'),
       },
-    });
+    };
 
-    if (evaluations.length === 0) {
-      return NextResponse.json({
-        data: {
-          factors: [],
-          loadings: [],
-          explained_variance: [],
-        },
-      });
+    // 一括推定（例: ?nFactors=2,3,4&rotations=varimax,promax&groupBy=experimentGroup）
+    const nFactors = splitParam(url.searchParams.get('nFactors'));
+    const rotations = splitParam(url.searchParams.get('rotations'));
+    const groupBy = splitParam(url.searchParams.get('groupBy'));
+    if (nFactors.length > 1 || rotations.length > 0 || groupBy.length > 0) {
+      params.batch = {
+        n_factors: nFactors.length > 0 ? nFactors.map(Number) : undefined,
+        rotations: rotations.length > 0 ? rotations : undefined,
+        group_by: groupBy,
+      };
+    } else if (nFactors.length === 1) {
+      params.n_factors = Number(nFactors[0]);
     }
 
-    // SD法スコアを配列に変換
-    const sdScores = evaluations.map((e) => {
-      const scores = e.sdScores as Record<string, number>;
-      return [
-        scores.quiet || 0,
-        scores.pleasant || 0,
-        scores.premium || 0,
-        scores.modern || 0,
-        scores.powerful || 0,
-        scores.safe || 0,
-        scores.exciting || 0,
-        scores.natural || 0,
-      ];
-    });
+    // 因子負荷量のブートストラップ信頼区間（例: ?bootstrap=1000&confidence=0.95）
+    const bootstrap = url.searchParams.get('bootstrap');
+    if (bootstrap) {
+      params.bootstrap = Number(bootstrap);
+      params.confidence = Number(url.searchParams.get('confidence') ?? '0.95');
+    }
 
     // Pythonスクリプトで因子分析を実行
     try {
-      const inputData = JSON.stringify({ sd_scores: sdScores });
-      const { stdout } = await execAsync(
-        `python3 analysis/factor_analysis.py '${inputData}'`
-      );
-      const result = JSON.parse(stdout);
+      let result: unknown;
+      try {
+        // 常駐ワーカーで実行（scikit-learnの読み込みは初回のみ）
+        result = await runAnalysisTask('factor_analysis', params);
+      } catch (workerError) {
+        console.warn('Analysis worker failed, falling back to one-shot process:', workerError);
+        result = await runAnalysisScript('analysis/factor_analysis.py', params);
+      }
 
       return NextResponse.json({ data: result });
     } catch (error) {
@@ -1,57 +1,62 @@
 import { NextResponse } from 'next/server';
 import { prisma } from '@/lib/prisma';
-import { exec } from 'child_process';
-import { promisify } from 'util';
+import { runAnalysisScript, runAnalysisTask } from '@/lib/analysisWorker';
+import { readAnalysisSnapshot } from '@/lib/analysisSnapshot';
 
-const execAsync = promisify(exec);
+// 差分更新用のNLP分析結果ストア
+const NLP_STORE_PATH = 'prisma/analysis-nlp.db';
+const DB_PATH = 'prisma/dev.db';
 
-export async function GET() {
-  try {
-    // 自由記述テキストを取得
-    const evaluations = await prisma.evaluation.findMany({
-      where: {
-        freeText: {
-          not: null,
-        },
-      },
-      select: {
-        freeText: true,
-      },
-    });
+const EMPTY_RESULT = {
+  keywords: [],
+  average_sentiment: 0,
+  total_texts: 0,
+  analyzed_texts: 0,
+};
 
-    const freeTexts = evaluations
-      .map((e) => e.freeText)
-      .filter((text): text is string => text !== null && text.length > 0);
+// 空でない自由記述の全件（ワーカーが使えない場合のみ）
+async function loadFreeTexts(): Promise<string[]> {
+  const evaluations = await prisma.evaluation.findMany({
+    where: {
+      freeText: {
+        not: null,
+      },
+    },
+    select: {
+      freeText: true,
+    },
+  });
+  return evaluations
+    .map((e) => e.freeText)
+    .filter((text): text is string => text !== null && text.length > 0);
+}
 
-    if (freeTexts.length === 0) {
-      return NextResponse.json({
-        data: {
-          keywords: [],
-          average_sentiment: 0,
-          total_texts: 0,
-          analyzed_texts: 0,
-        },
-      });
+export async function GET(request: Request) {
+  try {
+    // 定期更新されたスナップショットがあればそのまま返す（?live=1 で都度計算）
+    if (new URL(request.url).searchParams.get('live') !== '1') {
+      const snapshot = await readAnalysisSnapshot('nlp');
+      if (snapshot) {
+        return NextResponse.json(snapshot);
+      }
     }
 
-    // Pythonスクリプトを実行（改善版を優先、フォールバックで簡易版）
+    // Python分析を実行（常駐ワーカーを優先、フォールバックで簡易版）
     try {
-      const inputData = JSON.stringify({ free_texts: freeTexts });
-      let stdout: string;
+      let result: unknown;
       try {
-        // 改善版を試行
-        const result = await execAsync(
-          `python3 analysis/improved_nlp.py '${inputData}'`
-        );
-        stdout = result.stdout;
-      } catch {
-        // フォールバック：簡易版
-        const result = await execAsync(
-          `python3 analysis/nlp_analysis.py '${inputData}'`
-        );
-        stdout = result.stdout;
+        // 常駐ワーカーが dev.db を直接読み、前回以降に登録された回答のみ解析する
+        // （リクエストごとに全件の本文を取得・送信しない）
+        result = await runAnalysisTask('nlp', { db: DB_PATH, store: NLP_STORE_PATH });
+      } catch (workerError) {
+        console.warn('Analysis worker failed, falling back to simple NLP:', workerError);
+        // フォールバック：簡易版（全件の本文を渡す）
+        const freeTexts = await loadFreeTexts();
+        if (freeTexts.length === 0) {
+          return NextResponse.json({ data: EMPTY_RESULT });
+        }
+        result = await runAnalysisScript('analysis/nlp_analysis.py', { free_texts: freeTexts });
       }
-      const result = JSON.parse(stdout);
 
       return NextResponse.json({ data: result });
     } catch (error) {
@@ -59,10 +64,7 @@ export async function GET() {
       // フォールバック：簡易分析
       return NextResponse.json({
         data: {
-          keywords: [],
-          average_sentiment: 0,
-          total_texts: freeTexts.length,
-          analyzed_texts: 0,
+          ...EMPTY_RESULT,
           error: 'NLP分析に失敗しました（簡易モード）',
         },
       });
@@ -0,0 +1,60 @@
+import { NextResponse } from 'next/server';
+import { runAnalysisScript, runAnalysisTask } from '@/lib/analysisWorker';
+
+// 比較データを直接読み込むSQLiteデータベース（prisma/schema.prisma の datasource と同じファイル）
+const DB_PATH = 'prisma/dev.db';
+
+// カンマ区切りのクエリパラメータを配列に変換
+function splitParam(value: string | null): string[] {
+  return value
+    ? value
+        .split(',')
+        .map((item) => item.trim())
+        .filter((item) => item.length > 0)
+    : [];
+}
+
+export async function GET(request: Request) {
+  try {
+    const url = new URL(request.url);
+
+    // セグメント別の推定（例: ?segmentBy=ageGroup,evOwnership）
+    const params: Record<string, unknown> = {
+      db: DB_PATH,
+      filters: {
+        dateFrom: url.searchParams.get('dateFrom'),
+        dateTo: url.searchParams.get('dateTo'),
+      },
+      segment_by: splitParam(url.searchParams.get('segmentBy')),
+    };
+
+    // Pythonスクリプトで Bradley–Terry モデルを推定
+    try {
+      let result: unknown;
+      try {
+        // 常駐ワーカーで実行（前回の推定値から再推定）
+        result = await runAnalysisTask('preference', params);
+      } catch (workerError) {
+        console.warn('Analysis worker failed, falling back to one-shot process:', workerError);
+        result = await runAnalysisScript('analysis/preference.py', params);
+      }
+
+      return NextResponse.json({ data: result });
+    } catch (error) {
+      console.error('Preference analysis error:', error);
+      return NextResponse.json({
+        data: {
+          items: [],
+          segments: [],
+          error: '選好度の推定に失敗しました',
+        },
+      });
+    }
+  } catch (error) {
+    console.error('Error in preference analysis:', error);
+    return NextResponse.json(
+      { error: '選好度の推定に失敗しました' },
+      { status: 500 }
+    );
+  }
+}
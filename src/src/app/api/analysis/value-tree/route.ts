@@ -1,7 +1,37 @@
 import { NextResponse } from 'next/server';
 import { prisma } from '@/lib/prisma';
+import { runAnalysisScript, runAnalysisTask } from '@/lib/analysisWorker';
 import type { ValueNode } from '@/components/analysis/ValueTree';
 
+interface TextClusters {
+  labels: number[];
+  error?: string;
+}
+
+/**
+ * ラベルを表記ゆれのクラスタにまとめる（analysis/embeddings.py）
+ * 分析に失敗した場合は null（呼び出し側でラベルの完全一致にフォールバック）
+ */
+async function clusterLabels(labels: string[]): Promise<number[] | null> {
+  try {
+    let result: TextClusters;
+    try {
+      result = await runAnalysisTask<TextClusters>('text_clusters', { texts: labels });
+    } catch (workerError) {
+      console.warn('Analysis worker failed, falling back to one-shot process:', workerError);
+      result = await runAnalysisScript<TextClusters>('analysis/embeddings.py', { texts: labels });
+    }
+    if (result.error || result.labels.length !== labels.length) {
+      console.warn('Label clustering failed:', result.error);
+      return null;
+    }
+    return result.labels;
+  } catch (error) {
+    console.warn('Label clustering failed:', error);
+    return null;
+  }
+}
+
 export async function GET() {
   try {
     const constructs = await prisma.construct.findMany({
@@ -53,15 +83,22 @@ export async function GET() {
       });
     });
 
-    // 頻度を集計
+    // 頻度を集計（「静かで良い」「静かなのが良い」のような表記ゆれは同じクラスタとして数える）
+    const clusters = await clusterLabels(nodes.map((node) => node.label));
+    const keyOf = (node: ValueNode, index: number) =>
+      clusters ? `cluster-${clusters[index]}` : `label-${node.label}`;
+
     const frequencyMap = new Map<string, number>();
-    nodes.forEach((node) => {
-      const key = node.label;
+    nodes.forEach((node, index) => {
+      const key = keyOf(node, index);
       frequencyMap.set(key, (frequencyMap.get(key) || 0) + 1);
     });
 
-    nodes.forEach((node) => {
-      node.frequency = frequencyMap.get(node.label) || 1;
+    nodes.forEach((node, index) => {
+      node.frequency = frequencyMap.get(keyOf(node, index)) || 1;
+      if (clusters) {
+        node.cluster = clusters[index];
+      }
     });
 
     return NextResponse.json({ data: nodes });
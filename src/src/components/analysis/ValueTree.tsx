@@ -10,6 +10,7 @@ export interface ValueNode {
   level: 'terminal' | 'instrumental' | 'functional' | 'physical';
   frequency: number;
   sentiment: number; // -1 to 1
+  cluster?: number; // 表記ゆれをまとめたラベルのクラスタID
   children?: ValueNode[];
   parent?: string;
 }
@@ -0,0 +1,85 @@
+import { readFile } from 'fs/promises';
+import path from 'path';
+import { prisma } from '@/lib/prisma';
+
+/**
+ * 分析スナップショットの読み込み
+ * analysis/scheduler.py が定期的に書き出す latest.json を返し、
+ * 生成後に評価データが変わったかどうか（古さ）を件数の比較だけで判定する
+ */
+
+// スナップショットの保存先（analysis/scheduler.py の ANALYSIS_SNAPSHOT_DIR と同じ）
+const SNAPSHOT_DIR = process.env.ANALYSIS_SNAPSHOT_DIR ?? 'prisma/analysis-snapshots';
+
+// 読み込めるスナップショットの形式（analysis/scheduler.py の SNAPSHOT_FORMAT）
+const SNAPSHOT_FORMAT = 1;
+
+interface AnalysisSnapshot {
+  format: number;
+  version: number;
+  generated_at: string;
+  generated_at_ms: number;
+  watermark: { evaluations: number; free_texts: number; latest_created_at: number };
+  refresh: { interval_seconds: number; threshold: number };
+  nlp: Record<string, unknown>;
+  factor_analysis: Record<string, unknown>;
+}
+
+export interface SnapshotStatus {
+  version: number;
+  generatedAt: string;
+  ageSeconds: number;
+  // 生成後に増減した評価数
+  pendingEvaluations: number;
+  // 生成後に評価データが変わっている
+  stale: boolean;
+  // スケジューラの更新条件（経過時間・増減数）を満たしている
+  refreshDue: boolean;
+}
+
+/**
+ * 最新のスナップショットから指定した分析結果を返す
+ * スナップショットがない・形式が異なる・分析が失敗していた場合は null（呼び出し側で都度計算する）
+ */
+export async function readAnalysisSnapshot(
+  analysis: 'nlp' | 'factor_analysis'
+): Promise<{ data: Record<string, unknown>; snapshot: SnapshotStatus } | null> {
+  let snapshot: AnalysisSnapshot;
+  try {
+    const content = await readFile(path.join(process.cwd(), SNAPSHOT_DIR, 'latest.json'), 'utf-8');
+    snapshot = JSON.parse(content) as AnalysisSnapshot;
+  } catch {
+    return null;
+  }
+
+  const data = snapshot.format === SNAPSHOT_FORMAT ? snapshot[analysis] : undefined;
+  if (!data || 'error' in data) {
+    return null;
+  }
+
+  // 件数と最新の回答日時のみを集計（データ量によらず一定時間）
+  const current = await prisma.evaluation.aggregate({
+    _count: { _all: true },
+    _max: { createdAt: true },
+  });
+  const latestCreatedAt = current._max.createdAt?.getTime() ?? 0;
+  const pendingEvaluations = current._count._all - snapshot.watermark.evaluations;
+  const stale =
+    pendingEvaluations !== 0 || latestCreatedAt !== snapshot.watermark.latest_created_at;
+  const ageSeconds = Math.max(0, (Date.now() - snapshot.generated_at_ms) / 1000);
+
+  return {
+    data,
+    snapshot: {
+      version: snapshot.version,
+      generatedAt: snapshot.generated_at,
+      ageSeconds,
+      pendingEvaluations,
+      stale,
+      refreshDue:
+        stale &&
+        (Math.abs(pendingEvaluations) >= snapshot.refresh.threshold ||
+          ageSeconds >= snapshot.refresh.interval_seconds),
+    },
+  };
+}
@@ -0,0 +1,178 @@
+import { spawn, type ChildProcessWithoutNullStreams } from 'child_process';
+import readline from 'readline';
+
+/**
+ * 常駐Python分析ワーカーのクライアント
+ * analysis/worker.py を1度だけ起動し、1行1JSONでリクエストを送受信する
+ */
+
+type AnalysisTask =
+  | 'nlp'
+  | 'factor_analysis'
+  | 'preference'
+  | 'text_clusters'
+  | 'aggregate'
+  | 'ping';
+
+interface PendingRequest {
+  resolve: (value: unknown) => void;
+  reject: (reason: Error) => void;
+  timer: NodeJS.Timeout;
+}
+
+interface WorkerResponse {
+  id: number | null;
+  result?: unknown;
+  error?: string;
+}
+
+// モデル読み込みを含む初回リクエストを考慮したタイムアウト
+const REQUEST_TIMEOUT_MS = 5 * 60 * 1000;
+
+class AnalysisWorker {
+  private process: ChildProcessWithoutNullStreams;
+  private pending = new Map<number, PendingRequest>();
+  private nextId = 1;
+  private exited = false;
+
+  constructor() {
+    this.process = spawn('python3', ['analysis/worker.py'], {
+      cwd: process.cwd(),
+      stdio: ['pipe', 'pipe', 'pipe'],
+      env: {
+        ...process.env,
+        // 形態素解析・感情分析結果の永続キャッシュ（dev.dbと同じディレクトリ）
+        ANALYSIS_CACHE_PATH: process.env.ANALYSIS_CACHE_PATH ?? 'prisma/analysis-cache.db',
+      },
+    });
+
+    const lines = readline.createInterface({ input: this.process.stdout });
+    lines.on('line', (line) => this.handleLine(line));
+
+    this.process.stderr.on('data', (data: Buffer) => {
+      console.warn(`[analysis-worker] ${data.toString().trim()}`);
+    });
+
+    // ワーカーが要求の合間に終了していると次の書き込みが EPIPE になる
+    // （未処理の 'error' イベントはサーバーごと落とすため、停止として扱い次回再起動する）
+    this.process.stdin.on('error', (error) => {
+      this.handleExit(new Error(`分析ワーカーへの書き込みに失敗しました: ${error.message}`));
+      this.process.kill();
+    });
+
+    this.process.on('exit', (code) =>
+      this.handleExit(new Error(`分析ワーカーが終了しました (code: ${code})`))
+    );
+    this.process.on('error', (error) => this.handleExit(error));
+  }
+
+  get alive(): boolean {
+    return !this.exited;
+  }
+
+  request<T>(task: AnalysisTask, params: Record<string, unknown>): Promise<T> {
+    if (this.exited) {
+      return Promise.reject(new Error('分析ワーカーは停止しています'));
+    }
+
+    const id = this.nextId++;
+    return new Promise<T>((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new Error(`分析ワーカーの応答がタイムアウトしました (task: ${task})`));
+      }, REQUEST_TIMEOUT_MS);
+
+      this.pending.set(id, { resolve: resolve as (value: unknown) => void, reject, timer });
+      this.process.stdin.write(JSON.stringify({ id, task, params }) + '\n');
+    });
+  }
+
+  private handleLine(line: string) {
+    let response: WorkerResponse;
+    try {
+      response = JSON.parse(line);
+    } catch {
+      console.warn('[analysis-worker] 不正な応答を受信しました:', line);
+      return;
+    }
+
+    if (response.id === null) return;
+    const pending = this.pending.get(response.id);
+    if (!pending) return;
+
+    this.pending.delete(response.id);
+    clearTimeout(pending.timer);
+    if (response.error !== undefined) {
+      pending.reject(new Error(response.error));
+    } else {
+      pending.resolve(response.result);
+    }
+  }
+
+  private handleExit(error: Error) {
+    if (this.exited) return;
+    this.exited = true;
+    this.pending.forEach((pending) => {
+      clearTimeout(pending.timer);
+      pending.reject(error);
+    });
+    this.pending.clear();
+  }
+}
+
+const globalForWorker = globalThis as unknown as {
+  analysisWorker: AnalysisWorker | undefined;
+};
+
+function getAnalysisWorker(): AnalysisWorker {
+  if (!globalForWorker.analysisWorker || !globalForWorker.analysisWorker.alive) {
+    globalForWorker.analysisWorker = new AnalysisWorker();
+  }
+  return globalForWorker.analysisWorker;
+}
+
+/**
+ * 常駐ワーカーで分析タスクを実行する
+ * ワーカーが終了していた場合は次回呼び出し時に再起動する
+ */
+export function runAnalysisTask<T>(
+  task: AnalysisTask,
+  params: Record<string, unknown>
+): Promise<T> {
+  return getAnalysisWorker().request<T>(task, params);
+}
+
+/**
+ * 分析スクリプトを単発で実行する（ワーカーが使えない場合のフォールバック）
+ * 入力はコマンドライン引数ではなく標準入力で渡す（ARG_MAX・クォートの問題を回避）
+ */
+export function runAnalysisScript<T>(script: string, input: Record<string, unknown>): Promise<T> {
+  return new Promise<T>((resolve, reject) => {
+    const child = spawn('python3', [script, '--input', '-'], { cwd: process.cwd() });
+    let stdout = '';
+    let stderr = '';
+
+    child.stdout.on('data', (data: Buffer) => {
+      stdout += data.toString();
+    });
+    child.stderr.on('data', (data: Buffer) => {
+      stderr += data.toString();
+    });
+    child.on('error', reject);
+    // 入力を読み終える前に終了した場合の EPIPE（終了コードは 'close' で報告される）
+    child.stdin.on('error', () => {});
+    child.on('close', (code) => {
+      if (code !== 0) {
+        reject(new Error(`${script} が失敗しました (code: ${code}): ${stderr || stdout}`));
+        return;
+      }
+      try {
+        resolve(JSON.parse(stdout) as T);
+      } catch (error) {
+        reject(error);
+      }
+    });
+
+    child.stdin.end(JSON.stringify(input));
+  });
+}
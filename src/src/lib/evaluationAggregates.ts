@@ -0,0 +1,28 @@
+import { runAnalysisScript, runAnalysisTask } from '@/lib/analysisWorker';
+
+/**
+ * 評価データの集計（analysis/aggregation.py）
+ * 評価・回答者・音源の列をPython側で1回だけ読み込み、NumPyで集計した結果を返す
+ */
+
+// 集計対象のSQLiteデータベース（prisma/schema.prisma の datasource と同じファイル）
+const DB_PATH = 'prisma/dev.db';
+
+export type AggregateView = 'dashboard' | 'sd_scores' | 'purchase_intent' | 'cross_tabulation';
+
+/**
+ * 指定した集計を実行する
+ * 常駐ワーカーはデータベースが更新されるまで読み込んだ列を再利用する
+ */
+export async function runEvaluationAggregate<T>(
+  view: AggregateView,
+  params: Record<string, unknown> = {}
+): Promise<T> {
+  const input = { db: DB_PATH, view, ...params };
+  try {
+    return await runAnalysisTask<T>('aggregate', input);
+  } catch (workerError) {
+    console.warn('Analysis worker failed, falling back to one-shot process:', workerError);
+    return runAnalysisScript<T>('analysis/aggregation.py', input);
+  }
+}